@@ -1,2 +1,3 @@
 # Part of OpenG2P Documents. See LICENSE file for full copyright and licensing details.
+from . import components
 from . import models
@@ -0,0 +1,2 @@
+# Part of OpenG2P Documents. See LICENSE file for full copyright and licensing details.
+from . import storage_adapter
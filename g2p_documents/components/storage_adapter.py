@@ -0,0 +1,38 @@
+# Part of OpenG2P Documents. See LICENSE file for full copyright and licensing details.
+import logging
+
+from botocore.exceptions import ClientError
+
+from odoo import _
+from odoo.exceptions import UserError
+
+from odoo.addons.component.core import AbstractComponent, Component
+
+_logger = logging.getLogger(__name__)
+
+
+class G2PBaseStorageAdapter(AbstractComponent):
+    _inherit = "base.storage.adapter"
+
+    def add_fileobj(self, relative_path, fileobj, **kwargs):
+        """
+        Stores the content of a binary file object. Adapters that can upload from
+        a file object override this, others get the content read in memory.
+        """
+        return self.add(relative_path, fileobj.read(), **kwargs)
+
+
+class G2PS3StorageAdapter(Component):
+    _inherit = "s3.adapter"
+
+    def add_fileobj(self, relative_path, fileobj, mimetype=None, **kwargs):
+        """
+        Uploads from the file object, in parts for large files, without reading it in memory.
+        """
+        s3object = self._get_object(relative_path)
+        file_params = self._aws_upload_fileobj_params(mimetype=mimetype, **kwargs)
+        try:
+            s3object.upload_fileobj(fileobj, ExtraArgs=file_params)
+        except ClientError as error:
+            _logger.exception("Error during storage of the file %s", relative_path)
+            raise UserError(_("The file could not be stored: %s") % str(error)) from None
@@ -1,8 +1,15 @@
 import base64
+import hashlib
+import logging
 import uuid
+from functools import partial
 
 from odoo import _, models
 
+_logger = logging.getLogger(__name__)
+
+FILE_STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class G2PDocumentStore(models.Model):
     _inherit = "storage.backend"
@@ -27,6 +34,73 @@ class G2PDocumentStore(models.Model):
             name = self._gen_random_name()
         if extension:
             name += extension
+        return self.env["storage.file"].create(
+            {
+                "name": name,
+                "backend_id": self.id,
+                "data": base64.b64encode(data),
+                "tags_ids": self._get_tags_commands(tags),
+            }
+        )
+
+    def add_file_stream(self, fileobj, name=None, extension=None, tags=None):
+        """
+        Same as add_file, but takes a binary file object. The checksum is computed in chunks,
+        and the content is uploaded from the file object by backends that support it (S3),
+        skipping the base64 encoding and decoding of the data field.
+        The stored object is deleted if the transaction is rolled back. Callers rolling back
+        a savepoint must call delete_unreferenced_files themselves.
+        """
+        self.ensure_one()
+        if not name:
+            name = self._gen_random_name()
+        if extension:
+            name += extension
+        checksum = hashlib.sha1()
+        file_size = 0
+        fileobj.seek(0)
+        for chunk in iter(lambda: fileobj.read(FILE_STREAM_CHUNK_SIZE), b""):
+            checksum.update(chunk)
+            file_size += len(chunk)
+        storage_file = self.env["storage.file"].create(
+            {
+                "name": name,
+                "backend_id": self.id,
+                "checksum": checksum.hexdigest(),
+                "file_size": file_size,
+                "tags_ids": self._get_tags_commands(tags),
+            }
+        )
+        storage_file.relative_path = storage_file._build_relative_path(storage_file.checksum)
+        fileobj.seek(0)
+        self.sudo()._forward(
+            "add_fileobj", storage_file.relative_path, fileobj, mimetype=storage_file.mimetype
+        )
+        self.env.cr.postrollback.add(
+            partial(self.sudo().delete_unreferenced_files, [storage_file.relative_path])
+        )
+        return storage_file
+
+    def delete_unreferenced_files(self, relative_paths):
+        """
+        Deletes the stored objects at relative_paths that no storage file refers to,
+        ie, objects stored by a transaction or savepoint that was rolled back.
+        Files with the same content share the object, so those still referenced are kept.
+        """
+        self.ensure_one()
+        referenced_paths = set(
+            self.env["storage.file"]
+            .with_context(active_test=False)
+            .search([("backend_id", "=", self.id), ("relative_path", "in", list(relative_paths))])
+            .mapped("relative_path")
+        )
+        for relative_path in set(relative_paths) - referenced_paths:
+            try:
+                self.delete(relative_path)
+            except Exception:
+                _logger.exception("Could not delete orphaned file %s", relative_path)
+
+    def _get_tags_commands(self, tags):
         tags_ids = []
         if tags:
             if not (isinstance(tags, list) or isinstance(tags, tuple)):
@@ -42,14 +116,7 @@ class G2PDocumentStore(models.Model):
                         tags_ids.append((0, 0, {"name": tag}))
                 else:
                     tags_ids.append(tag)
-        return self.env["storage.file"].create(
-            {
-                "name": name,
-                "backend_id": self.id,
-                "data": base64.b64encode(data),
-                "tags_ids": tags_ids,
-            }
-        )
+        return tags_ids
 
     def _gen_random_name(self, length=10):
         return str(uuid.uuid4())
@@ -28,6 +28,28 @@ class G2PEncryptionProvider(models.Model):
             raise NotImplementedError() from e
         return decrypt_func(data, **kwargs)
 
+    def encrypt_data_batch(self, data_list: list, **kwargs) -> list:
+        """
+        Encrypts a list of payloads. Providers can implement
+        encrypt_data_batch_<type> to batch the calls, else falls back to
+        encrypting one at a time.
+        """
+        batch_func = getattr(self, f"encrypt_data_batch_{self.type}", None)
+        if batch_func:
+            return batch_func(data_list, **kwargs)
+        return [self.encrypt_data(data, **kwargs) for data in data_list]
+
+    def decrypt_data_batch(self, data_list: list, **kwargs) -> list:
+        """
+        Decrypts a list of payloads. Providers can implement
+        decrypt_data_batch_<type> to batch the calls, else falls back to
+        decrypting one at a time.
+        """
+        batch_func = getattr(self, f"decrypt_data_batch_{self.type}", None)
+        if batch_func:
+            return batch_func(data_list, **kwargs)
+        return [self.decrypt_data(data, **kwargs) for data in data_list]
+
     def jwt_sign(
         self,
         data,
@@ -42,12 +64,44 @@ class G2PEncryptionProvider(models.Model):
             raise NotImplementedError() from e
         return jwt_func(
             data,
-            include_payload=True,
-            include_certificate=False,
-            include_cert_hash=False,
+            include_payload=include_payload,
+            include_certificate=include_certificate,
+            include_cert_hash=include_cert_hash,
             **kwargs,
         )
 
+    def jwt_sign_batch(
+        self,
+        data_list: list,
+        include_payload=True,
+        include_certificate=False,
+        include_cert_hash=False,
+        **kwargs,
+    ) -> list:
+        """
+        Signs a list of payloads. Providers can implement jwt_sign_batch_<type>
+        to batch the calls, else falls back to signing one at a time.
+        """
+        batch_func = getattr(self, f"jwt_sign_batch_{self.type}", None)
+        if batch_func:
+            return batch_func(
+                data_list,
+                include_payload=include_payload,
+                include_certificate=include_certificate,
+                include_cert_hash=include_cert_hash,
+                **kwargs,
+            )
+        return [
+            self.jwt_sign(
+                data,
+                include_payload=include_payload,
+                include_certificate=include_certificate,
+                include_cert_hash=include_cert_hash,
+                **kwargs,
+            )
+            for data in data_list
+        ]
+
     def jwt_verify(self, data: str, **kwargs):
         try:
             jwt_func = getattr(self, f"jwt_verify_{self.type}")
@@ -0,0 +1,25 @@
+{
+    "name": "G2P Encryption: Benchmark",
+    "category": "G2P",
+    "version": "17.0.0.0.0",
+    "sequence": 1,
+    "author": "OpenG2P",
+    "website": "https://openg2p.org",
+    "license": "LGPL-3",
+    "depends": [
+        "g2p_encryption_keymanager",
+        "g2p_registry_encryption",
+        "g2p_openid_vci",
+    ],
+    "external_dependencies": {"python": ["cryptography>36,<37", "jwcrypto", "python-jose"]},
+    "data": [],
+    "assets": {
+        "web.assets_backend": [],
+        "web.assets_qweb": [],
+    },
+    "demo": [],
+    "images": [],
+    "application": False,
+    "installable": True,
+    "auto_install": False,
+}
@@ -0,0 +1,198 @@
+"""
+In-process HTTP stand-in for the MOSIP keymanager APIs used by the
+keymanager encryption provider, with configurable latency.
+
+Can also be run standalone:
+    python keymanager_standin.py --port 8089 --latency-ms 20
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.x509.oid import NameOID
+from jose import jwt
+from jwcrypto import jwk, jws
+
+_logger = logging.getLogger(__name__)
+
+
+def _b64url_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data.encode() + b"=" * (-len(data) % 4))
+
+
+class KeymanagerStandin:
+    """
+    Serves /encrypt, /decrypt, /jwtSign, /jwtVerify, /getAllCertificates and
+    an OAuth /token endpoint. latency_ms is added to every request;
+    endpoint_latency_ms overrides it per endpoint path, eg: {"/jwtSign": 50}.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, endpoint_latency_ms=None):
+        self.latency_ms = latency_ms
+        self.endpoint_latency_ms = endpoint_latency_ms or {}
+        self.request_counts = {}
+        self._counts_lock = threading.Lock()
+
+        self.aes_key = AESGCM.generate_key(bit_length=256)
+        self.sign_kid = "standin-sign-key"
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Keymanager Standin")])
+        now = datetime.now()
+        self.sign_cert = (
+            x509.CertificateBuilder()
+            .subject_name(subject)
+            .issuer_name(subject)
+            .public_key(private_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + timedelta(days=1))
+            .sign(private_key, hashes.SHA256())
+        )
+        self.sign_jwk = jwk.JWK.from_pem(
+            private_key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                standin._handle(self, "GET")
+
+            def do_POST(self):
+                standin._handle(self, "POST")
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                _logger.debug(format, *args)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handle(self, handler, method):
+        path = urlparse(handler.path).path
+        with self._counts_lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+        latency_ms = self.endpoint_latency_ms.get(path, self.latency_ms)
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+
+        body = {}
+        if method == "POST":
+            raw = handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+            if handler.headers.get("Content-Type", "").startswith("application/json"):
+                body = json.loads(raw or b"{}")
+            else:
+                body = {key: val[0] for key, val in parse_qs(raw.decode()).items()}
+
+        route = {
+            ("POST", "/token"): self.token,
+            ("POST", "/encrypt"): self.encrypt,
+            ("POST", "/decrypt"): self.decrypt,
+            ("POST", "/jwtSign"): self.jwt_sign,
+            ("POST", "/jwtVerify"): self.jwt_verify,
+            ("GET", "/getAllCertificates"): self.get_all_certificates,
+        }.get((method, path))
+        if not route:
+            status, response = 404, {"errors": [{"message": "Not found"}]}
+        else:
+            try:
+                status, response = 200, route(body.get("request", body))
+            except Exception as e:
+                _logger.exception("Keymanager standin error")
+                status, response = 500, {"errors": [{"message": str(e)}]}
+
+        response = json.dumps(response).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(response)))
+        handler.end_headers()
+        handler.wfile.write(response)
+
+    def token(self, request):
+        exp = int((datetime.now() + timedelta(hours=1)).timestamp())
+        return {"access_token": jwt.encode({"exp": exp}, "standin", algorithm="HS256")}
+
+    def encrypt(self, request):
+        nonce = os.urandom(12)
+        data = nonce + AESGCM(self.aes_key).encrypt(nonce, _b64url_decode(request["data"]), None)
+        return {"response": {"data": _b64url_encode(data)}}
+
+    def decrypt(self, request):
+        data = _b64url_decode(request["data"])
+        return {
+            "response": {"data": _b64url_encode(AESGCM(self.aes_key).decrypt(data[:12], data[12:], None))}
+        }
+
+    def jwt_sign(self, request):
+        protected = {"alg": "RS256", "kid": self.sign_kid}
+        if request.get("includeCertificate"):
+            protected["x5c"] = [
+                base64.b64encode(self.sign_cert.public_bytes(serialization.Encoding.DER)).decode()
+            ]
+        if request.get("includeCertHash"):
+            protected["x5t#S256"] = _b64url_encode(self.sign_cert.fingerprint(hashes.SHA256()))
+        token = jws.JWS(_b64url_decode(request["dataToSign"]))
+        token.add_signature(self.sign_jwk, alg="RS256", protected=json.dumps(protected))
+        if not request.get("includePayload", True):
+            token.detach_payload()
+        return {"response": {"jwtSignedData": token.serialize(compact=True)}}
+
+    def jwt_verify(self, request):
+        token = jws.JWS()
+        token.deserialize(request["jwtSignatureData"])
+        try:
+            token.verify(self.sign_jwk)
+            valid = True
+        except jws.InvalidJWSSignature:
+            valid = False
+        return {"response": {"signatureValid": valid}}
+
+    def get_all_certificates(self, request):
+        cert_pem = self.sign_cert.public_bytes(serialization.Encoding.PEM).decode()
+        return {"response": {"allCertificates": [{"certificateData": cert_pem, "keyId": self.sign_kid}]}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    standin = KeymanagerStandin(host=args.host, port=args.port, latency_ms=args.latency_ms)
+    _logger.info("Keymanager standin listening on %s", standin.base_url)
+    standin.server.serve_forever()
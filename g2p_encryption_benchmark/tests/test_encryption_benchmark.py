@@ -0,0 +1,145 @@
+import logging
+import os
+import time
+
+import requests
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase, _super_send
+
+from .keymanager_standin import KeymanagerStandin
+
+_logger = logging.getLogger(__name__)
+
+BENCHMARK_SIZE = int(os.getenv("G2P_BENCHMARK_SIZE", "50"))
+BENCHMARK_KM_LATENCY_MS = float(os.getenv("G2P_BENCHMARK_KM_LATENCY_MS", "0"))
+
+
+@tagged("-at_install", "post_install", "-standard", "g2p_benchmark")
+class TestEncryptionBenchmark(TransactionCase):
+    """
+    Not run by default. Run with --test-tags g2p_benchmark. Size and keymanager
+    latency are set with G2P_BENCHMARK_SIZE and G2P_BENCHMARK_KM_LATENCY_MS.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.standin = KeymanagerStandin(latency_ms=BENCHMARK_KM_LATENCY_MS).start()
+        cls.addClassCleanup(cls.standin.stop)
+
+        cls.env["ir.config_parameter"].set_param("web.base.url", "http://openg2p.local")
+        cls.provider = cls.env["g2p.encryption.provider"].create(
+            {
+                "name": "Benchmark Keymanager Standin",
+                "type": "keymanager",
+                "keymanager_api_base_url": cls.standin.base_url,
+                "keymanager_auth_url": f"{cls.standin.base_url}/token",
+            }
+        )
+        cls.env["g2p.encryption.provider"].set_registry_provider(cls.provider.id)
+        cls.id_type = cls.env["g2p.id.type"].create({"name": "BENCHMARK ID"})
+        cls.issuer = cls.env["g2p.openid.vci.issuers"].create(
+            {
+                "name": "Benchmark Issuer",
+                "issuer_type": "Registry",
+                "scope": "openg2p_benchmark_vc_ldp",
+                "auth_sub_id_type_id": cls.id_type.id,
+                "encryption_provider_id": cls.provider.id,
+            }
+        )
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        for label, count, elapsed in cls.results:
+            _logger.info(
+                "BENCHMARK %-40s %6d ops %9.3f s %9.1f ops/s %8.2f ms/op",
+                label,
+                count,
+                elapsed,
+                count / elapsed if elapsed else 0.0,
+                1000 * elapsed / count if count else 0.0,
+            )
+        _logger.info("BENCHMARK keymanager standin requests: %s", cls.standin.request_counts)
+        super().tearDownClass()
+
+    @classmethod
+    def _request_handler(cls, s: requests.Session, r: requests.PreparedRequest, /, **kw):
+        return _super_send(s, r, **kw)
+
+    def _measure(self, label, count, func):
+        start = time.perf_counter()
+        res = func()
+        self.results.append((label, count, time.perf_counter() - start))
+        return res
+
+    def _set_registry_encryption(self, enabled):
+        config = self.env["ir.config_parameter"]
+        config.set_param("g2p_registry_encryption.encrypt_registry", enabled)
+        config.set_param("g2p_registry_encryption.decrypt_registry", enabled)
+
+    def _registrant_vals(self, prefix, index):
+        return {
+            "name": f"{prefix} Given{index} Family{index}",
+            "given_name": f"Given{index}",
+            "family_name": f"Family{index}",
+            "is_registrant": True,
+            "is_group": False,
+            "reg_ids": [(0, 0, {"id_type": self.id_type.id, "value": f"{prefix}-{index}"})],
+        }
+
+    def test_registry_throughput(self):
+        for enabled in (False, True):
+            label = "encrypted" if enabled else "plain"
+            self._set_registry_encryption(enabled)
+
+            def create_partners(label=label):
+                partner_model = self.env["res.partner"]
+                return partner_model.concat(
+                    *(partner_model.create(self._registrant_vals(label, i)) for i in range(BENCHMARK_SIZE))
+                )
+
+            partners = self._measure(f"registry create ({label})", BENCHMARK_SIZE, create_partners)
+
+            def read_partners(partners=partners):
+                partners.invalidate_recordset()
+                return partners.read(["name", "given_name", "family_name"])
+
+            records = self._measure(f"registry read ({label})", BENCHMARK_SIZE, read_partners)
+            self.assertEqual(len(records), BENCHMARK_SIZE)
+
+            self._measure(
+                f"registry write ({label})",
+                BENCHMARK_SIZE,
+                lambda partners=partners: [partner.write({"given_name": "Updated"}) for partner in partners],
+            )
+            self.assertEqual(all(partners.mapped("is_encrypted")), enabled)
+
+    def test_vci_issuance_throughput(self):
+        self._set_registry_encryption(False)
+        partners = self.env["res.partner"].create(
+            [self._registrant_vals("vci", i) for i in range(BENCHMARK_SIZE)]
+        )
+        subjects = [partner.reg_ids[0].value for partner in partners]
+
+        credentials = self._measure(
+            "vci issue_vc_Registry",
+            BENCHMARK_SIZE,
+            lambda: [
+                self.issuer.issue_vc_Registry(
+                    auth_claims={"sub": subject},
+                    credential_request={"format": "ldp_vc"},
+                )
+                for subject in subjects
+            ],
+        )
+        self.assertTrue(all(cred["credential"]["proof"]["jws"] for cred in credentials))
+
+        self._measure(
+            "keymanager jwt_sign",
+            BENCHMARK_SIZE,
+            lambda: [
+                self.provider.jwt_sign(b"benchmark", include_payload=False) for _i in range(BENCHMARK_SIZE)
+            ],
+        )
@@ -5,6 +5,7 @@ import json
 import logging
 import os
 import secrets
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import requests
@@ -43,6 +44,7 @@ class KeymanagerEncryptionProvider(models.Model):
 
     keymanager_api_base_url = fields.Char("Keymanager API Base URL", default=KEYMANAGER_API_BASE_URL)
     keymanager_api_timeout = fields.Integer("Keymanager API Timeout", default=10)
+    keymanager_api_max_workers = fields.Integer("Keymanager API Max Parallel Requests", default=8)
     keymanager_auth_url = fields.Char("Keymanager Auth URL", default=KEYMANAGER_AUTH_URL)
     keymanager_auth_client_id = fields.Char("Keymanager Auth Client ID", default=KEYMANAGER_AUTH_CLIENT_ID)
     keymanager_auth_client_secret = fields.Char(default=KEYMANAGER_AUTH_CLIENT_SECRET)
@@ -124,6 +126,70 @@ class KeymanagerEncryptionProvider(models.Model):
             return self.km_urlsafe_b64decode(response.get("data"))
         raise ValueError("Could not decrypt data, invalid keymanager response")
 
+    def encrypt_data_batch_keymanager(self, data_list: list, **kwargs) -> list:
+        return self.km_crypt_data_batch("encrypt", data_list, **kwargs)
+
+    def decrypt_data_batch_keymanager(self, data_list: list, **kwargs) -> list:
+        return self.km_crypt_data_batch("decrypt", data_list, **kwargs)
+
+    def km_crypt_data_batch(self, operation: str, data_list: list, **kwargs) -> list:
+        """
+        Runs keymanager encrypt/decrypt calls for a list of payloads in parallel,
+        over a single pooled session and a single access token.
+        """
+        self.ensure_one()
+        if not data_list:
+            return []
+        current_time = self.km_generate_current_time()
+        payloads = [
+            {
+                "id": "string",
+                "version": "string",
+                "requesttime": current_time,
+                "metadata": {},
+                "request": {
+                    "applicationId": self.keymanager_encrypt_application_id or "",
+                    "referenceId": self.keymanager_encrypt_reference_id or "",
+                    "timeStamp": current_time,
+                    "data": self.km_urlsafe_b64encode(data),
+                    "salt": self.keymanager_encrypt_salt,
+                    "aad": self.keymanager_encrypt_aad,
+                },
+            }
+            for data in data_list
+        ]
+        results = self.km_post_batch(f"/{operation}", payloads)
+        if not all(res.get("data") for res in results):
+            raise ValueError(f"Could not {operation} data, invalid keymanager response")
+        return [self.km_urlsafe_b64decode(res["data"]) for res in results]
+
+    def km_post_batch(self, api_path: str, payloads: list) -> list:
+        """
+        Posts payloads to a keymanager API in parallel, over a single pooled
+        session and a single access token. Returns the "response" of each call.
+        """
+        self.ensure_one()
+        if not payloads:
+            return []
+        access_token = self.km_get_access_token()
+        url = f"{self.keymanager_api_base_url}{api_path}"
+        headers = {"Cookie": f"Authorization={access_token}"}
+        timeout = self.keymanager_api_timeout
+        max_workers = max(1, min(self.keymanager_api_max_workers or 1, len(payloads)))
+
+        def post_payload(session, payload):
+            response = session.post(url, json=payload, headers=headers, timeout=timeout)
+            _logger.debug("Keymanager %s API response: %s", api_path, response.text)
+            response.raise_for_status()
+            return response.json().get("response") or {}
+
+        with requests.Session() as session:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(lambda payload: post_payload(session, payload), payloads))
+
     def jwt_sign_keymanager(
         self,
         data,
@@ -167,6 +233,45 @@ class KeymanagerEncryptionProvider(models.Model):
             return response.get("jwtSignedData")
         raise ValueError("Could not sign jwt, invalid keymanager response")
 
+    def jwt_sign_batch_keymanager(
+        self,
+        data_list: list,
+        include_payload=True,
+        include_certificate=False,
+        include_cert_hash=False,
+        **kwargs,
+    ) -> list:
+        self.ensure_one()
+        if not data_list:
+            return []
+        current_time = self.km_generate_current_time()
+        payloads = []
+        for data in data_list:
+            if isinstance(data, dict):
+                data = json.dumps(data).encode()
+            elif isinstance(data, str):
+                data = data.encode()
+            payloads.append(
+                {
+                    "id": "string",
+                    "version": "string",
+                    "requesttime": current_time,
+                    "metadata": {},
+                    "request": {
+                        "dataToSign": self.km_urlsafe_b64encode(data),
+                        "applicationId": self.keymanager_sign_application_id or "",
+                        "referenceId": self.keymanager_sign_reference_id or "",
+                        "includePayload": include_payload,
+                        "includeCertificate": include_certificate,
+                        "includeCertHash": include_cert_hash,
+                    },
+                }
+            )
+        results = self.km_post_batch("/jwtSign", payloads)
+        if not all(res.get("jwtSignedData") for res in results):
+            raise ValueError("Could not sign jwt, invalid keymanager response")
+        return [res["jwtSignedData"] for res in results]
+
     def jwt_verify_keymanager(self, data: str, **kwargs):
         self.ensure_one()
         access_token = self.km_get_access_token()
@@ -0,0 +1,25 @@
+{
+    "name": "G2P Encryption: Local",
+    "category": "G2P",
+    "version": "17.0.0.0.0",
+    "sequence": 1,
+    "author": "OpenG2P",
+    "website": "https://openg2p.org",
+    "license": "LGPL-3",
+    "depends": [
+        "g2p_encryption",
+    ],
+    "external_dependencies": {"python": ["cryptography>36,<37", "jwcrypto"]},
+    "data": [
+        "views/encryption_provider.xml",
+    ],
+    "assets": {
+        "web.assets_backend": [],
+        "web.assets_qweb": [],
+    },
+    "demo": [],
+    "images": [],
+    "application": False,
+    "installable": True,
+    "auto_install": False,
+}
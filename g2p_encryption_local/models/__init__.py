@@ -0,0 +1 @@
+from . import encryption_provider
@@ -0,0 +1,267 @@
+# pylint: disable=[W7936]
+
+import base64
+import json
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.x509.oid import NameOID
+from jwcrypto import jwk, jws
+
+from odoo import _, api, fields, models, tools
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+LOCAL_KEYSTORE_PATH = os.getenv("LOCAL_KEYSTORE_PATH", "")
+
+AES_GCM_NONCE_LENGTH = 12
+
+
+class LocalEncryptionProvider(models.Model):
+    _inherit = "g2p.encryption.provider"
+
+    type = fields.Selection(selection_add=[("local", "Local")])
+
+    @api.model
+    def _local_random_key(self):
+        return base64.b64encode(AESGCM.generate_key(bit_length=256)).decode()
+
+    @api.model
+    def _local_random_secret(self):
+        return secrets.token_urlsafe()
+
+    local_key_storage = fields.Selection(
+        [("db", "Database"), ("file", "Keystore File")],
+        "Local Key Storage",
+        default="db",
+    )
+    local_keystore_path = fields.Char("Local Keystore Path", default=LOCAL_KEYSTORE_PATH)
+
+    local_encrypt_key = fields.Char("Local Encryption Key", default=_local_random_key)
+    local_encrypt_aad = fields.Char("Local Encryption AAD", default=_local_random_secret)
+
+    local_sign_alg = fields.Selection(
+        [("RS256", "RS256"), ("ES256", "ES256")],
+        "Local Signing Algorithm",
+        default="RS256",
+        help="Algorithm of the signing keys generated. Changing it takes effect on the next key rotation.",
+    )
+    local_sign_key = fields.Text("Local Signing Private Key (PEM)")
+    local_sign_cert = fields.Text("Local Signing Certificate (PEM)")
+    local_sign_kid = fields.Char("Local Signing Key ID", default=_local_random_secret)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        res.filtered(lambda prov: prov.type == "local").local_ensure_sign_key()
+        return res
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "type" in vals or "local_key_storage" in vals:
+            self.filtered(lambda prov: prov.type == "local").local_ensure_sign_key()
+        return res
+
+    def local_ensure_sign_key(self):
+        """
+        Generates a signing key and a self-signed certificate for providers
+        storing keys in DB, if they don't have one already.
+        """
+        self.filtered(lambda prov: prov.local_key_storage == "db" and not prov.local_sign_key).with_context(
+            local_keep_sign_kid=True
+        ).action_local_rotate_sign_key()
+
+    def action_local_rotate_sign_key(self):
+        """
+        Replaces the signing key of providers storing keys in DB with a new one,
+        of the current signing algorithm, with a new key ID.
+        Signatures made with the previous key no longer verify.
+        """
+        for rec in self:
+            if rec.local_key_storage != "db":
+                raise UserError(_("Keys of a keystore file are rotated by replacing the file."))
+            key_pem, cert_pem = rec.local_generate_sign_key(rec.local_sign_alg or "RS256", rec.name)
+            vals = {"local_sign_key": key_pem, "local_sign_cert": cert_pem}
+            if not (self.env.context.get("local_keep_sign_kid") and rec.local_sign_kid):
+                vals["local_sign_kid"] = self._local_random_secret()
+            rec.write(vals)
+
+    @api.model
+    def local_generate_sign_key(self, alg: str, common_name: str):
+        if alg == "ES256":
+            private_key = ec.generate_private_key(ec.SECP256R1())
+        else:
+            private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name or "OpenG2P")])
+        now = datetime.now()
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(subject)
+            .issuer_name(subject)
+            .public_key(private_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + timedelta(days=3650))
+            .sign(private_key, hashes.SHA256())
+        )
+        key_pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ).decode()
+        cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+        return key_pem, cert_pem
+
+    def local_get_keys(self) -> dict:
+        """
+        Returns encrypt_key, encrypt_aad, sign_alg, sign_key, sign_cert and sign_kid,
+        either from DB fields or from the JSON keystore file.
+        """
+        self.ensure_one()
+        if self.local_key_storage == "file":
+            path = self.local_keystore_path
+            return dict(self._local_read_keystore(path, os.stat(path).st_mtime_ns))
+        return {
+            "encrypt_key": self.local_encrypt_key,
+            "encrypt_aad": self.local_encrypt_aad,
+            # The algorithm of the stored key, local_sign_alg only applies to keys generated next
+            "sign_alg": self._local_get_sign_alg(self.local_sign_key) if self.local_sign_key else None,
+            "sign_key": self.local_sign_key,
+            "sign_cert": self.local_sign_cert,
+            "sign_kid": self.local_sign_kid,
+        }
+
+    @api.model
+    @tools.ormcache("path", "mtime")
+    def _local_read_keystore(self, path, mtime):
+        """
+        Reads the keystore file. Cached by modification time, so a replaced file is read again.
+        """
+        with open(path) as file:
+            keystore = json.load(file)
+        keystore.setdefault("sign_alg", "RS256")
+        return tuple(keystore.items())
+
+    def encrypt_data_local(self, data: bytes, **kwargs) -> bytes:
+        self.ensure_one()
+        keys = self.local_get_keys()
+        nonce = os.urandom(AES_GCM_NONCE_LENGTH)
+        aesgcm = AESGCM(base64.b64decode(keys["encrypt_key"]))
+        return nonce + aesgcm.encrypt(nonce, data, (keys.get("encrypt_aad") or "").encode())
+
+    def decrypt_data_local(self, data: bytes, **kwargs) -> bytes:
+        self.ensure_one()
+        keys = self.local_get_keys()
+        aesgcm = AESGCM(base64.b64decode(keys["encrypt_key"]))
+        return aesgcm.decrypt(
+            data[:AES_GCM_NONCE_LENGTH],
+            data[AES_GCM_NONCE_LENGTH:],
+            (keys.get("encrypt_aad") or "").encode(),
+        )
+
+    def encrypt_data_batch_local(self, data_list: list, **kwargs) -> list:
+        self.ensure_one()
+        keys = self.local_get_keys()
+        aesgcm = AESGCM(base64.b64decode(keys["encrypt_key"]))
+        aad = (keys.get("encrypt_aad") or "").encode()
+        res = []
+        for data in data_list:
+            nonce = os.urandom(AES_GCM_NONCE_LENGTH)
+            res.append(nonce + aesgcm.encrypt(nonce, data, aad))
+        return res
+
+    def decrypt_data_batch_local(self, data_list: list, **kwargs) -> list:
+        self.ensure_one()
+        keys = self.local_get_keys()
+        aesgcm = AESGCM(base64.b64decode(keys["encrypt_key"]))
+        aad = (keys.get("encrypt_aad") or "").encode()
+        return [
+            aesgcm.decrypt(data[:AES_GCM_NONCE_LENGTH], data[AES_GCM_NONCE_LENGTH:], aad)
+            for data in data_list
+        ]
+
+    def jwt_sign_local(
+        self,
+        data,
+        include_payload=True,
+        include_certificate=False,
+        include_cert_hash=False,
+        **kwargs,
+    ) -> str:
+        self.ensure_one()
+        if isinstance(data, dict):
+            data = json.dumps(data).encode()
+        elif isinstance(data, str):
+            data = data.encode()
+
+        keys = self.local_get_keys()
+        protected = {"alg": keys["sign_alg"], "kid": keys.get("sign_kid")}
+        if keys.get("sign_cert") and (include_certificate or include_cert_hash):
+            cert = x509.load_pem_x509_certificate(keys["sign_cert"].encode())
+            if include_certificate:
+                protected["x5c"] = [base64.b64encode(cert.public_bytes(serialization.Encoding.DER)).decode()]
+            if include_cert_hash:
+                protected["x5t#S256"] = self.local_urlsafe_b64encode(cert.fingerprint(hashes.SHA256()))
+
+        token = jws.JWS(data)
+        token.add_signature(
+            self._local_get_sign_jwk(keys["sign_key"]),
+            alg=keys["sign_alg"],
+            protected=json.dumps(protected),
+        )
+        if not include_payload:
+            token.detach_payload()
+        return token.serialize(compact=True)
+
+    def jwt_verify_local(self, data: str, payload=None, **kwargs):
+        self.ensure_one()
+        keys = self.local_get_keys()
+        token = jws.JWS()
+        token.deserialize(data)
+        try:
+            token.verify(self._local_get_sign_jwk(keys["sign_key"]), detached_payload=payload)
+        except jws.InvalidJWSSignature as e:
+            raise ValueError("invalid jwt signature") from e
+        return json.loads(token.payload if payload is None else payload)
+
+    def get_jwks_local(self, **kwargs):
+        self.ensure_one()
+        keys = self.local_get_keys()
+        if not keys.get("sign_key"):
+            return {"keys": []}
+        public_jwk = jwk.JWK()
+        public_jwk.import_key(**self._local_get_sign_jwk(keys["sign_key"]).export_public(as_dict=True))
+        if keys.get("sign_cert"):
+            cert = x509.load_pem_x509_certificate(keys["sign_cert"].encode())
+            public_jwk.update(
+                {
+                    "x5c": [base64.b64encode(cert.public_bytes(serialization.Encoding.DER)).decode()],
+                    "x5t#S256": self.local_urlsafe_b64encode(cert.fingerprint(hashes.SHA256())),
+                }
+            )
+        public_jwk["kid"] = keys.get("sign_kid")
+        public_jwk["use"] = "sig"
+        public_jwk["alg"] = keys["sign_alg"]
+        return {"keys": [dict(public_jwk)]}
+
+    @api.model
+    @tools.ormcache("key_pem")
+    def _local_get_sign_jwk(self, key_pem: str):
+        return jwk.JWK.from_pem(key_pem.encode())
+
+    @api.model
+    def _local_get_sign_alg(self, key_pem: str) -> str:
+        if self._local_get_sign_jwk(key_pem).export_public(as_dict=True)["kty"] == "EC":
+            return "ES256"
+        return "RS256"
+
+    @api.model
+    def local_urlsafe_b64encode(self, input_data: bytes) -> str:
+        return base64.urlsafe_b64encode(input_data).decode().rstrip("=")
@@ -0,0 +1,117 @@
+import base64
+import json
+import os
+import tempfile
+
+from cryptography.exceptions import InvalidTag
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged("post_install", "-at_install")
+class TestLocalEncryptionProvider(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.provider = self.env["g2p.encryption.provider"].create({"name": "Test Local", "type": "local"})
+
+    def test_encrypt_decrypt(self):
+        data = b"Some registrant data"
+        encrypted = self.provider.encrypt_data(data)
+        self.assertNotIn(data, encrypted)
+        self.assertEqual(self.provider.decrypt_data(encrypted), data)
+        # A random nonce is used for every encryption
+        self.assertNotEqual(self.provider.encrypt_data(data), encrypted)
+
+        tampered = encrypted[:-1] + bytes([encrypted[-1] ^ 1])
+        with self.assertRaises(InvalidTag):
+            self.provider.decrypt_data(tampered)
+
+    def test_encrypt_decrypt_batch(self):
+        data_list = [b"first", b"second", b""]
+        encrypted_list = self.provider.encrypt_data_batch(data_list)
+        self.assertEqual(len(encrypted_list), 3)
+        self.assertEqual(self.provider.decrypt_data_batch(encrypted_list), data_list)
+        self.assertEqual(self.provider.decrypt_data(encrypted_list[1]), b"second")
+
+    def test_jwt_sign_verify(self):
+        payload = {"sub": "test", "value": 1}
+        token = self.provider.jwt_sign(payload)
+        self.assertEqual(self.provider.jwt_verify(token), payload)
+
+        detached = self.provider.jwt_sign(
+            payload, include_payload=False, include_certificate=True, include_cert_hash=True
+        )
+        header_b64, body, _sig = detached.split(".")
+        self.assertEqual(body, "")
+        header = json.loads(self._b64decode(header_b64))
+        self.assertEqual(header["alg"], "RS256")
+        self.assertEqual(header["kid"], self.provider.local_sign_kid)
+        self.assertIn("x5c", header)
+        self.assertIn("x5t#S256", header)
+        self.assertEqual(
+            self.provider.jwt_verify(detached, payload=json.dumps(payload).encode()),
+            payload,
+        )
+
+        header_b64, _body, sig = token.split(".")
+        other_body = self.provider.jwt_sign({"sub": "other"}).split(".")[1]
+        with self.assertRaises(ValueError):
+            self.provider.jwt_verify(f"{header_b64}.{other_body}.{sig}")
+
+        jwks = self.provider.get_jwks()
+        self.assertEqual(len(jwks["keys"]), 1)
+        self.assertEqual(jwks["keys"][0]["kid"], self.provider.local_sign_kid)
+        self.assertNotIn("d", jwks["keys"][0])
+
+    def test_sign_alg_change_requires_rotation(self):
+        old_key = self.provider.local_sign_key
+        old_kid = self.provider.local_sign_kid
+        token = self.provider.jwt_sign({"sub": "test"})
+
+        self.provider.local_sign_alg = "ES256"
+        self.assertEqual(self.provider.local_sign_key, old_key)
+        self.assertEqual(self.provider.local_get_keys()["sign_alg"], "RS256")
+        self.assertEqual(self.provider.jwt_verify(token), {"sub": "test"})
+
+        self.provider.action_local_rotate_sign_key()
+        self.assertNotEqual(self.provider.local_sign_key, old_key)
+        self.assertNotEqual(self.provider.local_sign_kid, old_kid)
+        self.assertEqual(self.provider.local_get_keys()["sign_alg"], "ES256")
+        es_token = self.provider.jwt_sign({"sub": "test"})
+        self.assertEqual(json.loads(self._b64decode(es_token.split(".")[0]))["alg"], "ES256")
+        self.assertEqual(self.provider.jwt_verify(es_token), {"sub": "test"})
+        with self.assertRaises(ValueError):
+            self.provider.jwt_verify(token)
+
+    def test_keystore_file(self):
+        keys = self.provider.local_get_keys()
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+            json.dump(keys, file)
+        self.addCleanup(os.remove, file.name)
+        file_provider = self.env["g2p.encryption.provider"].create(
+            {
+                "name": "Test Local File",
+                "type": "local",
+                "local_key_storage": "file",
+                "local_keystore_path": file.name,
+            }
+        )
+        self.assertFalse(file_provider.local_sign_key)
+        encrypted = file_provider.encrypt_data(b"data")
+        self.assertEqual(self.provider.decrypt_data(encrypted), b"data")
+        self.assertEqual(self.provider.jwt_verify(file_provider.jwt_sign({"sub": "test"})), {"sub": "test"})
+
+        # A replaced keystore file is read again
+        other_keys = dict(keys, encrypt_key=self.provider._local_random_key())
+        with open(file.name, "w") as replaced_file:
+            json.dump(other_keys, replaced_file)
+        stat = os.stat(file.name)
+        os.utime(file.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(file_provider.local_get_keys()["encrypt_key"], other_keys["encrypt_key"])
+        with self.assertRaises(InvalidTag):
+            file_provider.decrypt_data(encrypted)
+
+    @staticmethod
+    def _b64decode(value):
+        return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
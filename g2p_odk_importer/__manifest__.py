@@ -18,6 +18,8 @@
         "security/ir.model.access.csv",
         "views/odk_config_views.xml",
         "views/odk_import_views.xml",
+        "views/odk_import_failure_views.xml",
+        "views/odk_import_run_views.xml",
         "views/odk_menu.xml",
         "views/res_config_view.xml",
     ],
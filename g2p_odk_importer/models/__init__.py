@@ -3,4 +3,7 @@
 from . import odk_client
 from . import odk_config
 from . import odk_import
+from . import odk_import_failure
+from . import odk_import_run
 from . import res_config
+from . import res_partner
@@ -1,19 +1,58 @@
 import base64
-import json
 import logging
 import mimetypes
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
-import jq
 import pytz
 import requests
 from dateutil import parser
+from urllib3.util.retry import Retry
 
 from odoo import _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+
+from odoo.addons.g2p_registry_base.jq_cache import jq_first
+
+from ..odata_stream import ODataStreamParser
+from ..odk_session_cache import odk_session_cache
+from .odk_import_failure import ODK_IMPORT_MAX_ATTEMPTS
 
 _logger = logging.getLogger(__name__)
 
+ODK_IMPORT_PAGE_SIZE = int(os.getenv("G2P_ODK_IMPORT_PAGE_SIZE", "100"))
+# Submissions of a page are parsed one by one and imported in batches of this size
+ODK_IMPORT_CREATE_BATCH_SIZE = int(os.getenv("G2P_ODK_IMPORT_CREATE_BATCH_SIZE", "20"))
+ODK_IMPORT_REQUEST_TIMEOUT = int(os.getenv("G2P_ODK_IMPORT_REQUEST_TIMEOUT", "60"))
+ODK_ATTACHMENT_WORKERS = int(os.getenv("G2P_ODK_ATTACHMENT_WORKERS", "8"))
+ODK_ATTACHMENT_RETRIES = int(os.getenv("G2P_ODK_ATTACHMENT_RETRIES", "3"))
+ODK_ATTACHMENT_MAX_SIZE = int(os.getenv("G2P_ODK_ATTACHMENT_MAX_SIZE", str(20 * 1024 * 1024)))
+ODK_ATTACHMENT_SPOOL_SIZE = int(os.getenv("G2P_ODK_ATTACHMENT_SPOOL_SIZE", str(1024 * 1024)))
+# Submission pages larger than this are buffered on disk
+ODK_IMPORT_PAGE_SPOOL_SIZE = int(os.getenv("G2P_ODK_IMPORT_PAGE_SPOOL_SIZE", str(4 * 1024 * 1024)))
+ODK_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Key of mapped group vals holding the household members, until they are created by
+# create_household_members
+PENDING_MEMBERS_KEY = "_odk_pending_members"
+
+
+def parse_datetime(value):
+    """
+    Parses an ISO 8601 timestamp, as returned by ODK Central, with datetime.fromisoformat.
+    Falls back to dateutil for other formats.
+    """
+    try:
+        return datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    except ValueError:
+        return parser.parse(value)
+
 
 class ODKClient:
     def __init__(
@@ -35,23 +74,54 @@ class ODKClient:
         self.project_id = project_id
         self.form_id = form_id
         self.session = None
+        # Serializes logging in again from the attachment workers, see get_with_session
+        self.login_lock = threading.Lock()
         self.env = env
         self.json_formatter = json_formatter
         self.target_registry = target_registry
-
-    def login(self):
-        login_url = f"{self.base_url}/v1/sessions"
-        headers = {"Content-Type": "application/json"}
-        data = json.dumps({"email": self.username, "password": self.password})
+        self.http = None
+        self.failed_count = 0
+        self.skipped_count = 0
+        self.stats = self.new_stats()
+        # Latest submission date (naive UTC) of the imported submissions
+        self.last_submission_date = None
+        # Earliest submission date (naive UTC) of the failed submissions to be retried
+        self.retry_from_date = None
+        # Reference records looked up during this import, see cached_search
+        self.lookup_cache = {}
+        # Attachments prefetched by prefetch_attachments, by instance ID
+        self.attachments = {}
+        # Relative paths of the files stored while mapping the current submission
+        self.stored_paths = []
+
+    def login(self, force=False):
+        """
+        Sets the session token, reusing a cached one for these credentials when still valid.
+        """
+        if force:
+            odk_session_cache.invalidate(self.base_url, self.username, self.password)
         try:
-            response = requests.post(login_url, headers=headers, data=data, timeout=10)
-            response.raise_for_status()
-            if response.status_code == 200:
-                self.session = response.json()["token"]
+            self.session = odk_session_cache.get_token(self.base_url, self.username, self.password)
         except Exception as e:
             _logger.exception("Login failed: %s", e)
             raise ValidationError(f"Login failed: {e}") from e
 
+    def get_with_session(self, get, url, **kwargs):
+        """
+        GETs url with get, requests.get or the get of a pooled session, authorized with the session
+        token. If the cached session was revoked or expired early, logs in again and retries once.
+        When concurrent requests fail with the same session, only the first one logs in.
+        """
+        session = self.session
+        response = get(url, headers={"Authorization": f"Bearer {session}"}, **kwargs)
+        if response.status_code != 401:
+            return response
+        response.close()
+        with self.login_lock:
+            if self.session == session:
+                self.login(force=True)
+        return get(url, headers={"Authorization": f"Bearer {self.session}"}, **kwargs)
+
     def test_connection(self):
         if not self.session:
             raise ValidationError(_("Session not created"))
@@ -68,61 +138,403 @@ class ODKClient:
             _logger.exception("Connection test failed: %s", e)
             raise ValidationError(f"Connection test failed: {e}") from e
 
-    # ruff: noqa: C901
-    def import_delta_records(self, last_sync_timestamp=None, skip=0):
+    def import_delta_records(self, last_sync_timestamp=None, skip=0, on_page=None):
+        """
+        Pulls submissions page by page, ordered by submission date then instance ID, so pages
+        stay stable across submissions with the same date, and imports each page.
+        After each page, on_page(skip) is called with the $skip of the next page,
+        so the caller can checkpoint and resume from there.
+        """
         url = f"{self.base_url}/v1/projects/{self.project_id}/forms/{self.form_id}.svc/Submissions"
         params = {
             "$skip": skip,
+            "$top": ODK_IMPORT_PAGE_SIZE,
             "$count": "true",
             "$expand": "*",
+            "$orderby": "__system/submissionDate,__id",
         }
         if last_sync_timestamp:
             startdate = last_sync_timestamp.strftime("%Y-%m-%dT%H:%M:%S.000Z")
             params["$filter"] = f"__system/submissionDate ge {startdate}"
 
-        headers = {"Authorization": f"Bearer {self.session}"}
+        partner_count = 0
+        self.failed_count = 0
+        self.skipped_count = 0
+        self.stats = self.new_stats()
+        self.last_submission_date = None
+        self.retry_from_date = None
+        data = {"value": []}
+        while True:
+            page_info = {}
+            page_count = 0
+            submissions = self.iter_submissions_page(url, params, page_info)
+            for batch in split_every(ODK_IMPORT_CREATE_BATCH_SIZE, submissions, list):
+                partner_count += self.import_submissions(batch)
+                page_count += len(batch)
+            if not page_count:
+                break
+
+            self.stats["pages_fetched"] += 1
+            data.update(page_info)
+            skip += page_count
+            if on_page:
+                on_page(skip)
+
+            next_link = page_info.get("@odata.nextLink")
+            if next_link:
+                url, params = next_link, None
+            elif params and page_count >= ODK_IMPORT_PAGE_SIZE:
+                params["$skip"] = skip
+            else:
+                break
+
+        if partner_count or self.failed_count:
+            data.update({"form_updated": True})
+        data.update(
+            {
+                "partner_count": partner_count,
+                "failed_count": self.failed_count,
+                "skipped_count": self.skipped_count,
+                "last_submission_date": self.get_sync_date(),
+                "stats": self.stats,
+            }
+        )
+
+        return data
+
+    def iter_submissions_page(self, url, params, page_info):
+        """
+        Yields the submissions of a page one by one, as they are parsed.
+        The page is first read into a spooled temporary file and the response closed,
+        so the connection isn't held open, and can't time out, while the submissions
+        are imported. The other members of the response, like @odata.nextLink,
+        are added to page_info.
+        """
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=10)
+            response = self.get_with_session(
+                requests.get, url, params=params, timeout=ODK_IMPORT_REQUEST_TIMEOUT, stream=True
+            )
             response.raise_for_status()
-            data = response.json()
         except requests.RequestException as e:
             _logger.exception("Failed to parse response: %s", e)
             raise ValidationError(f"Failed to parse response: {e}") from e
 
+        page = tempfile.SpooledTemporaryFile(max_size=ODK_IMPORT_PAGE_SPOOL_SIZE)  # noqa: SIM115
+        try:
+            with self.timed("http_time"):
+                try:
+                    for chunk in response.iter_content(chunk_size=ODK_STREAM_CHUNK_SIZE):
+                        page.write(chunk)
+                finally:
+                    response.close()
+                page.seek(0)
+
+            odata_parser = ODataStreamParser(iter(lambda: page.read(ODK_STREAM_CHUNK_SIZE), b""))
+            yield from odata_parser
+            page_info.update(odata_parser.metadata)
+        except (requests.RequestException, ValueError) as e:
+            _logger.exception("Failed to parse response: %s", e)
+            raise ValidationError(f"Failed to parse response: {e}") from e
+        finally:
+            page.close()
+
+    def import_submissions(self, submissions):
         # Sort the list of submissions based on the submission_time field if it exists
-        data["value"] = sorted(
-            data["value"],
+        submissions = sorted(
+            submissions,
             key=lambda x: (
                 x.get("submission_time") in (None, ""),  # True for invalid times, sorts to end
-                parser.parse(x["submission_time"]) if x.get("submission_time") not in (None, "") else None,
+                parse_datetime(x["submission_time"]) if x.get("submission_time") not in (None, "") else None,
             ),
         )
+        for member in submissions:
+            submission_date = self.get_submission_date(member)
+            if submission_date and (
+                not self.last_submission_date or submission_date > self.last_submission_date
+            ):
+                self.last_submission_date = submission_date
+        self.stats["submissions_seen"] += len(submissions)
+        instance_ids = {self.get_instance_id(member) for member in submissions} - {None}
+        with self.timed("db_time"):
+            submissions = self.skip_imported_submissions(submissions)
+            submissions = self.skip_exhausted_submissions(submissions)
+        with self.timed("http_time"):
+            self.prefetch_attachments(submissions)
+        mapped_submissions = []
+        try:
+            with self.timed("mapping_time"):
+                for member in submissions:
+                    _logger.info("ODK RAW DATA:%s" % member)
+                    self.stored_paths = []
+                    try:
+                        with self.env.cr.savepoint():
+                            mapped_submissions.append((member, self.map_submission(member)))
+                    except Exception as e:
+                        self.delete_stored_files()
+                        self.record_failure(member, e)
+        finally:
+            self.clear_attachments()
+
         partner_count = 0
-        for member in data["value"]:
-            _logger.info("ODK RAW DATA:%s" % member)
-            try:
-                mapped_json = jq.first(self.json_formatter, member)
-                if self.target_registry == "individual":
-                    mapped_json.update({"is_registrant": True, "is_group": False})
-                elif self.target_registry == "group":
-                    mapped_json.update({"is_registrant": True, "is_group": True})
+        with self.timed("db_time"):
+            mapped_submissions = self.create_household_members(mapped_submissions)
+            for chunk in split_every(ODK_IMPORT_CREATE_BATCH_SIZE, mapped_submissions, list):
+                partner_count += self.create_partners(chunk)
+            self.env["odk.import.failure"].clear_resolved_failures(self.id, instance_ids)
+        return partner_count
+
+    @staticmethod
+    def new_stats():
+        return {
+            "pages_fetched": 0,
+            "submissions_seen": 0,
+            "attachment_bytes": 0,
+            "http_time": 0.0,
+            "mapping_time": 0.0,
+            "db_time": 0.0,
+        }
 
-                self.handle_one2many_fields(mapped_json)
-                self.handle_media_import(member, mapped_json)
+    @contextmanager
+    def timed(self, stat_name):
+        """
+        Adds the time spent in the enclosed block to stats[stat_name].
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stats[stat_name] += time.perf_counter() - start
+
+    def create_household_members(self, mapped_submissions):
+        """
+        Creates the members of all the households in mapped_submissions with one create call,
+        and adds them to the membership and relationship commands of their household.
+        If that fails, members are created household by household, and the failing households
+        are recorded and dropped. Returns the mapped submissions left.
+        """
+        households = [
+            (member, vals, vals.pop(PENDING_MEMBERS_KEY))
+            for member, vals in mapped_submissions
+            if PENDING_MEMBERS_KEY in vals
+        ]
+        if not households:
+            return mapped_submissions
 
-                updated_mapped_json = self.get_addl_data(mapped_json)
+        try:
+            with self.env.cr.savepoint():
+                individuals = (
+                    self.env["res.partner"]
+                    .sudo()
+                    .create(
+                        [
+                            self.get_individual_data(household_member)
+                            for _member, _vals, household_members in households
+                            for household_member in household_members
+                        ]
+                    )
+                )
+                offset = 0
+                for _member, vals, household_members in households:
+                    self.add_household_members(
+                        vals, household_members, individuals[offset : offset + len(household_members)]
+                    )
+                    offset += len(household_members)
+            return mapped_submissions
+        except Exception:
+            _logger.info("Bulk create of household members failed. Retrying household by household.")
 
-                self.env["res.partner"].sudo().create(updated_mapped_json)
-                partner_count += 1
-                data.update({"form_updated": True})
+        failed_households = set()
+        for member, vals, household_members in households:
+            try:
+                with self.env.cr.savepoint():
+                    self.add_household_members(vals, household_members)
             except Exception as e:
-                data.update({"form_failed": True})
-                _logger.error("An exception occurred%s" % e)
-                raise ValidationError(f"The following errors occurred:\n{e}") from e
-
-        data.update({"partner_count": partner_count})
+                self.record_failure(member, e)
+                self.unlink_supporting_documents(vals)
+                failed_households.add(id(vals))
+        return [(member, vals) for member, vals in mapped_submissions if id(vals) not in failed_households]
+
+    def add_household_members(self, vals, household_members, individuals=None):
+        """
+        Sets the membership and relationship commands of the group vals for household_members,
+        creating their individuals unless given.
+        """
+        if individuals is None:
+            individuals = (
+                self.env["res.partner"]
+                .sudo()
+                .create(
+                    [self.get_individual_data(household_member) for household_member in household_members]
+                )
+            )
+        individual_ids = []
+        relationships_ids = []
+        for individual_mem, individual in zip(household_members, individuals, strict=True):
+            kind = self.get_member_kind(individual_mem)
+            individual_data = {"individual": individual.id}
+            if kind:
+                individual_data["kind"] = [(4, kind.id)]
+            relationship = self.get_member_relationship(individual.id, individual_mem)
+            if relationship:
+                relationships_ids.append((0, 0, relationship))
+            individual_ids.append((0, 0, individual_data))
+        vals["related_1_ids"] = relationships_ids
+        vals["group_membership_ids"] = individual_ids
+
+    def create_partners(self, mapped_submissions):
+        """
+        Creates the partners of mapped_submissions, a list of (submission, vals), in one call.
+        If that fails, creates them one by one, recording the failing submissions.
+        Returns the number of partners created.
+        """
+        partner_model = self.env["res.partner"].sudo()
+        try:
+            with self.env.cr.savepoint():
+                partner_model.create([vals for _member, vals in mapped_submissions])
+            return len(mapped_submissions)
+        except Exception:
+            _logger.info(
+                "Batch create failed for %s ODK submissions. Retrying one by one.", len(mapped_submissions)
+            )
 
-        return data
+        partner_count = 0
+        for member, vals in mapped_submissions:
+            try:
+                with self.env.cr.savepoint():
+                    partner_model.create(vals)
+                partner_count += 1
+            except Exception as e:
+                self.record_failure(member, e)
+                # Members created while mapping this household are not part of any group now
+                member_ids = [
+                    command[2]["individual"]
+                    for command in vals.get("group_membership_ids") or []
+                    if command[0] == 0 and command[2].get("individual")
+                ]
+                if member_ids:
+                    partner_model.browse(member_ids).unlink()
+                self.unlink_supporting_documents(vals)
+        return partner_count
+
+    def unlink_supporting_documents(self, vals):
+        """
+        Unlinks the storage files stored for the supporting documents of a dropped submission.
+        The stored objects are deleted by the storage file garbage collection.
+        """
+        document_ids = [
+            command[1] for command in vals.get("supporting_documents_ids") or [] if command[0] == 4
+        ]
+        if document_ids:
+            self.env["storage.file"].sudo().browse(document_ids).unlink()
+
+    def delete_stored_files(self):
+        """
+        Deletes the objects stored while mapping the current submission, whose storage files
+        were rolled back with its savepoint.
+        """
+        if self.stored_paths:
+            self.get_storage_backend().sudo().delete_unreferenced_files(self.stored_paths)
+        self.stored_paths = []
+
+    def record_failure(self, member, error):
+        """
+        Records the failed submission. Until it failed ODK_IMPORT_MAX_ATTEMPTS times,
+        the sync date is kept before it, so the next import retries it.
+        """
+        _logger.error("An exception occurred%s" % error)
+        self.failed_count += 1
+        failure = self.env["odk.import.failure"].record_failure(self.id, member, error)
+        submission_date = self.get_submission_date(member)
+        if (
+            submission_date
+            and failure.attempt_count < ODK_IMPORT_MAX_ATTEMPTS
+            and (not self.retry_from_date or submission_date < self.retry_from_date)
+        ):
+            self.retry_from_date = submission_date
+
+    def get_sync_date(self):
+        """
+        Returns the date the next import should fetch submissions from: the latest submission
+        imported, or the earliest failed submission to be retried.
+        """
+        if self.retry_from_date and self.last_submission_date:
+            return min(self.retry_from_date, self.last_submission_date)
+        return self.last_submission_date
+
+    def get_instance_id(self, member):
+        return member.get("__id") or (member.get("meta") or {}).get("instanceID")
+
+    def get_submission_date(self, member):
+        """
+        Returns the submission date of the submission as a naive UTC datetime.
+        """
+        submission_date_str = (member.get("__system") or {}).get("submissionDate")
+        if not submission_date_str:
+            return None
+        return parse_datetime(submission_date_str).astimezone(pytz.UTC).replace(tzinfo=None)
+
+    def skip_imported_submissions(self, submissions):
+        """
+        Drops the submissions whose instance ID was already imported, or is repeated.
+        """
+        instance_ids = {self.get_instance_id(member) for member in submissions} - {None}
+        if not instance_ids:
+            return submissions
+        seen_instance_ids = {
+            partner["odk_instance_id"]
+            for partner in self.env["res.partner"]
+            .sudo()
+            .with_context(active_test=False)
+            .search_read([("odk_instance_id", "in", list(instance_ids))], ["odk_instance_id"])
+        }
+        new_submissions = []
+        for member in submissions:
+            instance_id = self.get_instance_id(member)
+            if instance_id in seen_instance_ids:
+                _logger.info("ODK submission %s was already imported. Skipping.", instance_id)
+                self.skipped_count += 1
+                continue
+            if instance_id:
+                seen_instance_ids.add(instance_id)
+            new_submissions.append(member)
+        return new_submissions
+
+    def skip_exhausted_submissions(self, submissions):
+        """
+        Drops the submissions that failed ODK_IMPORT_MAX_ATTEMPTS times. They stay in the failed
+        submissions, and can still be imported by instance ID.
+        """
+        instance_ids = {self.get_instance_id(member) for member in submissions} - {None}
+        exhausted_instance_ids = self.env["odk.import.failure"].get_exhausted_instance_ids(
+            self.id, instance_ids
+        )
+        if not exhausted_instance_ids:
+            return submissions
+        new_submissions = []
+        for member in submissions:
+            instance_id = self.get_instance_id(member)
+            if instance_id in exhausted_instance_ids:
+                _logger.info("ODK submission %s failed too many times. Skipping.", instance_id)
+                self.skipped_count += 1
+                continue
+            new_submissions.append(member)
+        return new_submissions
+
+    def map_submission(self, member):
+        mapped_json = jq_first(self.json_formatter, member)
+        if self.target_registry == "individual":
+            mapped_json.update({"is_registrant": True, "is_group": False})
+        elif self.target_registry == "group":
+            mapped_json.update({"is_registrant": True, "is_group": True})
+
+        instance_id = self.get_instance_id(member)
+        if instance_id:
+            mapped_json["odk_instance_id"] = instance_id
+
+        self.handle_one2many_fields(mapped_json)
+        self.handle_media_import(member, mapped_json)
+
+        return self.get_addl_data(mapped_json)
 
     def handle_one2many_fields(self, mapped_json):
         if "phone_number_ids" in mapped_json:
@@ -140,28 +552,13 @@ class ODKClient:
             ]
 
         if "group_membership_ids" in mapped_json and self.target_registry == "group":
-            individual_ids = []
-            relationships_ids = []
-            group_membership_data = (
+            mapped_json[PENDING_MEMBERS_KEY] = (
                 mapped_json.get("group_membership_ids")
                 if mapped_json.get("group_membership_ids") is not None
                 else []
             )
-
-            for individual_mem in group_membership_data:
-                individual_data = self.get_individual_data(individual_mem)
-                individual = self.env["res.partner"].sudo().create(individual_data)
-                if individual:
-                    kind = self.get_member_kind(individual_mem)
-                    individual_data = {"individual": individual.id}
-                    if kind:
-                        individual_data["kind"] = [(4, kind.id)]
-                    relationship = self.get_member_relationship(individual.id, individual_mem)
-                    if relationship:
-                        relationships_ids.append((0, 0, relationship))
-                    individual_ids.append((0, 0, individual_data))
-            mapped_json["related_1_ids"] = relationships_ids
-            mapped_json["group_membership_ids"] = individual_ids
+            mapped_json["related_1_ids"] = []
+            mapped_json["group_membership_ids"] = []
 
         if "reg_ids" in mapped_json:
             mapped_json["reg_ids"] = [
@@ -169,9 +566,9 @@ class ODKClient:
                     0,
                     0,
                     {
-                        "id_type": self.env["g2p.id.type"]
-                        .search([("name", "=", reg_id.get("id_type"))], limit=1)
-                        .id,
+                        "id_type": self.cached_search(
+                            self.env["g2p.id.type"], "name", reg_id.get("id_type")
+                        ).id,
                         "value": reg_id.get("value"),
                         "expiry_date": reg_id.get("expiry_date"),
                     },
@@ -188,49 +585,166 @@ class ODKClient:
         if not instance_id:
             return
 
-        exit_attachment = self.list_expected_attachments(
-            self.base_url, self.project_id, self.form_id, instance_id, self.session
-        )
-        if not exit_attachment:
+        # Attachments are downloaded by prefetch_attachments before mapping
+        attachments = self.attachments.get(instance_id)
+        if isinstance(attachments, Exception):
+            raise attachments
+        if not attachments:
             return
 
         first_image_stored = False
-        for attachment in exit_attachment:
-            filename = attachment["name"]
-            get_attachment = self.download_attachment(
-                self.base_url, self.project_id, self.form_id, instance_id, filename, self.session
-            )
-            attachment_base64 = base64.b64encode(get_attachment).decode("utf-8")
-            image_verify = self.is_image(filename)
-
-            if not first_image_stored and image_verify and "image_1920" in mapped_json:
-                mapped_json["image_1920"] = attachment_base64
+        supporting_documents = []
+        for filename, attachment in attachments:
+            if not first_image_stored and self.is_image(filename) and "image_1920" in mapped_json:
+                attachment.seek(0)
+                mapped_json["image_1920"] = base64.b64encode(attachment.read()).decode("utf-8")
                 first_image_stored = True
             else:
-                backend_id = (
-                    self.env.ref("storage_backend.default_storage_backend").id
-                    or self.env["storage.backend"].search([], limit=1).id
-                )
-                mapped_json["supporting_documents_ids"] = [
-                    (
-                        0,
-                        0,
-                        {
-                            "backend_id": backend_id,
-                            "name": attachment["name"],
-                            "data": attachment_base64,
-                        },
-                    )
-                ]
+                storage_file = self.get_storage_backend().sudo().add_file_stream(attachment, name=filename)
+                self.stored_paths.append(storage_file.relative_path)
+                supporting_documents.append((4, storage_file.id))
+        if supporting_documents:
+            mapped_json.setdefault("supporting_documents_ids", []).extend(supporting_documents)
+
+    def get_http_session(self):
+        """
+        Returns a session with a connection pool sized for the attachment workers,
+        retrying failed GETs with backoff.
+        """
+        if not self.http:
+            retry = Retry(
+                total=ODK_ATTACHMENT_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"GET"}),
+            )
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=ODK_ATTACHMENT_WORKERS, max_retries=retry
+            )
+            self.http = requests.Session()
+            self.http.mount("http://", adapter)
+            self.http.mount("https://", adapter)
+        return self.http
+
+    def prefetch_attachments(self, submissions):
+        """
+        Downloads the attachments of all the given submissions in parallel, over the pooled session.
+        Listing and downloads are pipelined: each submission's downloads are queued as soon as
+        its listing is done. Results (or the error) are kept in self.attachments by instance ID,
+        for handle_media_import.
+        """
+        instance_ids = [
+            member["meta"]["instanceID"]
+            for member in submissions
+            if (member.get("meta") or {}).get("instanceID")
+        ]
+        if not instance_ids:
+            return
+
+        http = self.get_http_session()
+        with ThreadPoolExecutor(max_workers=ODK_ATTACHMENT_WORKERS) as executor:
+            listings = {
+                instance_id: executor.submit(self.fetch_attachment_list, http, instance_id)
+                for instance_id in instance_ids
+            }
+            downloads = {}
+            for instance_id, listing in listings.items():
+                try:
+                    downloads[instance_id] = [
+                        (
+                            attachment["name"],
+                            executor.submit(self.fetch_attachment, http, instance_id, attachment["name"]),
+                        )
+                        for attachment in listing.result() or []
+                        if attachment.get("exists", True)
+                    ]
+                except Exception as e:
+                    downloads[instance_id] = e
+
+            for instance_id, instance_downloads in downloads.items():
+                if isinstance(instance_downloads, Exception):
+                    self.attachments[instance_id] = instance_downloads
+                    continue
+                try:
+                    self.attachments[instance_id] = [
+                        (filename, download.result()) for filename, download in instance_downloads
+                    ]
+                except Exception as e:
+                    self.attachments[instance_id] = e
+                    continue
+                for _filename, content in self.attachments[instance_id]:
+                    self.stats["attachment_bytes"] += content.seek(0, os.SEEK_END)
+                    content.seek(0)
+
+    def fetch_attachment_list(self, http, instance_id):
+        url = (
+            f"{self.base_url}/v1/projects/{self.project_id}/forms/{self.form_id}/"
+            f"submissions/{instance_id}/attachments"
+        )
+        response = self.get_with_session(http.get, url, timeout=ODK_IMPORT_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def fetch_attachment(self, http, instance_id, filename):
+        """
+        Streams an attachment into a temporary file, spooled to disk beyond G2P_ODK_ATTACHMENT_SPOOL_SIZE.
+        Fails as soon as it exceeds G2P_ODK_ATTACHMENT_MAX_SIZE.
+        """
+        url = (
+            f"{self.base_url}/v1/projects/{self.project_id}/forms/{self.form_id}/"
+            f"submissions/{instance_id}/attachments/{filename}"
+        )
+        with self.get_with_session(
+            http.get, url, timeout=ODK_IMPORT_REQUEST_TIMEOUT, stream=True
+        ) as response:
+            response.raise_for_status()
+            content_length = response.headers.get("Content-Length")
+            if content_length and int(content_length) > ODK_ATTACHMENT_MAX_SIZE:
+                raise ValidationError(_("Attachment %s is larger than the allowed size.") % filename)
+            content = tempfile.SpooledTemporaryFile(max_size=ODK_ATTACHMENT_SPOOL_SIZE)  # noqa: SIM115
+            try:
+                for chunk in response.iter_content(chunk_size=ODK_STREAM_CHUNK_SIZE):
+                    content.write(chunk)
+                    if content.tell() > ODK_ATTACHMENT_MAX_SIZE:
+                        raise ValidationError(_("Attachment %s is larger than the allowed size.") % filename)
+            except Exception:
+                content.close()
+                raise
+        content.seek(0)
+        return content
+
+    def clear_attachments(self):
+        for attachments in self.attachments.values():
+            if not isinstance(attachments, Exception):
+                for _filename, content in attachments:
+                    content.close()
+        self.attachments = {}
+
+    def cached_search(self, model, field_name, value):
+        """
+        Returns the first record of model with field_name = value. Results are cached for
+        the lifetime of the client, as reference data doesn't change during an import.
+        """
+        key = (model._name, field_name, value)
+        if key not in self.lookup_cache:
+            self.lookup_cache[key] = model.search([(field_name, "=", value)], limit=1)
+        return self.lookup_cache[key]
+
+    def get_storage_backend(self):
+        if "storage.backend" not in self.lookup_cache:
+            self.lookup_cache["storage.backend"] = self.env.ref(
+                "storage_backend.default_storage_backend", raise_if_not_found=False
+            ) or self.env["storage.backend"].search([], limit=1)
+        return self.lookup_cache["storage.backend"]
 
     def get_member_kind(self, record):
         kind_as_str = record.get("kind", None)
-        kind = self.env["g2p.group.membership.kind"].search([("name", "=", kind_as_str)], limit=1)
+        kind = self.cached_search(self.env["g2p.group.membership.kind"], "name", kind_as_str)
         return kind
 
     def get_member_relationship(self, source_id, record):
         member_relation = record.get("relationship_with_head", None)
-        relation = self.env["g2p.relationship"].search([("name", "=", member_relation)], limit=1)
+        relation = self.cached_search(self.env["g2p.relationship"], "name", member_relation)
 
         if relation:
             return {"source": source_id, "relation": relation.id, "start_date": datetime.now()}
@@ -241,7 +755,7 @@ class ODKClient:
 
     def get_gender(self, gender_val):
         if gender_val:
-            gender = self.env["gender.type"].sudo().search([("value", "=", gender_val)], limit=1)
+            gender = self.cached_search(self.env["gender.type"].sudo(), "value", gender_val)
             return gender.code if gender else None
         return None
 
@@ -287,23 +801,6 @@ class ODKClient:
         mimetype, _ = mimetypes.guess_type(filename)
         return mimetype and mimetype.startswith("image")
 
-    def list_expected_attachments(self, base_url, project_id, form_id, instance_id, session_token):
-        url = f"{base_url}/v1/projects/{project_id}/forms/{form_id}/submissions/{instance_id}/attachments"
-        headers = {"Authorization": f"Bearer {session_token}"}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.json()
-
-    def download_attachment(self, base_url, project_id, form_id, instance_id, filename, session_token):
-        url = (
-            f"{base_url}/v1/projects/{project_id}/forms/{form_id}/"
-            f"submissions/{instance_id}/attachments/{filename}"
-        )
-        headers = {"Authorization": f"Bearer {session_token}"}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.content
-
     #  Fetch Record using Instance ID
     def import_record_by_instance_id(self, instance_id, last_sync_timestamp=None):
         url = (
@@ -332,34 +829,38 @@ class ODKClient:
         else:
             last_sync_time = None
 
+        submissions = self.skip_imported_submissions(data["value"])
+        if data["value"] and not submissions:
+            data.update({"already_imported": True})
+            return data
+
         try:
-            for member in data["value"]:
+            self.prefetch_attachments(submissions)
+            for member in submissions:
                 submission_date_str = member.get("__system", {}).get("submissionDate")
                 if submission_date_str:
                     # Parse submissionDate to a timezone-aware datetime object
-                    submission_date = parser.isoparse(submission_date_str)
+                    submission_date = parse_datetime(submission_date_str)
                     if last_sync_time and last_sync_time < submission_date:
                         raise UserError(
                             _("Future records cannot be fetched before the regular import occurs.")
                         )
 
-                mapped_json = jq.first(self.json_formatter, member)
-                if self.target_registry == "individual":
-                    mapped_json.update({"is_registrant": True, "is_group": False})
-                elif self.target_registry == "group":
-                    mapped_json.update({"is_registrant": True, "is_group": True})
-
-                self.handle_one2many_fields(mapped_json)
-                self.handle_media_import(member, mapped_json)
-
-                updated_mapped_json = self.get_addl_data(mapped_json)
+                updated_mapped_json = self.map_submission(member)
+                if PENDING_MEMBERS_KEY in updated_mapped_json:
+                    self.add_household_members(
+                        updated_mapped_json, updated_mapped_json.pop(PENDING_MEMBERS_KEY)
+                    )
                 self.env["res.partner"].sudo().create(updated_mapped_json)
 
+            self.env["odk.import.failure"].clear_resolved_failures(self.id, [instance_id])
             data.update({"form_updated": True})
 
         except Exception as e:
             data.update({"form_failed": True})
             _logger.error("An exception occurred by instanceID%s" % e)
             raise ValidationError(f"The following errors occurred by instanceID:\n{e}") from e
+        finally:
+            self.clear_attachments()
 
         return data
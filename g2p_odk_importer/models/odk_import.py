@@ -1,4 +1,5 @@
 import logging
+import threading
 from datetime import datetime, timedelta
 
 import jq
@@ -6,6 +7,8 @@ import jq
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError, ValidationError
 
+from odoo.addons.g2p_registry_base.jq_cache import compile_jq
+
 from .odk_client import ODKClient
 
 _logger = logging.getLogger(__name__)
@@ -20,7 +23,15 @@ class OdkImport(models.Model):
     json_formatter = fields.Text(string="JSON Formatter", required=True)
     target_registry = fields.Selection([("individual", "Individual"), ("group", "Group")], required=True)
     last_sync_time = fields.Datetime(string="Last synced on", required=False)
+    # Resume point of an interrupted import: the $skip of the next page to fetch,
+    # and the submission date filter of that import.
+    checkpoint_skip = fields.Integer(readonly=True, default=0)
+    checkpoint_sync_time = fields.Datetime(readonly=True)
     cron_id = fields.Many2one("ir.cron", string="Cron Job", required=False)
+    failure_ids = fields.One2many("odk.import.failure", "import_id", string="Failed Submissions")
+    failure_count = fields.Integer(compute="_compute_failure_count")
+    run_ids = fields.One2many("odk.import.run", "import_id", string="Import Runs")
+    run_count = fields.Integer(compute="_compute_run_count")
     job_status = fields.Selection(
         [
             ("draft", "Draft"),
@@ -45,6 +56,38 @@ class OdkImport(models.Model):
         for record in self:
             record.enable_import_instance = config_value
 
+    @api.depends("failure_ids")
+    def _compute_failure_count(self):
+        for rec in self:
+            rec.failure_count = len(rec.failure_ids)
+
+    @api.depends("run_ids")
+    def _compute_run_count(self):
+        for rec in self:
+            rec.run_count = len(rec.run_ids)
+
+    def open_runs_tree(self):
+        self.ensure_one()
+        return {
+            "name": _("Import Runs"),
+            "type": "ir.actions.act_window",
+            "res_model": "odk.import.run",
+            "view_mode": "tree,form",
+            "domain": [("import_id", "=", self.id)],
+            "context": {"default_import_id": self.id},
+        }
+
+    def open_failures_tree(self):
+        self.ensure_one()
+        return {
+            "name": _("Failed Submissions"),
+            "type": "ir.actions.act_window",
+            "res_model": "odk.import.failure",
+            "view_mode": "tree,form",
+            "domain": [("import_id", "=", self.id)],
+            "context": {"default_import_id": self.id},
+        }
+
     # ********** Fetch record using instance ID ************
     instance_id = fields.Char()
 
@@ -78,6 +121,9 @@ class OdkImport(models.Model):
             if "form_updated" in imported:
                 message = "ODK form records is imported successfully."
                 types = "success"
+            elif "already_imported" in imported:
+                message = "This ODK form record was already imported."
+                types = "warning"
             elif "form_failed" in imported:
                 message = "ODK form import failed"
                 types = "danger"
@@ -96,6 +142,15 @@ class OdkImport(models.Model):
 
     # ******************  END  ***************************
 
+    def write(self, vals):
+        if "json_formatter" in vals:
+            compile_jq.cache_clear()
+        return super().write(vals)
+
+    def unlink(self):
+        compile_jq.cache_clear()
+        return super().unlink()
+
     @api.constrains("json_formatter")
     def constraint_json_fields(self):
         for rec in self:
@@ -149,19 +204,44 @@ class OdkImport(models.Model):
                 config.json_formatter,
             )
             client.login()
-            imported = client.import_delta_records(last_sync_timestamp=config.last_sync_time)
+            if config.checkpoint_skip:
+                _logger.info("Resuming ODK import %s from $skip %s", config.id, config.checkpoint_skip)
+                sync_time = config.checkpoint_sync_time
+            else:
+                sync_time = config.last_sync_time
+                config.checkpoint_sync_time = sync_time
+            # Users only read runs, the ledger is written by the import itself
+            run = self.env["odk.import.run"].sudo().create({"import_id": config.id})
+            config._commit()
+            try:
+                imported = client.import_delta_records(
+                    last_sync_timestamp=sync_time,
+                    skip=config.checkpoint_skip,
+                    on_page=config._checkpoint_page,
+                )
+            except Exception as e:
+                # Keep the pages committed so far, and record the failed run
+                config._rollback()
+                run.finish_run(stats=client.stats, error=e)
+                config._commit()
+                raise
+            run.finish_run(imported)
             if "form_updated" in imported:
                 partner_count = imported.get("partner_count", 0)
                 message = f"ODK form {partner_count} records were imported successfully."
                 types = "success"
-                config.update({"last_sync_time": fields.Datetime.now()})
+                failed_count = imported.get("failed_count", 0)
+                if failed_count:
+                    message += f" {failed_count} submissions failed, see Failed Submissions."
+                    types = "warning"
+                config._finish_import(imported.get("last_submission_date"))
             elif "form_failed" in imported:
                 message = "ODK form import failed"
                 types = "danger"
             else:
                 message = "No new form records were submitted."
                 types = "warning"
-                config.update({"last_sync_time": fields.Datetime.now()})
+                config._finish_import(imported.get("last_submission_date"))
             return {
                 "type": "ir.actions.client",
                 "tag": "display_notification",
@@ -172,6 +252,34 @@ class OdkImport(models.Model):
                 },
             }
 
+    def _checkpoint_page(self, skip):
+        """
+        Records the $skip of the next page and commits the imported page,
+        so a failed import resumes from the next page instead of restarting.
+        """
+        self.ensure_one()
+        self.checkpoint_skip = skip
+        self._commit()
+
+    def _commit(self):
+        if not getattr(threading.current_thread(), "testing", False):
+            self.env.cr.commit()  # pylint: disable=invalid-commit
+
+    def _rollback(self):
+        if not getattr(threading.current_thread(), "testing", False):
+            self.env.cr.rollback()  # pylint: disable=invalid-commit
+
+    def _finish_import(self, last_submission_date=None):
+        """
+        Clears the checkpoint and moves last_sync_time to the latest submission imported.
+        As the next import includes submissions from that date on, already imported ones
+        are fetched again and skipped by instance ID.
+        """
+        vals = {"checkpoint_skip": 0, "checkpoint_sync_time": False}
+        if last_submission_date:
+            vals["last_sync_time"] = last_submission_date
+        self.write(vals)
+
     def odk_import_action_trigger(self):
         for rec in self:
             if rec.job_status == "draft" or rec.job_status == "completed":
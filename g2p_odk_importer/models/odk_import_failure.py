@@ -0,0 +1,76 @@
+import json
+import os
+
+from odoo import api, fields, models
+
+# Failed submissions are retried by the next imports until they failed this many times
+ODK_IMPORT_MAX_ATTEMPTS = int(os.getenv("G2P_ODK_IMPORT_MAX_ATTEMPTS", "3"))
+
+
+class OdkImportFailure(models.Model):
+    _name = "odk.import.failure"
+    _description = "ODK Import Failed Submission"
+    _order = "id desc"
+
+    import_id = fields.Many2one("odk.import", string="ODK Import", required=True, ondelete="cascade")
+    odk_config_name = fields.Char(related="import_id.odk_config_name")
+    instance_id = fields.Char(string="Instance ID", index=True)
+    attempt_count = fields.Integer(string="Attempts", default=1)
+    error = fields.Text()
+    payload = fields.Text()
+
+    @api.model
+    def record_failure(self, import_id, submission, error):
+        """
+        Records a failed submission, or another failed attempt of an already recorded one,
+        found by instance ID.
+        """
+        instance_id = (submission.get("meta") or {}).get("instanceID") or submission.get("__id")
+        vals = {"error": str(error), "payload": json.dumps(submission, default=str)}
+        failure = self.browse()
+        if instance_id:
+            failure = self.sudo().search(
+                [("import_id", "=", import_id), ("instance_id", "=", instance_id)], limit=1
+            )
+        if failure:
+            failure.write(dict(vals, attempt_count=failure.attempt_count + 1))
+            return failure
+        return self.sudo().create(dict(vals, import_id=import_id, instance_id=instance_id))
+
+    @api.model
+    def get_exhausted_instance_ids(self, import_id, instance_ids):
+        """
+        Returns the instance IDs among instance_ids that failed too many times to be retried.
+        """
+        if not instance_ids:
+            return set()
+        failures = self.sudo().search_read(
+            [
+                ("import_id", "=", import_id),
+                ("instance_id", "in", list(instance_ids)),
+                ("attempt_count", ">=", ODK_IMPORT_MAX_ATTEMPTS),
+            ],
+            ["instance_id"],
+        )
+        return {failure["instance_id"] for failure in failures}
+
+    @api.model
+    def clear_resolved_failures(self, import_id, instance_ids):
+        """
+        Deletes the failures among instance_ids whose submission was imported since.
+        """
+        if not instance_ids:
+            return
+        failures = self.sudo().search(
+            [("import_id", "=", import_id), ("instance_id", "in", list(instance_ids))]
+        )
+        if not failures:
+            return
+        imported_instance_ids = {
+            partner["odk_instance_id"]
+            for partner in self.env["res.partner"]
+            .sudo()
+            .with_context(active_test=False)
+            .search_read([("odk_instance_id", "in", failures.mapped("instance_id"))], ["odk_instance_id"])
+        }
+        failures.filtered(lambda failure: failure.instance_id in imported_instance_ids).unlink()
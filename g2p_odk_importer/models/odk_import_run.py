@@ -0,0 +1,104 @@
+import json
+
+from odoo import api, fields, models
+
+RUN_STAT_FIELDS = [
+    "pages_fetched",
+    "submissions_seen",
+    "attachment_bytes",
+    "http_time",
+    "mapping_time",
+    "db_time",
+]
+
+
+class OdkImportRun(models.Model):
+    _name = "odk.import.run"
+    _description = "ODK Import Run"
+    _order = "id desc"
+
+    import_id = fields.Many2one("odk.import", string="ODK Import", required=True, ondelete="cascade")
+    odk_config_name = fields.Char(related="import_id.odk_config_name")
+    state = fields.Selection(
+        [("running", "Running"), ("done", "Done"), ("failed", "Failed")],
+        required=True,
+        default="running",
+    )
+    error = fields.Text()
+    start_datetime = fields.Datetime(string="Start Time", required=True, default=fields.Datetime.now)
+    end_datetime = fields.Datetime(string="End Time")
+    duration = fields.Float(string="Duration (s)", compute="_compute_duration", store=True)
+
+    pages_fetched = fields.Integer()
+    submissions_seen = fields.Integer()
+    submissions_created = fields.Integer()
+    submissions_skipped = fields.Integer()
+    submissions_failed = fields.Integer()
+    submissions_per_second = fields.Float(compute="_compute_duration", store=True)
+    # Float, as the total size of a run's attachments may not fit an Integer
+    attachment_bytes = fields.Float(digits=(16, 0))
+
+    http_time = fields.Float(string="HTTP Time (s)")
+    mapping_time = fields.Float(string="Mapping Time (s)")
+    db_time = fields.Float(string="DB Time (s)")
+
+    @api.depends("start_datetime", "end_datetime", "submissions_seen")
+    def _compute_duration(self):
+        for rec in self:
+            if rec.start_datetime and rec.end_datetime:
+                rec.duration = (rec.end_datetime - rec.start_datetime).total_seconds()
+            else:
+                rec.duration = 0.0
+            rec.submissions_per_second = rec.submissions_seen / rec.duration if rec.duration else 0.0
+
+    def finish_run(self, imported=None, stats=None, error=None):
+        """
+        Records the outcome of the run. imported is the result of ODKClient.import_delta_records,
+        stats the client's stats, which are also available when the import failed.
+        """
+        imported = imported or {}
+        stats = stats or imported.get("stats") or {}
+        vals = {
+            "state": "failed" if error else "done",
+            "error": error and str(error),
+            "end_datetime": fields.Datetime.now(),
+            "submissions_created": imported.get("partner_count", 0),
+            "submissions_skipped": imported.get("skipped_count", 0),
+            "submissions_failed": imported.get("failed_count", 0),
+        }
+        vals.update({stat_name: stats.get(stat_name, 0) for stat_name in RUN_STAT_FIELDS})
+        self.sudo().write(vals)
+
+    def get_run_summaries(self):
+        return [
+            {
+                "id": rec.id,
+                "odk_import_id": rec.import_id.id,
+                "odk_config": rec.odk_config_name,
+                "state": rec.state,
+                "error": rec.error or None,
+                "start_datetime": rec.start_datetime and rec.start_datetime.isoformat(),
+                "end_datetime": rec.end_datetime and rec.end_datetime.isoformat(),
+                "duration": rec.duration,
+                "submissions_created": rec.submissions_created,
+                "submissions_skipped": rec.submissions_skipped,
+                "submissions_failed": rec.submissions_failed,
+                "submissions_per_second": rec.submissions_per_second,
+                **{stat_name: rec[stat_name] for stat_name in RUN_STAT_FIELDS},
+            }
+            for rec in self
+        ]
+
+    def action_export_json(self):
+        attachment = self.env["ir.attachment"].create(
+            {
+                "name": "odk_import_runs.json",
+                "raw": json.dumps(self.get_run_summaries(), indent=2).encode(),
+                "mimetype": "application/json",
+            }
+        )
+        return {
+            "type": "ir.actions.act_url",
+            "url": f"/web/content/{attachment.id}?download=true",
+            "target": "self",
+        }
@@ -0,0 +1,15 @@
+from odoo import fields, models
+
+
+class ResPartner(models.Model):
+    _inherit = "res.partner"
+
+    odk_instance_id = fields.Char(string="ODK Instance ID", readonly=True, copy=False)
+
+    _sql_constraints = [
+        (
+            "odk_instance_id_uniq",
+            "unique(odk_instance_id)",
+            "A registrant was already imported from this ODK submission.",
+        ),
+    ]
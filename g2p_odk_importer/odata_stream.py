@@ -0,0 +1,101 @@
+import codecs
+import json
+
+WHITESPACE = " \t\n\r"
+# Consumed input is dropped from the buffer once it grows beyond this many characters
+BUFFER_COMPACT_SIZE = 64 * 1024
+
+
+class ODataStreamParser:
+    """
+    Incrementally decodes an OData JSON response, {"@odata.count": ..., "value": [...]},
+    from an iterable of byte chunks, like response.iter_content().
+    Iterating over the parser yields the items of the "value" array one at a time, so only
+    the item being decoded is held in memory. The other top-level members are collected
+    in metadata, as they are reached.
+    """
+
+    def __init__(self, chunks):
+        self.metadata = {}
+        self._chunks = iter(chunks)
+        self._utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._decode_value()
+            self._expect(":")
+            if key == "value":
+                yield from self._iter_array()
+            else:
+                self.metadata[key] = self._decode_value()
+            if self._expect(",}") == "}":
+                return
+
+    def _iter_array(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._decode_value()
+            if self._expect(",]") == "]":
+                return
+
+    def _decode_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and not self._eof:
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at position {self._pos}, got {char!r}")
+        self._pos += 1
+        return char
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                return ""
+            self._fill()
+
+    def _fill(self):
+        """
+        Reads chunks until the unconsumed input at least doubles, so that decoding
+        a value spanning many chunks is retried a logarithmic number of times.
+        """
+        if self._pos > BUFFER_COMPACT_SIZE:
+            self._buffer = self._buffer[self._pos :]
+            self._pos = 0
+        target_size = 2 * (len(self._buffer) - self._pos) or 1
+        while not self._eof and len(self._buffer) - self._pos < target_size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._buffer += self._utf8_decoder.decode(b"", final=True)
+                self._eof = True
+            elif chunk:
+                self._buffer += self._utf8_decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
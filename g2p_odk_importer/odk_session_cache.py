@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from dateutil import parser
+
+_logger = logging.getLogger(__name__)
+
+ODK_SESSION_EXPIRY_MARGIN = int(os.getenv("G2P_ODK_SESSION_EXPIRY_MARGIN", "300"))
+ODK_SESSION_DEFAULT_TTL = int(os.getenv("G2P_ODK_SESSION_DEFAULT_TTL", "3600"))
+ODK_LOGIN_TIMEOUT = 10
+
+
+class ODKSessionCache:
+    """
+    In-process cache of ODK Central session tokens, by base URL and credentials.
+    - A token is reused until expiry_margin seconds before its expiresAt.
+    - Logins for the same credentials are single-flight: concurrent callers wait
+      for the one login in progress and reuse its token.
+    - Changing the password of a config changes the key, so the old token is not used.
+    """
+
+    def __init__(self, expiry_margin=ODK_SESSION_EXPIRY_MARGIN, default_ttl=ODK_SESSION_DEFAULT_TTL):
+        self.expiry_margin = expiry_margin
+        self.default_ttl = default_ttl
+        self._entries = {}
+        self._login_locks = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, base_url: str, username: str, password: str) -> str:
+        key = self._get_key(base_url, username, password)
+        token = self._get_valid_token(key)
+        if token:
+            return token
+
+        with self._lock:
+            login_lock = self._login_locks.setdefault(key, threading.Lock())
+        with login_lock:
+            token = self._get_valid_token(key)
+            if token:
+                return token
+            token, expires_at = self._login(base_url, username, password)
+            with self._lock:
+                self._entries[key] = (token, expires_at)
+            return token
+
+    def invalidate(self, base_url: str, username: str, password: str):
+        with self._lock:
+            self._entries.pop(self._get_key(base_url, username, password), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_valid_token(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[1] - self.expiry_margin > time.time():
+            return entry[0]
+        return None
+
+    def _login(self, base_url, username, password):
+        login_url = f"{base_url.rstrip('/')}/v1/sessions"
+        headers = {"Content-Type": "application/json"}
+        data = json.dumps({"email": username, "password": password})
+        response = requests.post(login_url, headers=headers, data=data, timeout=ODK_LOGIN_TIMEOUT)
+        response.raise_for_status()
+        session = response.json()
+        expires_at = session.get("expiresAt")
+        if expires_at:
+            expires_at = parser.isoparse(expires_at).timestamp()
+        else:
+            expires_at = time.time() + self.default_ttl
+        _logger.info("Logged in to ODK Central %s as %s", base_url, username)
+        return session["token"], expires_at
+
+    @staticmethod
+    def _get_key(base_url, username, password):
+        return (
+            base_url.rstrip("/"),
+            username,
+            hashlib.sha256((password or "").encode()).hexdigest(),
+        )
+
+
+odk_session_cache = ODKSessionCache()
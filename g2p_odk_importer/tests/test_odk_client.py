@@ -1,9 +1,15 @@
+import io
+import json
+import threading
+import time
 from datetime import datetime
 from unittest.mock import MagicMock, patch
 
 from odoo.tests.common import TransactionCase
 
-from odoo.addons.g2p_odk_importer.models.odk_client import ODKClient
+from odoo.addons.g2p_odk_importer.models.odk_client import ODKClient, parse_datetime
+from odoo.addons.g2p_odk_importer.odata_stream import ODataStreamParser
+from odoo.addons.g2p_odk_importer.odk_session_cache import odk_session_cache
 
 
 class TestODKClient(TransactionCase):
@@ -30,6 +36,10 @@ class TestODKClient(TransactionCase):
             cls.json_formatter,
         )
 
+    def setUp(self):
+        super().setUp()
+        odk_session_cache.clear()
+
     @patch("requests.post")
     def test_login_success(self, mock_post):
         mock_response = MagicMock()
@@ -52,6 +62,68 @@ class TestODKClient(TransactionCase):
         odk_client.login()
         self.assertEqual(odk_client.session, "test_token")
 
+    @patch("requests.post")
+    def test_login_reuses_session(self, mock_post):
+        def login(*args, **kwargs):
+            time.sleep(0.1)
+            return mock_response
+
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"token": "test_token", "expiresAt": "2999-01-01T00:00:00.000Z"}
+        mock_post.side_effect = login
+
+        def new_client(password=self.password):
+            return ODKClient(
+                self.env_mock,
+                1,
+                self.base_url,
+                self.username,
+                password,
+                self.project_id,
+                self.form_id,
+                self.target_registry,
+                self.json_formatter,
+            )
+
+        clients = [new_client() for _i in range(4)]
+        threads = [threading.Thread(target=client.login) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual({client.session for client in clients}, {"test_token"})
+
+        new_client().login()
+        self.assertEqual(mock_post.call_count, 1)
+
+        new_client().login(force=True)
+        self.assertEqual(mock_post.call_count, 2)
+
+        new_client(password="changed_password").login()
+        self.assertEqual(mock_post.call_count, 3)
+
+    @patch("requests.post")
+    def test_login_expired_session(self, mock_post):
+        mock_post.return_value.json.return_value = {
+            "token": "test_token",
+            "expiresAt": "2000-01-01T00:00:00.000Z",
+        }
+        odk_client = ODKClient(
+            self.env_mock,
+            1,
+            self.base_url,
+            self.username,
+            self.password,
+            self.project_id,
+            self.form_id,
+            self.target_registry,
+            self.json_formatter,
+        )
+        odk_client.login()
+        odk_client.login()
+        self.assertEqual(mock_post.call_count, 2)
+
     @patch("requests.get")
     def test_test_connection_success(self, mock_get):
         mock_response = MagicMock()
@@ -79,6 +151,7 @@ class TestODKClient(TransactionCase):
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {"value": [{"name": "John Doe"}]}
+        mock_response.iter_content.return_value = [json.dumps(mock_response.json.return_value).encode()]
         mock_get.return_value = mock_response
 
         odk_client = ODKClient(
@@ -97,6 +170,66 @@ class TestODKClient(TransactionCase):
         result = odk_client.import_delta_records()
         self.assertIn("value", result)
 
+    @patch("requests.get")
+    def test_import_delta_records_paged(self, mock_get):
+        first_page = MagicMock()
+        first_page.iter_content.return_value = [
+            b'{"@odata.count": 3, "value": [{"name": "John Doe"}, ',
+            b'{"name": "Jane Doe"}], "@odata.nextLink": "http://example.com/next-page"}',
+        ]
+        last_page = MagicMock()
+        last_page.iter_content.return_value = [b'{"value": [{"name": "Jim Doe"}]}']
+        mock_get.side_effect = [first_page, last_page]
+
+        odk_client = ODKClient(
+            self.env_mock,
+            1,
+            self.base_url,
+            self.username,
+            self.password,
+            self.project_id,
+            self.form_id,
+            self.target_registry,
+            self.json_formatter,
+        )
+        odk_client.session = "test_token"
+        checkpoints = []
+        result = odk_client.import_delta_records(skip=10, on_page=checkpoints.append)
+
+        self.assertEqual(result["partner_count"], 3)
+        self.assertEqual(checkpoints, [12, 13])
+        self.assertEqual(mock_get.call_args_list[0].kwargs["params"]["$skip"], 10)
+        self.assertIn("$top", mock_get.call_args_list[0].kwargs["params"])
+        self.assertEqual(
+            mock_get.call_args_list[0].kwargs["params"]["$orderby"], "__system/submissionDate,__id"
+        )
+        self.assertEqual(mock_get.call_args_list[1].args[0], "http://example.com/next-page")
+
+    def test_odata_stream_parser(self):
+        page = {
+            "@odata.context": "http://example.com/$metadata#Submissions",
+            "@odata.count": 1024,
+            "value": [{"__id": f"uuid:{i}", "name": "Jöhn Doe", "members": [{"age": i}]} for i in range(10)],
+            "@odata.nextLink": "http://example.com/next-page",
+        }
+        raw = json.dumps(page, ensure_ascii=False, indent=2).encode()
+        for chunk_size in (1, 7, len(raw)):
+            odata_parser = ODataStreamParser(raw[i : i + chunk_size] for i in range(0, len(raw), chunk_size))
+            self.assertEqual(list(odata_parser), page["value"])
+            self.assertEqual(odata_parser.metadata["@odata.count"], 1024)
+            self.assertEqual(odata_parser.metadata["@odata.nextLink"], "http://example.com/next-page")
+
+        with self.assertRaises(ValueError):
+            list(ODataStreamParser([b'{"value": [{"name": "John Doe"}, ']))
+
+    def test_parse_datetime(self):
+        self.assertEqual(
+            parse_datetime("2024-07-01T10:00:00.123Z").replace(tzinfo=None),
+            datetime(2024, 7, 1, 10, 0, 0, 123000),
+        )
+        self.assertEqual(parse_datetime("2024-07-01T10:00:00.1Z").microsecond, 100000)
+        self.assertEqual(parse_datetime("July 1 2024 10:00"), datetime(2024, 7, 1, 10, 0))
+
     def test_handle_one2many_fields(self):
         mapped_json = {
             "phone_number_ids": [
@@ -109,19 +242,36 @@ class TestODKClient(TransactionCase):
         self.assertIn("phone_number_ids", mapped_json)
         self.assertIn("reg_ids", mapped_json)
 
-    @patch("requests.get")
-    def test_handle_media_import(self, mock_get):
+    def test_handle_media_import(self):
         member = {"meta": {"instanceID": "test_instance"}}
         mapped_json = {}
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.content = b"fake_image_data"
-        mock_get.return_value.json.return_value = [{"name": "test_image.jpg"}]
+        self.client.attachments = {"test_instance": [("test_image.jpg", io.BytesIO(b"fake_image_data"))]}
 
         self.client.handle_media_import(member, mapped_json)
         self.assertIn("supporting_documents_ids", mapped_json)
 
-    def test_get_dob(self):
-        record = {"birthdate": "2000-01-01", "age": 4}
+        # Submissions without prefetched attachments have none
+        mapped_json = {}
+        self.client.handle_media_import({"meta": {"instanceID": "other_instance"}}, mapped_json)
+        self.assertNotIn("supporting_documents_ids", mapped_json)
+        self.client.clear_attachments()
+
+    def test_prefetch_attachments(self):
+        def http_get(url, **kwargs):
+            response = MagicMock()
+            response.__enter__.return_value = response
+            response.headers = {}
+            if url.endswith("/attachments"):
+                if "instance_2" in url:
+                    response.raise_for_status.side_effect = Exception("Listing failed")
+                response.json.return_value = [
+                    {"name": "photo.jpg", "exists": True},
+                    {"name": "missing.jpg", "exists": False},
+                ]
+            else:
+                response.iter_content.return_value = [b"fake_", b"image_data"]
+            return response
+
         odk_client = ODKClient(
             self.env_mock,
             1,
@@ -133,15 +283,43 @@ class TestODKClient(TransactionCase):
             self.target_registry,
             self.json_formatter,
         )
+        odk_client.http = MagicMock()
+        odk_client.http.get.side_effect = http_get
 
-        dob = odk_client.get_dob(record)
-        self.assertEqual(dob, "2000-01-01")
+        odk_client.prefetch_attachments(
+            [
+                {"meta": {"instanceID": "instance_1"}},
+                {"meta": {"instanceID": "instance_2"}},
+                {"name": "No attachments"},
+            ]
+        )
 
-        record = {"age": 4}
-        dob = odk_client.get_dob(record)
-        self.assertEqual(dob[:4], str(datetime.now().year - 4))
+        [(filename, content)] = odk_client.attachments["instance_1"]
+        self.assertEqual(filename, "photo.jpg")
+        self.assertEqual(content.read(), b"fake_image_data")
+        self.assertIsInstance(odk_client.attachments["instance_2"], Exception)
+
+        mapped_json = {}
+        odk_client.handle_media_import({"meta": {"instanceID": "instance_1"}}, mapped_json)
+        self.assertEqual(len(mapped_json["supporting_documents_ids"]), 1)
+        with self.assertRaisesRegex(Exception, "Listing failed"):
+            odk_client.handle_media_import({"meta": {"instanceID": "instance_2"}}, {})
+
+        odk_client.clear_attachments()
+        self.assertTrue(content.closed)
+
+    def test_prefetch_attachments_login_again(self):
+        def http_get(url, headers=None, **kwargs):
+            response = MagicMock()
+            response.__enter__.return_value = response
+            response.headers = {}
+            response.status_code = 401 if headers["Authorization"] == "Bearer expired_token" else 200
+            if url.endswith("/attachments"):
+                response.json.return_value = [{"name": "photo.jpg"}]
+            else:
+                response.iter_content.return_value = [b"image_data"]
+            return response
 
-    def test_is_image(self):
         odk_client = ODKClient(
             self.env_mock,
             1,
@@ -153,37 +331,127 @@ class TestODKClient(TransactionCase):
             self.target_registry,
             self.json_formatter,
         )
+        odk_client.session = "expired_token"
+        odk_client.http = MagicMock()
+        odk_client.http.get.side_effect = http_get
 
-        result = odk_client.is_image("test.jpg")
-        self.assertTrue(result)
+        def login(force=False):
+            odk_client.session = "new_token"
 
-    @patch("requests.get")
-    def test_list_expected_attachments(self, mock_get):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = [{"name": "test.jpg"}]
+        with patch.object(odk_client, "login", side_effect=login) as mock_login:
+            odk_client.prefetch_attachments(
+                [{"meta": {"instanceID": "instance_1"}}, {"meta": {"instanceID": "instance_2"}}]
+            )
 
+        # Concurrent requests failing with the same session log in once
+        mock_login.assert_called_once_with(force=True)
+        for instance_id in ("instance_1", "instance_2"):
+            [(_filename, content)] = odk_client.attachments[instance_id]
+            self.assertEqual(content.read(), b"image_data")
+        odk_client.clear_attachments()
+
+    def test_create_household_members(self):
+        env_mock = MagicMock()
         odk_client = ODKClient(
-            self.env_mock,
+            env_mock,
             1,
             self.base_url,
             self.username,
             self.password,
             self.project_id,
             self.form_id,
-            self.target_registry,
+            "group",
             self.json_formatter,
         )
+        partner_model = env_mock["res.partner"].sudo.return_value
+        partner_model.create.return_value = [MagicMock(id=101), MagicMock(id=102), MagicMock(id=103)]
+
+        households = []
+        for members in (["John Doe", "Jane Doe"], ["Jim Roe"]):
+            mapped_json = {
+                "name": "Household",
+                "group_membership_ids": [{"name": name, "kind": "Head"} for name in members],
+            }
+            odk_client.handle_one2many_fields(mapped_json)
+            self.assertEqual(mapped_json["group_membership_ids"], [])
+            households.append(({}, mapped_json))
 
-        result = odk_client.list_expected_attachments(
-            "http://example.com", "1", "1", "test_instance", "fake_token"
+        result = odk_client.create_household_members(households)
+
+        self.assertEqual(len(result), 2)
+        partner_model.create.assert_called_once()
+        self.assertEqual(
+            [vals["name"] for vals in partner_model.create.call_args.args[0]],
+            ["John Doe", "Jane Doe", "Jim Roe"],
+        )
+        self.assertEqual(
+            [command[2]["individual"] for command in households[0][1]["group_membership_ids"]], [101, 102]
         )
-        self.assertIn({"name": "test.jpg"}, result)
+        self.assertEqual(
+            [command[2]["individual"] for command in households[1][1]["group_membership_ids"]], [103]
+        )
+        self.assertNotIn("_odk_pending_members", households[0][1])
 
-    @patch("requests.get")
-    def test_download_attachment(self, mock_get):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.content = b"fake_image_data"
+    def test_create_household_members_drops_failed_households(self):
+        env_mock = MagicMock()
+        odk_client = ODKClient(
+            env_mock,
+            1,
+            self.base_url,
+            self.username,
+            self.password,
+            self.project_id,
+            self.form_id,
+            "group",
+            self.json_formatter,
+        )
+        partner_model = env_mock["res.partner"].sudo.return_value
+        # The bulk create fails, then the first household succeeds and the second fails
+        partner_model.create.side_effect = [ValueError("Bulk"), [MagicMock(id=101)], ValueError("Bad member")]
+
+        households = []
+        for name, document_id in (("John Doe", 7), ("Jim Roe", 8)):
+            mapped_json = {
+                "name": "Household",
+                "group_membership_ids": [{"name": name, "kind": "Head"}],
+                "supporting_documents_ids": [(4, document_id)],
+            }
+            odk_client.handle_one2many_fields(mapped_json)
+            households.append(({}, mapped_json))
+
+        result = odk_client.create_household_members(households)
+
+        self.assertEqual(result, households[:1])
+        self.assertEqual(odk_client.failed_count, 1)
+        storage_file_model = env_mock["storage.file"].sudo.return_value
+        storage_file_model.browse.assert_called_once_with([8])
+        storage_file_model.browse.return_value.unlink.assert_called_once()
+
+    def test_cached_lookups(self):
+        env_mock = MagicMock()
+        odk_client = ODKClient(
+            env_mock,
+            1,
+            self.base_url,
+            self.username,
+            self.password,
+            self.project_id,
+            self.form_id,
+            self.target_registry,
+            self.json_formatter,
+        )
+        gender_model = env_mock["gender.type"].sudo.return_value
+
+        for _i in range(3):
+            odk_client.get_gender("Female")
+            odk_client.get_storage_backend()
+        odk_client.get_gender("Male")
+
+        self.assertEqual(gender_model.search.call_count, 2)
+        env_mock.ref.assert_called_once()
 
+    def test_get_dob(self):
+        record = {"birthdate": "2000-01-01", "age": 4}
         odk_client = ODKClient(
             self.env_mock,
             1,
@@ -196,10 +464,28 @@ class TestODKClient(TransactionCase):
             self.json_formatter,
         )
 
-        result = odk_client.download_attachment(
-            "http://example.com", "1", "1", "test_instance", "test.jpg", "fake_token"
+        dob = odk_client.get_dob(record)
+        self.assertEqual(dob, "2000-01-01")
+
+        record = {"age": 4}
+        dob = odk_client.get_dob(record)
+        self.assertEqual(dob[:4], str(datetime.now().year - 4))
+
+    def test_is_image(self):
+        odk_client = ODKClient(
+            self.env_mock,
+            1,
+            self.base_url,
+            self.username,
+            self.password,
+            self.project_id,
+            self.form_id,
+            self.target_registry,
+            self.json_formatter,
         )
-        self.assertEqual(result, b"fake_image_data")
+
+        result = odk_client.is_image("test.jpg")
+        self.assertTrue(result)
 
     @patch("requests.get")
     def test_import_record_by_instance_id_success(self, mock_get):
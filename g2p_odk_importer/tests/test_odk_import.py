@@ -1,5 +1,9 @@
+import base64
+import json
+from datetime import datetime
 from unittest.mock import patch
 
+from odoo.exceptions import ValidationError
 from odoo.tests.common import TransactionCase
 
 from odoo.addons.g2p_odk_importer.models.odk_client import ODKClient
@@ -93,3 +97,234 @@ class TestOdkImport(TransactionCase):
         self.assertTrue(mock_import_delta_records.called)
         self.assertEqual(result["params"]["type"], "warning")
         self.assertEqual(result["params"]["message"], "No new form records were submitted.")
+
+    @patch.object(ODKClient, "login")
+    @patch.object(ODKClient, "import_delta_records")
+    def test_import_records_resume_from_checkpoint(self, mock_import_delta_records, mock_login):
+        odk_import = self.env["odk.import"].create(
+            {
+                "odk_config": self.odk_config.id,
+                "target_registry": self.target_registry,
+                "json_formatter": self.json_formatter,
+                "last_sync_time": "2024-07-02 00:00:00",
+            }
+        )
+        odk_import.write({"checkpoint_skip": 200, "checkpoint_sync_time": "2024-07-01 00:00:00"})
+
+        def import_delta_records(last_sync_timestamp=None, skip=0, on_page=None):
+            on_page(skip + 100)
+            self.assertEqual(odk_import.checkpoint_skip, 300)
+            return {"form_updated": True, "partner_count": 100}
+
+        mock_import_delta_records.side_effect = import_delta_records
+
+        odk_import.import_records()
+
+        kwargs = mock_import_delta_records.call_args.kwargs
+        self.assertEqual(kwargs["skip"], 200)
+        self.assertEqual(str(kwargs["last_sync_timestamp"]), "2024-07-01 00:00:00")
+        self.assertEqual(odk_import.checkpoint_skip, 0)
+        self.assertFalse(odk_import.checkpoint_sync_time)
+
+    def test_import_submissions_isolates_failures(self):
+        odk_import = self.env["odk.import"].create(
+            {
+                "odk_config": self.odk_config.id,
+                "target_registry": "individual",
+                "json_formatter": ".",
+            }
+        )
+        client = ODKClient(
+            self.env,
+            odk_import.id,
+            self.base_url,
+            self.username,
+            self.password,
+            self.project_id,
+            self.form_id,
+            "individual",
+            ".",
+        )
+        submissions = [
+            {"name": "ODK Good Registrant 1"},
+            {"name": "ODK Bad Registrant", "meta": {"instanceID": "uuid:bad"}, "no_such_field": 1},
+            {"name": "ODK Good Registrant 2"},
+        ]
+
+        partner_count = client.import_submissions(submissions)
+
+        self.assertEqual(partner_count, 2)
+        self.assertEqual(client.failed_count, 1)
+        self.assertEqual(self.env["res.partner"].search_count([("name", "like", "ODK Good Registrant")]), 2)
+        self.assertEqual(odk_import.failure_count, 1)
+        self.assertEqual(odk_import.failure_ids.instance_id, "uuid:bad")
+        self.assertIn("no_such_field", odk_import.failure_ids.payload)
+
+    def test_import_submissions_idempotent(self):
+        client = ODKClient(
+            self.env,
+            1,
+            self.base_url,
+            self.username,
+            self.password,
+            self.project_id,
+            self.form_id,
+            "individual",
+            "{name: .name}",
+        )
+        submission = {
+            "__id": "uuid:odk-idempotent",
+            "__system": {"submissionDate": "2024-07-01T10:00:00.123Z"},
+            "name": "ODK Idempotent Registrant",
+        }
+
+        self.assertEqual(client.import_submissions([submission, dict(submission)]), 1)
+        self.assertEqual(client.skipped_count, 1)
+        self.assertEqual(client.last_submission_date, datetime(2024, 7, 1, 10, 0, 0, 123000))
+
+        self.assertEqual(client.import_submissions([submission]), 0)
+        self.assertEqual(client.skipped_count, 2)
+        partner = self.env["res.partner"].search([("odk_instance_id", "=", "uuid:odk-idempotent")])
+        self.assertEqual(partner.name, "ODK Idempotent Registrant")
+
+    def test_import_submissions_retries_failures(self):
+        json_formatter = "{name: .name} + (if .bad then {no_such_field: 1} else {} end)"
+        odk_import = self.env["odk.import"].create(
+            {
+                "odk_config": self.odk_config.id,
+                "target_registry": "individual",
+                "json_formatter": json_formatter,
+            }
+        )
+        client = ODKClient(
+            self.env,
+            odk_import.id,
+            self.base_url,
+            self.username,
+            self.password,
+            self.project_id,
+            self.form_id,
+            "individual",
+            json_formatter,
+        )
+        bad_submission = {
+            "__id": "uuid:odk-retry",
+            "__system": {"submissionDate": "2024-07-01T10:00:00.000Z"},
+            "name": "ODK Retried Registrant",
+            "bad": True,
+        }
+        good_submission = {
+            "__id": "uuid:odk-retry-good",
+            "__system": {"submissionDate": "2024-07-01T11:00:00.000Z"},
+            "name": "ODK Retry Good Registrant",
+        }
+
+        # The sync date stays before the failed submission, and retries update its failure
+        for attempt in range(1, 4):
+            client.retry_from_date = None
+            client.import_submissions([bad_submission, good_submission])
+            self.assertEqual(odk_import.failure_count, 1)
+            self.assertEqual(odk_import.failure_ids.attempt_count, attempt)
+            self.assertEqual(client.get_sync_date(), datetime(2024, 7, 1, 10 if attempt < 3 else 11, 0, 0))
+
+        # Once exhausted, the failed submission is skipped and the sync date moves past it
+        client.retry_from_date = None
+        client.failed_count = 0
+        client.skipped_count = 0
+        client.import_submissions([bad_submission, good_submission])
+        self.assertEqual(client.failed_count, 0)
+        self.assertEqual(client.skipped_count, 2)
+        self.assertEqual(odk_import.failure_ids.attempt_count, 3)
+        self.assertEqual(client.get_sync_date(), datetime(2024, 7, 1, 11, 0, 0))
+
+        # Failures of submissions imported since are cleared
+        self.env["res.partner"].create(
+            {"name": "ODK Retried Registrant", "odk_instance_id": "uuid:odk-retry"}
+        )
+        client.import_submissions([bad_submission])
+        self.assertFalse(odk_import.failure_ids)
+
+    @patch.object(ODKClient, "login")
+    @patch.object(ODKClient, "import_delta_records")
+    def test_import_run_ledger(self, mock_import_delta_records, mock_login):
+        odk_import = self.env["odk.import"].create(
+            {
+                "odk_config": self.odk_config.id,
+                "target_registry": self.target_registry,
+                "json_formatter": self.json_formatter,
+            }
+        )
+        mock_import_delta_records.return_value = {
+            "form_updated": True,
+            "partner_count": 8,
+            "skipped_count": 1,
+            "failed_count": 1,
+            "stats": {
+                "pages_fetched": 1,
+                "submissions_seen": 10,
+                "attachment_bytes": 2048,
+                "http_time": 1.5,
+                "mapping_time": 0.5,
+                "db_time": 0.25,
+            },
+        }
+
+        odk_import.import_records()
+
+        run = odk_import.run_ids
+        self.assertEqual(odk_import.run_count, 1)
+        self.assertEqual(run.state, "done")
+        self.assertEqual(run.submissions_seen, 10)
+        self.assertEqual(run.submissions_created, 8)
+        self.assertEqual(run.submissions_skipped, 1)
+        self.assertEqual(run.submissions_failed, 1)
+        self.assertEqual(run.http_time, 1.5)
+        self.assertTrue(run.end_datetime)
+
+        mock_import_delta_records.side_effect = ValidationError("ODK is down")
+        with self.assertRaises(ValidationError):
+            odk_import.import_records()
+        failed_run = odk_import.run_ids.filtered(lambda r: r.state == "failed")
+        self.assertIn("ODK is down", failed_run.error)
+
+        action = odk_import.run_ids.action_export_json()
+        self.assertEqual(action["type"], "ir.actions.act_url")
+        attachment = self.env["ir.attachment"].browse(int(action["url"].split("/")[3].split("?")[0]))
+        summaries = json.loads(base64.b64decode(attachment.datas))
+        self.assertEqual({summary["state"] for summary in summaries}, {"done", "failed"})
+        self.assertEqual(
+            next(summary for summary in summaries if summary["state"] == "done")["attachment_bytes"], 2048
+        )
+
+    @patch.object(ODKClient, "login")
+    @patch.object(ODKClient, "import_delta_records")
+    def test_import_run_ledger_non_admin(self, mock_import_delta_records, mock_login):
+        user = self.env["res.users"].create(
+            {
+                "name": "ODK Import User",
+                "login": "odk_import_user",
+                "groups_id": [(6, 0, [self.env.ref("base.group_user").id])],
+            }
+        )
+        odk_import = (
+            self.env["odk.import"]
+            .with_user(user)
+            .create(
+                {
+                    "odk_config": self.odk_config.id,
+                    "target_registry": self.target_registry,
+                    "json_formatter": self.json_formatter,
+                }
+            )
+        )
+        mock_import_delta_records.return_value = {"form_updated": True, "partner_count": 2}
+
+        odk_import.import_records()
+
+        self.assertEqual(odk_import.run_ids.state, "done")
+        self.assertEqual(odk_import.run_ids.submissions_created, 2)
+
+        mock_import_delta_records.side_effect = ValidationError("ODK is down")
+        with self.assertRaises(ValidationError):
+            odk_import.import_records()
+        self.assertEqual(set(odk_import.run_ids.mapped("state")), {"done", "failed"})
@@ -1,4 +1,3 @@
-import json
 import logging
 
 import requests
@@ -6,6 +5,8 @@ import requests
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError, ValidationError
 
+from odoo.addons.g2p_odk_importer.odk_session_cache import odk_session_cache
+
 _logger = logging.getLogger(__name__)
 
 
@@ -38,14 +39,8 @@ class ResPartner(models.Model):
             return {"domain": {"odk_app_user": []}}
 
     def _login(self, base_url, username, password):
-        login_url = f"{base_url}/v1/sessions"
-        headers = {"Content-Type": "application/json"}
-        data = json.dumps({"email": username, "password": password})
         try:
-            response = requests.post(login_url, headers=headers, data=data, timeout=10)
-            response.raise_for_status()
-            if response.status_code == 200:
-                self.session = response.json()["token"]
+            self.session = odk_session_cache.get_token(base_url, username, password)
         except Exception as e:
             _logger.exception("Login failed: %s", e)
             raise ValidationError(f"Login failed: {e}") from e
@@ -10,10 +10,12 @@
     "depends": [
         "g2p_registry_base",
         "g2p_encryption",
+        "queue_job",
     ],
     "external_dependencies": {"python": ["cryptography>36,<37", "python-jose", "jq", "PyLD"]},
     "data": [
         "security/ir.model.access.csv",
+        "data/queue_job_channel.xml",
         "views/vci_issuers.xml",
     ],
     "assets": {
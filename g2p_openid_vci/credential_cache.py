@@ -0,0 +1,47 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CREDENTIAL_CACHE_MAX_SIZE = int(os.getenv("G2P_VCI_CREDENTIAL_CACHE_MAX_SIZE", "1024"))
+
+
+class CredentialCache:
+    """
+    In-process LRU cache of credentials with a per-entry expiry.
+    Values are deep copied in and out, so callers can modify them freely.
+    """
+
+    def __init__(self, max_size=CREDENTIAL_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key, value, ttl: int):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+credential_cache = CredentialCache()
@@ -0,0 +1,79 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+_request_timings = contextvars.ContextVar("g2p_vci_request_timings", default=None)
+
+
+class IssuanceMetrics:
+    """
+    Process-wide counters of time spent per VC issuance stage.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage_name: str, elapsed: float):
+        with self._lock:
+            stage_metrics = self._stages.setdefault(stage_name, {"count": 0, "total": 0.0, "max": 0.0})
+            stage_metrics["count"] += 1
+            stage_metrics["total"] += elapsed
+            stage_metrics["max"] = max(stage_metrics["max"], elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                stage_name: {
+                    "count": stage_metrics["count"],
+                    "total_ms": round(1000 * stage_metrics["total"], 3),
+                    "avg_ms": round(1000 * stage_metrics["total"] / stage_metrics["count"], 3),
+                    "max_ms": round(1000 * stage_metrics["max"], 3),
+                }
+                for stage_name, stage_metrics in self._stages.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+issuance_metrics = IssuanceMetrics()
+
+
+@contextmanager
+def issuance_stage(stage_name: str):
+    """
+    Times the enclosed block, adding it to the process-wide metrics and to the
+    timings of the current request, if collected with collect_issuance_timings.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        issuance_metrics.record(stage_name, elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage_name] = timings.get(stage_name, 0.0) + elapsed
+
+
+@contextmanager
+def collect_issuance_timings():
+    """
+    Collects {stage_name: seconds} of the stages run within the block.
+    """
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def format_server_timing(timings: dict) -> str:
+    """
+    Formats timings as a Server-Timing header value.
+    """
+    return ", ".join(f"{stage_name};dur={1000 * elapsed:.3f}" for stage_name, elapsed in timings.items())
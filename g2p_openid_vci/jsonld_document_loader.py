@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from pyld import jsonld
+
+from odoo.tools import misc
+
+_logger = logging.getLogger(__name__)
+
+JSONLD_CONTEXT_CACHE_TTL = int(os.getenv("G2P_VCI_JSONLD_CONTEXT_CACHE_TTL", "3600"))
+JSONLD_ALLOW_REMOTE_CONTEXTS = os.getenv("G2P_VCI_JSONLD_ALLOW_REMOTE_CONTEXTS", "true").lower() == "true"
+
+BUNDLED_CONTEXTS = {
+    "https://www.w3.org/2018/credentials/v1": "credentials_v1.jsonld",
+    "https://w3id.org/security/v1": "security_v1.jsonld",
+    "https://w3id.org/security/v2": "security_v2.jsonld",
+}
+
+
+class CachingDocumentLoader:
+    """
+    pyld document loader that serves the bundled W3C contexts from memory,
+    serves local documents (like our own contexts.json) through a callable
+    instead of over HTTP, and caches everything else for a TTL.
+    """
+
+    def __init__(self, ttl=JSONLD_CONTEXT_CACHE_TTL, allow_remote=JSONLD_ALLOW_REMOTE_CONTEXTS):
+        self.ttl = ttl
+        self.allow_remote = allow_remote
+        self._bundled = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._remote_loader = None
+
+    def __call__(self, url, options=None, local_documents=None):
+        bundled = self._get_bundled(url)
+        if bundled:
+            return bundled
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(url)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        if local_documents and url in local_documents:
+            document = self._make_remote_document(url, local_documents[url]())
+        elif self.allow_remote:
+            if not self._remote_loader:
+                self._remote_loader = jsonld.requests_document_loader(timeout=10)
+            document = self._remote_loader(url, options or {})
+        else:
+            raise jsonld.JsonLdError(
+                "Remote JSON-LD context loading is disabled.",
+                "jsonld.LoadDocumentError",
+                {"url": url},
+                code="loading document failed",
+            )
+
+        with self._lock:
+            self._cache[url] = (now + self.ttl, document)
+        return document
+
+    def _get_bundled(self, url):
+        file_name = BUNDLED_CONTEXTS.get(url.rstrip("/"))
+        if not file_name:
+            return None
+        if url not in self._bundled:
+            with misc.file_open(os.path.join("g2p_openid_vci", "data", "contexts", file_name)) as file:
+                self._bundled[url] = self._make_remote_document(url, json.load(file))
+        return self._bundled[url]
+
+    def invalidate(self, url=None):
+        with self._lock:
+            if url:
+                self._cache.pop(url, None)
+            else:
+                self._cache.clear()
+
+    @staticmethod
+    def _make_remote_document(url, document):
+        return {
+            "contentType": "application/ld+json",
+            "contextUrl": None,
+            "documentUrl": url,
+            "document": document,
+        }
+
+
+document_loader = CachingDocumentLoader()
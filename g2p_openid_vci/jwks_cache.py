@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+_logger = logging.getLogger(__name__)
+
+AUTH_JWKS_CACHE_TTL = int(os.getenv("G2P_VCI_AUTH_JWKS_CACHE_TTL", "300"))
+AUTH_JWKS_CACHE_STALE_TTL = int(os.getenv("G2P_VCI_AUTH_JWKS_CACHE_STALE_TTL", "3600"))
+AUTH_JWKS_MIN_REFRESH_INTERVAL = int(os.getenv("G2P_VCI_AUTH_JWKS_MIN_REFRESH_INTERVAL", "30"))
+AUTH_JWKS_CACHE_MAX_ENTRIES = int(os.getenv("G2P_VCI_AUTH_JWKS_CACHE_MAX_ENTRIES", "32"))
+AUTH_JWKS_FETCH_TIMEOUT = 20
+
+
+class JWKSUnavailableError(ValueError):
+    pass
+
+
+class _Fetch:
+    """
+    A fetch in progress, shared by the callers that wait for it.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.jwks = None
+        self.error = None
+
+
+class JWKSCache:
+    """
+    Per-URL JWKS cache, holding at most max_entries URLs, least recently used evicted first.
+    - Within ttl, the cached JWKS is returned.
+    - If the requested kid is missing, the JWKS is refetched.
+    - Between ttl and ttl + stale_ttl, the stale JWKS is returned and refreshed
+      in the background.
+    - Beyond that, or when nothing is cached, it is fetched synchronously.
+      If that fetch fails, a stale JWKS is used when available.
+    A URL is fetched by one caller at a time, concurrent callers wait for that
+    fetch. Fetches of a URL, successful or not, are at least min_refresh_interval
+    apart. A URL that failed recently is served from cache if possible, else fails fast.
+    """
+
+    def __init__(
+        self,
+        ttl=AUTH_JWKS_CACHE_TTL,
+        stale_ttl=AUTH_JWKS_CACHE_STALE_TTL,
+        min_refresh_interval=AUTH_JWKS_MIN_REFRESH_INTERVAL,
+        max_entries=AUTH_JWKS_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._fetches = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, kid: str | None = None) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry:
+                self._entries.move_to_end(url)
+        recently_attempted = entry and now - entry["attempted_at"] < self.min_refresh_interval
+
+        if not entry or entry["jwks"] is None:
+            if recently_attempted:
+                raise JWKSUnavailableError(f"Could not fetch JWKS from {url}")
+            return self._refresh(url)
+
+        age = now - entry["fetched_at"]
+        if age >= self.ttl + self.stale_ttl:
+            return entry["jwks"] if recently_attempted else self._refresh(url, fallback=entry["jwks"])
+
+        if age >= self.ttl:
+            if not recently_attempted:
+                self._refresh_in_background(url)
+            return entry["jwks"]
+
+        if kid and not self._has_kid(entry["jwks"], kid) and not recently_attempted:
+            _logger.info("JWKS kid %s not found in cache for %s. Refreshing.", kid, url)
+            return self._refresh(url, fallback=entry["jwks"])
+        return entry["jwks"]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh(self, url, fallback=None):
+        with self._lock:
+            fetch = self._fetches.get(url)
+            is_fetching = fetch is None
+            if is_fetching:
+                fetch = self._fetches[url] = _Fetch()
+
+        if is_fetching:
+            try:
+                fetch.jwks = self._fetch(url)
+            except (requests.RequestException, ValueError) as e:
+                fetch.error = e
+            finally:
+                self._store(url, fetch.jwks)
+                with self._lock:
+                    self._fetches.pop(url, None)
+                fetch.done.set()
+        else:
+            fetch.done.wait(AUTH_JWKS_FETCH_TIMEOUT)
+
+        if fetch.jwks is not None:
+            return fetch.jwks
+        if fallback is None:
+            raise JWKSUnavailableError(f"Could not fetch JWKS from {url}") from fetch.error
+        if is_fetching:
+            _logger.error("Could not refresh JWKS from %s. Using cached JWKS. %s", url, fetch.error)
+        return fallback
+
+    def _store(self, url, jwks):
+        """
+        Records a fetch attempt of url, keeping the previous JWKS if the fetch failed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.pop(url, None) or {"jwks": None, "fetched_at": now}
+            entry["attempted_at"] = now
+            if jwks is not None:
+                entry.update({"jwks": jwks, "fetched_at": now})
+            self._entries[url] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _refresh_in_background(self, url):
+        with self._lock:
+            if url in self._fetches:
+                return
+
+        def refresh():
+            try:
+                self._refresh(url, fallback={})
+            except Exception:
+                _logger.exception("Could not refresh JWKS from %s in background", url)
+
+        threading.Thread(target=refresh, name=f"jwks-refresh-{url}", daemon=True).start()
+
+    def _fetch(self, url):
+        response = requests.get(url, timeout=AUTH_JWKS_FETCH_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _has_kid(jwks, kid):
+        return any(key.get("kid") == kid for key in (jwks or {}).get("keys", []))
+
+
+auth_jwks_cache = JWKSCache()
@@ -1 +1,2 @@
 from . import vci_issuer
+from . import vci_deferred_credential
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import uuid
+from datetime import timedelta
+
+from jose import jwt
+
+from odoo import api, fields, models
+
+from ..json_encoder import VCJSONEncoder
+
+_logger = logging.getLogger(__name__)
+
+DEFERRED_CREDENTIAL_EXPIRY_MINUTES = int(os.getenv("G2P_VCI_DEFERRED_CREDENTIAL_EXPIRY_MINUTES", "60"))
+DEFERRED_CREDENTIAL_INTERVAL = int(os.getenv("G2P_VCI_DEFERRED_CREDENTIAL_INTERVAL", "5"))
+
+
+class OpenIDVCIDeferredCredential(models.Model):
+    _name = "g2p.openid.vci.deferred.credential"
+    _description = "OpenID VCI Deferred Credential"
+    _order = "id desc"
+
+    transaction_id = fields.Char(
+        required=True, index=True, readonly=True, default=lambda self: str(uuid.uuid4())
+    )
+    issuer_id = fields.Many2one("g2p.openid.vci.issuers", required=True, ondelete="cascade")
+    auth_sub = fields.Char("Auth Subject", required=True)
+    credential_sub = fields.Char("Credential Subject")
+    auth_claims = fields.Text()
+    credential_request = fields.Text()
+    state = fields.Selection(
+        [("pending", "Pending"), ("issued", "Issued"), ("failed", "Failed")],
+        required=True,
+        default="pending",
+    )
+    credential_response = fields.Text()
+    error = fields.Text()
+    expiry_datetime = fields.Datetime(
+        required=True,
+        default=lambda self: fields.Datetime.now() + timedelta(minutes=DEFERRED_CREDENTIAL_EXPIRY_MINUTES),
+    )
+
+    _sql_constraints = [
+        ("transaction_id_uniq", "unique(transaction_id)", "Transaction ID must be unique."),
+    ]
+
+    @api.model
+    def create_deferred(
+        self,
+        credential_issuer,
+        auth_claims: dict,
+        credential_request: dict,
+        credential_sub: str | None = None,
+    ) -> dict:
+        """
+        Records the credential request and issues it later in a queue job.
+        credential_sub is the subject of the credential, when a batch client requests one
+        for another subject. The credential is collected with the requesting token.
+        Returns the deferred credential response with the transaction_id.
+        """
+        rec = self.sudo().create(
+            {
+                "issuer_id": credential_issuer.id,
+                "auth_sub": auth_claims["sub"],
+                "credential_sub": credential_sub,
+                "auth_claims": json.dumps(auth_claims),
+                "credential_request": json.dumps(credential_request),
+            }
+        )
+        rec.with_delay(
+            channel="root.vci_deferred_credential",
+            description=f"Deferred credential {rec.transaction_id}",
+        ).process_deferred_credential()
+        return {"transaction_id": rec.transaction_id}
+
+    def process_deferred_credential(self):
+        self.ensure_one()
+        if self.state != "pending":
+            return
+        credential_issuer = self.issuer_id
+        issue_vc_func = getattr(credential_issuer, f"issue_vc_{credential_issuer.issuer_type}")
+        auth_claims = json.loads(self.auth_claims)
+        if self.credential_sub:
+            auth_claims["sub"] = self.credential_sub
+        try:
+            cred_res = issue_vc_func(
+                auth_claims=auth_claims,
+                credential_request=json.loads(self.credential_request),
+            )
+        except Exception as e:
+            _logger.exception("Error while issuing deferred credential")
+            self.write({"state": "failed", "error": str(e)})
+            return
+        self.write({"state": "issued", "credential_response": json.dumps(cred_res, cls=VCJSONEncoder)})
+
+    @api.model
+    def get_deferred_credential(self, transaction_id: str, token: str) -> dict:
+        """
+        Returns the credential response for the transaction_id, once issued. A credential
+        can be collected once, by the same subject that requested it.
+        Returns an error response while issuance is pending.
+        """
+        auth_claims_unverified = jwt.get_unverified_claims(token)
+        rec = self.sudo().search(
+            [
+                ("transaction_id", "=", transaction_id),
+                ("expiry_datetime", ">", fields.Datetime.now()),
+            ],
+            limit=1,
+        )
+        if not rec:
+            return {"error": "invalid_transaction_id", "error_description": "Invalid transaction id."}
+
+        rec.issuer_id.verify_auth_token(token, auth_claims_unverified)
+        if auth_claims_unverified.get("sub") != rec.auth_sub:
+            return {"error": "invalid_transaction_id", "error_description": "Invalid transaction id."}
+
+        if rec.state == "pending":
+            return {
+                "error": "issuance_pending",
+                "error_description": "Credential issuance is pending.",
+                "interval": DEFERRED_CREDENTIAL_INTERVAL,
+            }
+        if rec.state == "failed":
+            error = rec.error
+            rec.unlink()
+            return {
+                "error": "invalid_credential_request",
+                "error_description": f"Error issuing credential. {error}",
+            }
+        cred_res = json.loads(rec.credential_response)
+        rec.unlink()
+        return cred_res
+
+    @api.autovacuum
+    def _gc_expired_deferred_credentials(self):
+        self.sudo().search([("expiry_datetime", "<", fields.Datetime.now())]).unlink()
@@ -1,11 +1,12 @@
+import base64
+import hashlib
 import json
 import logging
 import os
 import uuid
 from datetime import datetime
+from functools import partial
 
-import jq
-import requests
 from cryptography.hazmat.primitives import hashes
 from jose import jwt
 from pyld import jsonld
@@ -13,10 +14,29 @@ from pyld import jsonld
 from odoo import api, fields, models, tools
 from odoo.tools import misc
 
+from odoo.addons.g2p_registry_base.jq_cache import compile_jq, jq_first, jq_referenced_names
+
+from ..credential_cache import credential_cache
+from ..issuance_metrics import issuance_stage
 from ..json_encoder import VCJSONEncoder
+from ..jsonld_document_loader import document_loader
+from ..jwks_cache import auth_jwks_cache
 
 _logger = logging.getLogger(__name__)
 
+# 16 base64 chars decode to 12 bytes, enough to tell WEBP apart
+IMAGE_HEADER_BASE64_LENGTH = 16
+IMAGE_MAGIC_BYTES = [
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"RIFF", "webp"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+]
+
 
 class OpenIDVCIssuer(models.Model):
     _name = "g2p.openid.vci.issuers"
@@ -44,22 +64,195 @@ class OpenIDVCIssuer(models.Model):
     auth_allowed_issuers = fields.Text()
     auth_issuer_jwks_mapping = fields.Text()
     auth_allowed_client_ids = fields.Text("Auth Allowed Client IDs")
+    auth_batch_allowed_client_ids = fields.Text("Auth Batch Allowed Client IDs")
+
+    credential_cache_mode = fields.Selection(
+        [("unsigned", "Registrant data"), ("signed", "Signed credential")],
+        help="Cache credentials per subject until the registrant, its IDs or the issuer change. "
+        "Registrant data caching skips the database reads, and still builds and signs each "
+        "credential, with a new ID and issuance date. "
+        "Signed credential caching serves the same signed credential again. "
+        "Only Registry issuers cache credentials.",
+    )
+    credential_cache_ttl = fields.Integer("Credential Cache TTL (seconds)", default=3600)
+
+    deferred_issuance = fields.Boolean(
+        help="Issue credentials in a queue job, returning a transaction_id to be "
+        "collected from the deferred credential endpoint."
+    )
 
     # These fields cannot be empty. They will get autofilled based on issuer_type
     credential_type = fields.Char()
     credential_format = fields.Text()
+    credential_image_field = fields.Selection(
+        [
+            ("image_1920", "Original"),
+            ("image_1024", "1024px"),
+            ("image_512", "512px"),
+            ("image_256", "256px"),
+            ("image_128", "128px"),
+        ],
+        default="image_1920",
+        help="Image rendition embedded in credentials. Smaller renditions are pre-computed on the partner.",
+    )
+    credential_field_names = fields.Text(
+        help="Whitespace separated names of fields to be read for the credential format. "
+        "If empty, these are derived from the credential format."
+    )
     issuer_metadata_text = fields.Text()
     contexts_json = fields.Text()
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        document_loader.invalidate()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        document_loader.invalidate()
+        if "credential_format" in vals or "issuer_metadata_text" in vals:
+            compile_jq.cache_clear()
+        return super().write(vals)
+
+    def unlink(self):
+        document_loader.invalidate()
+        compile_jq.cache_clear()
+        return super().unlink()
+
     @api.model
     def issue_vc(self, credential_request: dict, token: str):
         # TODO: Raise better errors and error types
+        with issuance_stage("token_parse"):
+            auth_claims_unverified = jwt.get_unverified_claims(token)
+        auth_scopes = auth_claims_unverified.get("scope", "").split()
+
+        with issuance_stage("issuer_lookup"):
+            credential_issuer = self.get_credential_issuer(credential_request, auth_scopes)
+        credential_issuer.verify_auth_token(token, auth_claims_unverified)
+
+        if credential_issuer.deferred_issuance:
+            return self.env["g2p.openid.vci.deferred.credential"].create_deferred(
+                credential_issuer, auth_claims_unverified, credential_request
+            )
+
+        issue_vc_func = getattr(credential_issuer, f"issue_vc_{credential_issuer.issuer_type}")
+
+        cred_res = issue_vc_func(
+            auth_claims=auth_claims_unverified,
+            credential_request=credential_request,
+        )
+        _logger.debug("Credential Response for DEBUG; %s", json.dumps(cred_res))
+        return cred_res
+
+    @api.model
+    def issue_vc_batch(self, credential_requests: list[dict], token: str) -> list[dict]:
+        """
+        Issues credentials for a list of credential requests with a single auth token.
+        The token is verified once per resolved issuer, and each issuer issues its
+        requests together. Returns one result per request, either a credential
+        response or a dict with error and error_description.
+        A request can carry "sub" to ask for a credential of a different subject,
+        which is only allowed for clients listed in the issuer's
+        auth_batch_allowed_client_ids.
+        """
         auth_claims_unverified = jwt.get_unverified_claims(token)
         auth_scopes = auth_claims_unverified.get("scope", "").split()
-        auth_aud = auth_claims_unverified.get("aud", "")
-        if isinstance(auth_aud, str):
-            auth_aud = auth_aud.split()
+        auth_client_id = auth_claims_unverified.get("client_id") or auth_claims_unverified.get("azp")
+
+        results = [None] * len(credential_requests)
+        issuers_by_key = {}
+        requests_by_issuer = {}
+        for index, credential_request in enumerate(credential_requests):
+            key = (
+                credential_request["format"],
+                tuple(credential_request["credential_definition"]["type"]),
+            )
+            if key not in issuers_by_key:
+                try:
+                    issuers_by_key[key] = self.get_credential_issuer(credential_request, auth_scopes)
+                except ValueError as e:
+                    issuers_by_key[key] = e
+            credential_issuer = issuers_by_key[key]
+            if isinstance(credential_issuer, ValueError):
+                results[index] = self.build_credential_error(credential_issuer)
+                continue
+            requests_by_issuer.setdefault(credential_issuer, []).append((index, credential_request))
+
+        for credential_issuer, indexed_requests in requests_by_issuer.items():
+            credential_issuer.verify_auth_token(token, auth_claims_unverified)
+            batch_allowed_client_ids = (credential_issuer.auth_batch_allowed_client_ids or "").split()
+
+            allowed_requests = []
+            for index, credential_request in indexed_requests:
+                sub = credential_request.get("sub")
+                if (
+                    sub
+                    and sub != auth_claims_unverified.get("sub")
+                    and (not auth_client_id or auth_client_id not in batch_allowed_client_ids)
+                ):
+                    results[index] = self.build_credential_error(
+                        ValueError("Client not allowed to request credentials of other subjects")
+                    )
+                else:
+                    allowed_requests.append((index, credential_request))
+            if not allowed_requests:
+                continue
+
+            if credential_issuer.deferred_issuance:
+                for index, credential_request in allowed_requests:
+                    results[index] = self.env["g2p.openid.vci.deferred.credential"].create_deferred(
+                        credential_issuer,
+                        auth_claims_unverified,
+                        credential_request,
+                        credential_sub=credential_request.get("sub"),
+                    )
+                continue
+
+            issuer_results = credential_issuer.issue_vc_multi(
+                auth_claims_unverified, [credential_request for _i, credential_request in allowed_requests]
+            )
+            for (index, _req), result in zip(allowed_requests, issuer_results, strict=True):
+                results[index] = result
+        return results
+
+    def issue_vc_multi(self, auth_claims: dict, credential_requests: list[dict]) -> list[dict]:
+        """
+        Uses issue_vc_batch_<issuer_type> if the issuer type implements it, else
+        issues one credential at a time.
+        """
+        self.ensure_one()
+        batch_func = getattr(self, f"issue_vc_batch_{self.issuer_type}", None)
+        if batch_func:
+            try:
+                return batch_func(auth_claims=auth_claims, credential_requests=credential_requests)
+            except Exception as e:
+                _logger.exception("Error while issuing credentials in batch")
+                return [self.build_credential_error(e)] * len(credential_requests)
+
+        issue_vc_func = getattr(self, f"issue_vc_{self.issuer_type}")
+        results = []
+        for credential_request in credential_requests:
+            sub = credential_request.get("sub") or auth_claims["sub"]
+            try:
+                results.append(
+                    issue_vc_func(
+                        auth_claims=dict(auth_claims, sub=sub),
+                        credential_request=credential_request,
+                    )
+                )
+            except Exception as e:
+                _logger.exception("Error while issuing credential in batch")
+                results.append(self.build_credential_error(e))
+        return results
 
+    @api.model
+    def build_credential_error(self, error: Exception) -> dict:
+        return {
+            "error": "invalid_credential_request",
+            "error_description": f"Error issuing credential. {error}",
+        }
+
+    @api.model
+    def get_credential_issuer(self, credential_request: dict, auth_scopes: list[str]):
         request_format = credential_request["format"]
         request_types = credential_request["credential_definition"]["type"]
 
@@ -74,29 +267,38 @@ class OpenIDVCIssuer(models.Model):
             search_domain.append(("credential_type", "in", request_types))
         credential_issuer = self.sudo().search(search_domain)
         if credential_issuer and len(credential_issuer):
-            credential_issuer = credential_issuer[0]
-        else:
-            raise ValueError("Invalid combination of scope, credential type, format")
+            return credential_issuer[0]
+        raise ValueError("Invalid combination of scope, credential type, format")
 
+    def verify_auth_token(self, token: str, auth_claims_unverified: dict):
+        self.ensure_one()
+        auth_aud = auth_claims_unverified.get("aud", "")
+        if isinstance(auth_aud, str):
+            auth_aud = auth_aud.split()
         request_auth_iss = auth_claims_unverified["iss"]
         # TODO: Client id validation
 
         try:
-            auth_allowed_iss = (credential_issuer.auth_allowed_issuers or "").split()
-            auth_allowed_aud = (credential_issuer.auth_allowed_auds or "").split()
-            auth_jwks_mapping = (credential_issuer.auth_issuer_jwks_mapping or "").split()
-            # TODO: Cache JWKS somehow
-            jwks = credential_issuer.get_auth_jwks(
-                request_auth_iss,
-                auth_allowed_iss,
-                auth_jwks_mapping,
-            )
-            jwt.decode(
-                token,
-                jwks,
-                issuer=auth_allowed_iss,
-                options={"verify_aud": False},
-            )
+            auth_allowed_iss = (self.auth_allowed_issuers or "").split()
+            auth_allowed_aud = (self.auth_allowed_auds or "").split()
+            auth_jwks_mapping = (self.auth_issuer_jwks_mapping or "").split()
+            # The JWKS URL is derived from the unverified iss, so only fetch it for configured issuers.
+            if request_auth_iss not in auth_allowed_iss:
+                raise ValueError("Invalid Issuer")
+            with issuance_stage("jwks_fetch"):
+                jwks = self.get_auth_jwks(
+                    request_auth_iss,
+                    auth_allowed_iss,
+                    auth_jwks_mapping,
+                    kid=jwt.get_unverified_header(token).get("kid"),
+                )
+            with issuance_stage("token_verify"):
+                jwt.decode(
+                    token,
+                    jwks,
+                    issuer=auth_allowed_iss,
+                    options={"verify_aud": False},
+                )
             if auth_allowed_aud and not set(auth_allowed_aud).issubset(set(auth_aud)):
                 raise ValueError("Invalid Audience")
         except Exception as e:
@@ -104,83 +306,320 @@ class OpenIDVCIssuer(models.Model):
                 raise e
             raise ValueError("Invalid Auth Token received") from e
 
-        issue_vc_func = getattr(credential_issuer, f"issue_vc_{credential_issuer.issuer_type}")
-
-        cred_res = issue_vc_func(
-            auth_claims=auth_claims_unverified,
-            credential_request=credential_request,
-        )
-        _logger.debug("Credential Response for DEBUG; %s", json.dumps(cred_res))
-        return cred_res
-
     def issue_vc_Registry(self, auth_claims, credential_request):
         self.ensure_one()
         web_base_url = self.env["ir.config_parameter"].sudo().get_param("web.base.url").rstrip("/")
-        reg_id = (
-            self.env["g2p.reg.id"]
-            .sudo()
-            .search(
-                [
-                    ("id_type", "=", self.auth_sub_id_type_id.id),
-                    ("value", "=", auth_claims["sub"]),
-                ],
-                limit=1,
+        with issuance_stage("db_read"):
+            reg_id = (
+                self.env["g2p.reg.id"]
+                .sudo()
+                .search(
+                    [
+                        ("id_type", "=", self.auth_sub_id_type_id.id),
+                        ("value", "=", auth_claims["sub"]),
+                    ],
+                    limit=1,
+                )
+            )
+            partner = None
+            if not reg_id:
+                raise ValueError("ID not found in DB. Invalid Subject Received in auth claims")
+
+            partner = reg_id.partner_id
+
+        cache_key = None
+        cached = None
+        if self.credential_cache_mode:
+            with issuance_stage("cache_lookup"):
+                cache_key = self.get_credential_cache_key(auth_claims["sub"], partner, web_base_url)
+                cached = credential_cache.get(cache_key)
+            if cached and self.credential_cache_mode == "signed":
+                return {"credential": cached, "format": credential_request["format"]}
+
+        with issuance_stage("db_read"):
+            if cached:
+                partner_dict, reg_ids_dict = cached
+            else:
+                partner_dict = self.read_credential_fields(partner)[0]
+                reg_ids_dict = self.read_credential_reg_ids(partner).get(partner.id, {})
+                if self.credential_cache_mode == "unsigned":
+                    credential_cache.set(cache_key, (partner_dict, reg_ids_dict), self.credential_cache_ttl)
+            issuer_dict = self.read_credential_fields(self)[0]
+
+        with issuance_stage("template"):
+            credential = self.build_credential_Registry(
+                partner, partner_dict, reg_ids_dict, issuer_dict, web_base_url
             )
-        )
-        partner = None
-        if not reg_id:
-            raise ValueError("ID not found in DB. Invalid Subject Received in auth claims")
 
-        partner = reg_id.partner_id
+        signed_credential = self.sign_and_issue_credential(credential)
+        if self.credential_cache_mode == "signed":
+            credential_cache.set(cache_key, signed_credential, self.credential_cache_ttl)
+        credential_response = {
+            "credential": signed_credential,
+            "format": credential_request["format"],
+        }
+        return credential_response
 
-        partner_dict = partner.read()[0]
-        reg_ids_dict = {reg_id.id_type.name: reg_id.read()[0] for reg_id in partner.reg_ids}
+    def get_credential_cache_key(self, subject: str, partner, web_base_url: str) -> tuple:
+        """
+        Credentials are cached per issuer version, subject, partner version, reg ids
+        and their versions and credential format, so any change to these misses the cache.
+        The reg ids are part of the key, as deleting one doesn't change the others' versions.
+        """
+        self.ensure_one()
+        reg_ids_write_date = max(partner.reg_ids.mapped("write_date"), default=None)
+        return (
+            self.id,
+            self.write_date,
+            hashlib.sha256((self.credential_format or "").encode()).hexdigest(),
+            web_base_url,
+            subject,
+            partner.id,
+            partner.write_date,
+            tuple(sorted(partner.reg_ids.ids)),
+            reg_ids_write_date,
+        )
 
+    def issue_vc_batch_Registry(self, auth_claims, credential_requests):
+        """
+        Issues Registry credentials for many subjects. Partners and their IDs are
+        read together and the credentials are signed with a single batch call.
+        """
+        self.ensure_one()
+        web_base_url = self.env["ir.config_parameter"].sudo().get_param("web.base.url").rstrip("/")
+        subjects = [
+            credential_request.get("sub") or auth_claims["sub"] for credential_request in credential_requests
+        ]
+        with issuance_stage("db_read"):
+            reg_ids = (
+                self.env["g2p.reg.id"]
+                .sudo()
+                .search(
+                    [
+                        ("id_type", "=", self.auth_sub_id_type_id.id),
+                        ("value", "in", list(set(subjects))),
+                    ],
+                )
+            )
+            partners_by_subject = {}
+            for reg_id in reg_ids:
+                partners_by_subject.setdefault(reg_id.value, reg_id.partner_id)
+
+        results = [None] * len(credential_requests)
+        cache_keys = {}
+        cached_dicts = {}
+        partners_to_read = self.env["res.partner"].sudo()
+        for index, subject in enumerate(subjects):
+            partner = partners_by_subject.get(subject)
+            if not partner:
+                results[index] = self.build_credential_error(
+                    ValueError("ID not found in DB. Invalid Subject Received in auth claims")
+                )
+                continue
+            if self.credential_cache_mode:
+                with issuance_stage("cache_lookup"):
+                    cache_keys[index] = self.get_credential_cache_key(subject, partner, web_base_url)
+                    cached = credential_cache.get(cache_keys[index])
+                if cached and self.credential_cache_mode == "signed":
+                    results[index] = {"credential": cached, "format": credential_requests[index]["format"]}
+                    continue
+                if cached:
+                    cached_dicts[index] = cached
+                    continue
+            partners_to_read |= partner
+
+        with issuance_stage("db_read"):
+            partner_dicts = {
+                partner_dict["id"]: partner_dict
+                for partner_dict in self.read_credential_fields(partners_to_read)
+            }
+            reg_ids_dicts = self.read_credential_reg_ids(partners_to_read)
+            issuer_dict = self.read_credential_fields(self)[0]
+
+        credentials = []
+        for index, subject in enumerate(subjects):
+            if results[index]:
+                continue
+            partner = partners_by_subject[subject]
+            if index in cached_dicts:
+                partner_dict, reg_ids_dict = cached_dicts[index]
+            else:
+                partner_dict = partner_dicts[partner.id]
+                reg_ids_dict = reg_ids_dicts.get(partner.id, {})
+                if self.credential_cache_mode == "unsigned":
+                    credential_cache.set(
+                        cache_keys[index], (partner_dict, reg_ids_dict), self.credential_cache_ttl
+                    )
+            try:
+                with issuance_stage("template"):
+                    credential = self.build_credential_Registry(
+                        partner, partner_dict, reg_ids_dict, issuer_dict, web_base_url
+                    )
+            except Exception as e:
+                _logger.exception("Error while building credential in batch")
+                results[index] = self.build_credential_error(e)
+                continue
+            credentials.append((index, credential))
+
+        signed_credentials = self.sign_and_issue_credentials(
+            [credential for _index, credential in credentials]
+        )
+        for (index, _credential), signed_credential in zip(credentials, signed_credentials, strict=True):
+            if self.credential_cache_mode == "signed":
+                credential_cache.set(cache_keys[index], signed_credential, self.credential_cache_ttl)
+            results[index] = {
+                "credential": signed_credential,
+                "format": credential_requests[index]["format"],
+            }
+        return results
+
+    def build_credential_Registry(self, partner, partner_dict, reg_ids_dict, issuer_dict, web_base_url):
+        self.ensure_one()
         curr_datetime = f'{datetime.now().isoformat(timespec = "milliseconds")}Z'
-        credential = jq.first(
+        return jq_first(
             self.credential_format,
             VCJSONEncoder.python_dict_to_json_dict(
                 {
                     "vc_id": str(uuid.uuid4()),
                     "web_base_url": web_base_url,
-                    "issuer": self.read()[0],
+                    "issuer": issuer_dict,
                     "curr_datetime": curr_datetime,
                     "partner": partner_dict,
-                    "partner_address": self.get_full_address(partner.address),
-                    "partner_face": self.get_image_base64_data_in_url((partner.image_1920 or b"").decode()),
+                    "partner_address": (
+                        self.get_full_address(partner.address)
+                        if self.is_credential_field_used("partner_address")
+                        else None
+                    ),
+                    "partner_face": (
+                        self.get_credential_image(partner)
+                        if self.is_credential_field_used("partner_face")
+                        else None
+                    ),
                     "reg_ids": reg_ids_dict,
                 },
             ),
         )
-        credential_response = {
-            "credential": self.sign_and_issue_credential(credential),
-            "format": credential_request["format"],
-        }
-        return credential_response
 
-    def sign_and_issue_credential(self, credential: dict) -> dict:
+    def get_credential_field_names(self) -> frozenset | None:
+        """
+        Names of the fields to be read for the credential format. Taken from
+        credential_field_names if set, else derived from the credential format.
+        None means all fields.
+        """
         self.ensure_one()
+        if self.credential_field_names:
+            return frozenset(self.credential_field_names.split())
+        return jq_referenced_names(self.credential_format or "", self.get_credential_complete_names())
 
-        ld_proof = self.build_empty_ld_proof()
-        normalised_ld_prood_str = jsonld.normalize(
-            ld_proof, {"algorithm": "URDNA2015", "format": "application/n-quads"}
-        )
-        normalized_json_ld_str = jsonld.normalize(
-            credential, {"algorithm": "URDNA2015", "format": "application/n-quads"}
-        )
+    @tools.ormcache("self.issuer_type")
+    def get_credential_complete_names(self) -> frozenset:
+        """
+        Keys of the credential format input whose values are complete whatever fields are read,
+        ie, field values and values built whole. The format may use these values as a whole.
+        """
+        return getattr(self, f"get_credential_complete_names_{self.issuer_type}")()
 
-        signature = self.get_encryption_provider().jwt_sign(
-            self.sha256_digest(normalised_ld_prood_str.encode())
-            + self.sha256_digest(normalized_json_ld_str.encode()),
-            include_payload=False,
-            include_certificate=True,
-            include_cert_hash=True,
-        )
+    def get_credential_complete_names_Registry(self) -> frozenset:
+        field_names = set(self.env["res.partner"]._fields)
+        field_names |= set(self.env["g2p.reg.id"]._fields) | set(self._fields)
+        field_names |= {"vc_id", "web_base_url", "curr_datetime", "partner_address", "partner_face"}
+        return frozenset(field_names - {"partner", "issuer", "reg_ids"})
+
+    def is_credential_field_used(self, field_name: str) -> bool:
+        field_names = self.get_credential_field_names()
+        return field_names is None or field_name in field_names
+
+    def read_credential_fields(self, records) -> list[dict]:
+        """
+        Reads only the fields of records that the credential format uses.
+        """
+        self.ensure_one()
+        field_names = self.get_credential_field_names()
+        if field_names is None:
+            return records.read()
+        return records.read([name for name in records._fields if name in field_names] or ["id"])
+
+    def read_credential_reg_ids(self, partners) -> dict:
+        """
+        Reads the reg ids of all partners together.
+        Returns {partner_id: {id_type_name: reg_id_dict}}.
+        """
+        self.ensure_one()
+        reg_ids = partners.reg_ids
+        res = {}
+        for reg_id, reg_id_dict in zip(reg_ids, self.read_credential_fields(reg_ids), strict=True):
+            res.setdefault(reg_id.partner_id.id, {})[reg_id.id_type.name] = reg_id_dict
+        return res
+
+    def sign_and_issue_credential(self, credential: dict) -> dict:
+        self.ensure_one()
+
+        with issuance_stage("jsonld_normalize"):
+            ld_proof, data_to_sign = self.get_ld_proof_signing_input(credential)
+        with issuance_stage("sign"):
+            signature = self.get_encryption_provider().jwt_sign(
+                data_to_sign,
+                include_payload=False,
+                include_certificate=True,
+                include_cert_hash=True,
+            )
         ld_proof["jws"] = signature
         ret = dict(credential)
         ret["proof"] = ld_proof
         return ret
 
+    def sign_and_issue_credentials(self, credentials: list[dict]) -> list[dict]:
+        """
+        Same as sign_and_issue_credential, with a single batch signing call.
+        """
+        self.ensure_one()
+        if not credentials:
+            return []
+
+        with issuance_stage("jsonld_normalize"):
+            signing_inputs = [self.get_ld_proof_signing_input(credential) for credential in credentials]
+        with issuance_stage("sign"):
+            signatures = self.get_encryption_provider().jwt_sign_batch(
+                [data_to_sign for _ld_proof, data_to_sign in signing_inputs],
+                include_payload=False,
+                include_certificate=True,
+                include_cert_hash=True,
+            )
+        res = []
+        for credential, (ld_proof, _data), signature in zip(
+            credentials, signing_inputs, signatures, strict=True
+        ):
+            ld_proof["jws"] = signature
+            ret = dict(credential)
+            ret["proof"] = ld_proof
+            res.append(ret)
+        return res
+
+    def get_ld_proof_signing_input(self, credential: dict) -> tuple[dict, bytes]:
+        """
+        Returns the empty LD proof and the bytes to be signed for it.
+        """
+        self.ensure_one()
+        ld_proof = self.build_empty_ld_proof()
+        normalised_ld_prood_str = jsonld.normalize(ld_proof, self.get_jsonld_normalize_options())
+        return ld_proof, (
+            self.sha256_digest(normalised_ld_prood_str.encode()) + self.get_credential_digest(credential)
+        )
+
+    def get_credential_digest(self, credential: dict) -> bytes:
+        """
+        Returns the sha256 digest of the URDNA2015 normalized credential.
+        """
+        normalized_json_ld_str = jsonld.normalize(credential, self.get_jsonld_normalize_options())
+        return self.sha256_digest(normalized_json_ld_str.encode())
+
+    def get_jsonld_normalize_options(self) -> dict:
+        return {
+            "algorithm": "URDNA2015",
+            "format": "application/n-quads",
+            "documentLoader": self.get_jsonld_document_loader(),
+        }
+
     def build_empty_ld_proof(self):
         self.ensure_one()
         curr_datetime = f'{datetime.now().isoformat(timespec = "milliseconds")}Z'
@@ -213,7 +652,7 @@ class OpenIDVCIssuer(models.Model):
         cred_configs = None
         for issuer in vci_issuers:
             issuer["web_base_url"] = web_base_url
-            issuer_metadata = jq.first(
+            issuer_metadata = jq_first(
                 issuer["issuer_metadata_text"], VCJSONEncoder.python_dict_to_json_dict(issuer)
             )
             if isinstance(issuer_metadata, list):
@@ -247,11 +686,26 @@ class OpenIDVCIssuer(models.Model):
                 )
         return final_context
 
+    @api.model
+    def get_jsonld_document_loader(self):
+        """
+        Returns a JSON-LD document loader that resolves bundled W3C contexts and
+        this registry's contexts.json from memory, without network calls.
+        """
+        web_base_url = self.env["ir.config_parameter"].sudo().get_param("web.base.url").rstrip("/")
+        return partial(
+            document_loader,
+            local_documents={
+                f"{web_base_url}/api/v1/vci/.well-known/contexts.json": self.get_all_contexts_json,
+            },
+        )
+
     def get_auth_jwks(
         self,
         auth_issuer: str,
         auth_allowed_issuers: list[str],
         auth_allowed_jwks_urls: list[str],
+        kid: str | None = None,
     ):
         self.ensure_one()
         jwk_url = None
@@ -259,7 +713,7 @@ class OpenIDVCIssuer(models.Model):
             jwk_url = auth_allowed_jwks_urls[auth_allowed_issuers.index(auth_issuer)]
         except Exception:
             jwk_url = f'{auth_issuer.rstrip("/")}/.well-known/jwks.json'
-        return requests.get(jwk_url, timeout=20).json()
+        return auth_jwks_cache.get(jwk_url, kid=kid)
 
     def get_encryption_provider(self):
         self.ensure_one()
@@ -279,8 +733,35 @@ class OpenIDVCIssuer(models.Model):
     def get_image_base64_data_in_url(self, image_base64: str) -> str:
         if not image_base64:
             return None
-        image = tools.base64_to_image(image_base64)
-        return f"data:image/{image.format.lower()};base64,{image_base64}"
+        image_format = self.guess_image_format(image_base64)
+        if not image_format:
+            image_format = tools.base64_to_image(image_base64).format.lower()
+        return f"data:image/{image_format};base64,{image_base64}"
+
+    @api.model
+    def guess_image_format(self, image_base64: str) -> str:
+        """
+        Guesses the image format from the magic bytes in the first few base64 chars,
+        without decoding the whole image. Returns None if not recognized.
+        """
+        try:
+            header = base64.b64decode(image_base64[:IMAGE_HEADER_BASE64_LENGTH])
+        except ValueError:
+            return None
+        for magic_bytes, image_format in IMAGE_MAGIC_BYTES:
+            if header.startswith(magic_bytes):
+                if image_format == "webp" and header[8:12] != b"WEBP":
+                    continue
+                return image_format
+        return None
+
+    def get_credential_image(self, partner) -> str:
+        """
+        Returns the partner's image as a data url, in the rendition configured on the issuer.
+        """
+        self.ensure_one()
+        image = partner[self.credential_image_field or "image_1920"]
+        return self.get_image_base64_data_in_url((image or b"").decode())
 
     @api.model
     def sha256_digest(self, data: bytes) -> bytes:
@@ -11,13 +11,21 @@ from odoo.tests import tagged
 from odoo.tests.common import TransactionCase, _super_send
 from odoo.tools import misc
 
+from odoo.addons.g2p_registry_base.jq_cache import compile_jq
+from odoo.addons.queue_job.tests.common import trap_jobs
+
+from ..credential_cache import credential_cache
+from ..issuance_metrics import collect_issuance_timings, format_server_timing, issuance_metrics
 from ..json_encoder import VCJSONEncoder
+from ..jwks_cache import JWKSCache, auth_jwks_cache
 
 
 @tagged("-at_install", "post_install")
 class TestVCIIssuerRegistry(TransactionCase):
     def setUp(self):
         super().setUp()
+        auth_jwks_cache.clear()
+        credential_cache.clear()
         self.env["ir.config_parameter"].set_param("web.base.url", "http://openg2p.local")
         self.id_type = self.env["g2p.id.type"].create(
             {
@@ -128,6 +136,276 @@ class TestVCIIssuerRegistry(TransactionCase):
         cred_subject = res["credential"]["credentialSubject"]
         self.assertTrue(not cred_subject["face"])
 
+    @patch("requests.get")
+    @patch("odoo.addons.g2p_encryption.models.encryption_provider.G2PEncryptionProvider.jwt_sign")
+    def test_credential_cache(self, mock_jwt_sign, mock_request):
+        mock_request.side_effect = self.mock_request_get
+        mock_jwt_sign.side_effect = self.mock_jwt_sign
+        credential_request = {"format": "ldp_vc", "credential_definition": {"type": []}}
+        issuer_model = self.env["g2p.openid.vci.issuers"]
+
+        self.issuer.credential_cache_mode = "signed"
+        res_1 = issuer_model.issue_vc(credential_request, self.default_auth_jwt)
+        res_2 = issuer_model.issue_vc(credential_request, self.default_auth_jwt)
+        self.assertEqual(res_1, res_2)
+        self.assertEqual(1, mock_jwt_sign.call_count)
+
+        # Registrant changes miss the cache
+        self.registrant.write({"name": "Updated Name", "write_date": "2030-01-01 00:00:00"})
+        res_3 = issuer_model.issue_vc(credential_request, self.default_auth_jwt)
+        self.assertEqual(2, mock_jwt_sign.call_count)
+        self.assertIn(
+            "Updated Name", [name["value"] for name in res_3["credential"]["credentialSubject"]["fullName"]]
+        )
+
+        # Adding or removing a reg id misses the cache
+        other_reg_id = self.env["g2p.reg.id"].create(
+            {
+                "partner_id": self.registrant.id,
+                "id_type": self.env["g2p.id.type"].create({"name": "Other ID"}).id,
+                "value": "111111111",
+            }
+        )
+        issuer_model.issue_vc(credential_request, self.default_auth_jwt)
+        self.assertEqual(3, mock_jwt_sign.call_count)
+        other_reg_id.unlink()
+        issuer_model.issue_vc(credential_request, self.default_auth_jwt)
+        self.assertEqual(4, mock_jwt_sign.call_count)
+
+        # Registrant data caching skips the reads, each credential gets its own ID
+        self.issuer.write({"credential_cache_mode": "unsigned", "write_date": "2030-01-01 00:00:01"})
+        issuer_class = type(self.issuer)
+        with patch.object(
+            issuer_class,
+            "read_credential_reg_ids",
+            autospec=True,
+            side_effect=issuer_class.read_credential_reg_ids,
+        ) as mock_read_reg_ids:
+            res_4 = issuer_model.issue_vc(credential_request, self.default_auth_jwt)
+            res_5 = issuer_model.issue_vc(credential_request, self.default_auth_jwt)
+        self.assertEqual(1, mock_read_reg_ids.call_count)
+        self.assertEqual(6, mock_jwt_sign.call_count)
+        self.assertNotEqual(res_4["credential"]["id"], res_5["credential"]["id"])
+        self.assertEqual(res_4["credential"]["credentialSubject"], res_5["credential"]["credentialSubject"])
+
+    @patch("requests.get")
+    @patch("odoo.addons.g2p_encryption.models.encryption_provider.G2PEncryptionProvider.jwt_sign")
+    def test_issuance_timings(self, mock_jwt_sign, mock_request):
+        mock_request.side_effect = self.mock_request_get
+        mock_jwt_sign.side_effect = self.mock_jwt_sign
+        issuance_metrics.reset()
+        with collect_issuance_timings() as timings:
+            self.env["g2p.openid.vci.issuers"].issue_vc(
+                {"format": "ldp_vc", "credential_definition": {"type": []}}, self.default_auth_jwt
+            )
+        stages = [
+            "token_parse",
+            "issuer_lookup",
+            "jwks_fetch",
+            "token_verify",
+            "db_read",
+            "template",
+            "jsonld_normalize",
+            "sign",
+        ]
+        self.assertEqual(set(stages), set(timings))
+        self.assertIn("sign;dur=", format_server_timing(timings))
+        metrics = issuance_metrics.snapshot()
+        self.assertEqual(1, metrics["sign"]["count"])
+        self.assertEqual(metrics["sign"]["max_ms"], metrics["sign"]["total_ms"])
+
+    @patch("requests.get")
+    @patch("odoo.addons.g2p_encryption.models.encryption_provider.G2PEncryptionProvider.jwt_sign")
+    def test_issue_vc_deferred(self, mock_jwt_sign, mock_request):
+        mock_request.side_effect = self.mock_request_get
+        mock_jwt_sign.side_effect = self.mock_jwt_sign
+        self.issuer.deferred_issuance = True
+        deferred_model = self.env["g2p.openid.vci.deferred.credential"]
+
+        with trap_jobs() as trap:
+            res = self.env["g2p.openid.vci.issuers"].issue_vc(
+                {"format": "ldp_vc", "credential_definition": {"type": []}}, self.default_auth_jwt
+            )
+            trap.assert_jobs_count(1)
+            transaction_id = res["transaction_id"]
+            self.assertNotIn("credential", res)
+
+            res = deferred_model.get_deferred_credential(transaction_id, self.default_auth_jwt)
+            self.assertEqual("issuance_pending", res["error"])
+
+            trap.perform_enqueued_jobs()
+
+        other_sub_jwt = jwt.encode(
+            dict(jwt.get_unverified_claims(self.default_auth_jwt), sub="000000000"),
+            self.jwk,
+            algorithm="RS256",
+        )
+        res = deferred_model.get_deferred_credential(transaction_id, other_sub_jwt)
+        self.assertEqual("invalid_transaction_id", res["error"])
+
+        res = deferred_model.get_deferred_credential(transaction_id, self.default_auth_jwt)
+        self.assertTrue(
+            "Givenname Familyname"
+            in [name["value"] for name in res["credential"]["credentialSubject"]["fullName"]]
+        )
+        self.assertEqual("ldp_vc", res["format"])
+
+        # Credentials are collected only once
+        res = deferred_model.get_deferred_credential(transaction_id, self.default_auth_jwt)
+        self.assertEqual("invalid_transaction_id", res["error"])
+
+    @patch("requests.get")
+    @patch("odoo.addons.g2p_encryption.models.encryption_provider.G2PEncryptionProvider.jwt_sign_batch")
+    def test_issue_vc_batch(self, mock_jwt_sign_batch, mock_request):
+        mock_request.side_effect = self.mock_request_get
+        mock_jwt_sign_batch.side_effect = lambda data_list, **kw: [self.mock_jwt_sign(d) for d in data_list]
+        self.env["res.partner"].create(
+            {
+                "name": "Secondgiven Secondfamily",
+                "reg_ids": [(0, 0, {"id_type": self.id_type.id, "value": "987654321"})],
+            }
+        )
+        credential_request = {"format": "ldp_vc", "credential_definition": {"type": []}}
+
+        res = self.env["g2p.openid.vci.issuers"].issue_vc_batch(
+            [credential_request, dict(credential_request, sub="987654321")], self.default_auth_jwt
+        )
+        self.assertEqual(2, len(res))
+        self.assertTrue(
+            "Givenname Familyname"
+            in [name["value"] for name in res[0]["credential"]["credentialSubject"]["fullName"]]
+        )
+        self.assertIn("not allowed", res[1]["error_description"])
+
+        self.issuer.auth_batch_allowed_client_ids = "card-printing"
+        batch_auth_jwt = jwt.encode(
+            dict(jwt.get_unverified_claims(self.default_auth_jwt), client_id="card-printing"),
+            self.jwk,
+            algorithm="RS256",
+        )
+        res = self.env["g2p.openid.vci.issuers"].issue_vc_batch(
+            [
+                dict(credential_request, sub="987654321"),
+                dict(credential_request, sub="000000000"),
+                {"format": "ldp_vc", "credential_definition": {"type": ["UnknownCredential"]}},
+            ],
+            batch_auth_jwt,
+        )
+        self.assertTrue(
+            "Secondgiven Secondfamily"
+            in [name["value"] for name in res[0]["credential"]["credentialSubject"]["fullName"]]
+        )
+        self.assertIn("ID not found", res[1]["error_description"])
+        self.assertIn("Invalid combination", res[2]["error_description"])
+        self.assertEqual(2, mock_jwt_sign_batch.call_count)
+        self.assertEqual(
+            {"include_payload": False, "include_certificate": True, "include_cert_hash": True},
+            mock_jwt_sign_batch.call_args.kwargs,
+        )
+
+    @patch("requests.get")
+    @patch("odoo.addons.g2p_encryption.models.encryption_provider.G2PEncryptionProvider.jwt_sign")
+    @patch("odoo.addons.g2p_encryption.models.encryption_provider.G2PEncryptionProvider.jwt_sign_batch")
+    def test_issue_vc_batch_cache_and_deferred(self, mock_jwt_sign_batch, mock_jwt_sign, mock_request):
+        mock_request.side_effect = self.mock_request_get
+        mock_jwt_sign.side_effect = self.mock_jwt_sign
+        mock_jwt_sign_batch.side_effect = lambda data_list, **kw: [self.mock_jwt_sign(d) for d in data_list]
+        credential_request = {"format": "ldp_vc", "credential_definition": {"type": []}}
+        issuer_model = self.env["g2p.openid.vci.issuers"]
+
+        self.issuer.credential_cache_mode = "signed"
+        res_1 = issuer_model.issue_vc_batch([credential_request], self.default_auth_jwt)
+        res_2 = issuer_model.issue_vc_batch([credential_request], self.default_auth_jwt)
+        self.assertEqual(res_1, res_2)
+        self.assertEqual(1, mock_jwt_sign_batch.call_count)
+
+        self.issuer.write({"credential_cache_mode": "unsigned", "write_date": "2030-01-01 00:00:01"})
+        res_3 = issuer_model.issue_vc_batch([credential_request], self.default_auth_jwt)
+        res_4 = issuer_model.issue_vc_batch([credential_request], self.default_auth_jwt)
+        self.assertEqual(3, mock_jwt_sign_batch.call_count)
+        self.assertNotEqual(res_3[0]["credential"]["id"], res_4[0]["credential"]["id"])
+
+        self.issuer.deferred_issuance = True
+        with trap_jobs() as trap:
+            res = issuer_model.issue_vc_batch([credential_request], self.default_auth_jwt)
+            trap.assert_jobs_count(1)
+        self.assertIn("transaction_id", res[0])
+        self.assertNotIn("credential", res[0])
+        self.assertEqual(3, mock_jwt_sign_batch.call_count)
+
+        # A batch client collects the deferred credentials of other subjects with its own token
+        self.issuer.write({"credential_cache_mode": False, "auth_batch_allowed_client_ids": "card-printing"})
+        batch_auth_jwt = jwt.encode(
+            dict(jwt.get_unverified_claims(self.default_auth_jwt), client_id="card-printing"),
+            self.jwk,
+            algorithm="RS256",
+        )
+        deferred_model = self.env["g2p.openid.vci.deferred.credential"]
+        with trap_jobs() as trap:
+            res = issuer_model.issue_vc_batch([dict(credential_request, sub="987654321")], batch_auth_jwt)
+            trap.perform_enqueued_jobs()
+        res = deferred_model.get_deferred_credential(res[0]["transaction_id"], batch_auth_jwt)
+        self.assertTrue(
+            "Secondgiven Secondfamily"
+            in [name["value"] for name in res["credential"]["credentialSubject"]["fullName"]]
+        )
+
+    @patch("requests.get")
+    def test_jsonld_document_loader_offline(self, mock_request):
+        mock_request.side_effect = requests.exceptions.ConnectionError("offline")
+        loader = self.env["g2p.openid.vci.issuers"].get_jsonld_document_loader()
+        for url in ("https://www.w3.org/2018/credentials/v1", "https://w3id.org/security/v2"):
+            self.assertTrue("@context" in loader(url, {})["document"])
+        res = loader("http://openg2p.local/api/v1/vci/.well-known/contexts.json", {})
+        self.assertEqual(self.jsonld_contexts, res["document"])
+        mock_request.assert_not_called()
+
+    @patch("requests.get")
+    def test_auth_jwks_cache(self, mock_request):
+        mock_request.side_effect = self.mock_request_get
+        jwks_url = "http://openg2p.local/auth/.well-known/jwks.json"
+        self.issuer.get_auth_jwks("http://openg2p.local/auth", [], [], kid="12345")
+        self.issuer.get_auth_jwks("http://openg2p.local/auth", [], [], kid="12345")
+        self.assertEqual(1, mock_request.call_count)
+
+        # Unknown kid within min refresh interval doesn't refetch
+        self.issuer.get_auth_jwks("http://openg2p.local/auth", [], [], kid="unknown")
+        self.assertEqual(1, mock_request.call_count)
+
+        # Expired entry is refetched
+        auth_jwks_cache._entries[jwks_url]["fetched_at"] -= auth_jwks_cache.ttl + auth_jwks_cache.stale_ttl
+        auth_jwks_cache._entries[jwks_url]["attempted_at"] -= auth_jwks_cache.ttl + auth_jwks_cache.stale_ttl
+        self.assertEqual(
+            self.public_jwks, self.issuer.get_auth_jwks("http://openg2p.local/auth", [], [], kid="12345")
+        )
+        self.assertEqual(2, mock_request.call_count)
+
+    @patch("requests.get")
+    def test_auth_jwks_cache_failures(self, mock_request):
+        mock_request.side_effect = requests.exceptions.ConnectionError("offline")
+        for _i in range(3):
+            with self.assertRaises(ValueError):
+                self.issuer.get_auth_jwks("http://openg2p.local/auth", [], [], kid="12345")
+        # Failed fetches are rate limited too
+        self.assertEqual(1, mock_request.call_count)
+
+        # Unknown issuers are rejected before their JWKS is fetched
+        other_iss_jwt = jwt.encode(
+            dict(jwt.get_unverified_claims(self.default_auth_jwt), iss="http://attacker.local"),
+            self.jwk,
+            algorithm="RS256",
+        )
+        with self.assertRaises(ValueError):
+            self.issuer.verify_auth_token(other_iss_jwt, jwt.get_unverified_claims(other_iss_jwt))
+        self.assertEqual(1, mock_request.call_count)
+
+    def test_auth_jwks_cache_bounded(self):
+        cache = JWKSCache(max_entries=2)
+        with patch.object(cache, "_fetch", side_effect=lambda url: {"keys": [{"kid": url}]}):
+            for url in ("http://a.local", "http://b.local", "http://a.local", "http://c.local"):
+                cache.get(url)
+        self.assertEqual(["http://a.local", "http://c.local"], list(cache._entries))
+
     def test_issue_vc_unknown_type(self):
         with self.assertRaises(ValueError) as context:
             self.env["g2p.openid.vci.issuers"].issue_vc(
@@ -251,6 +529,90 @@ class TestVCIIssuerRegistry(TransactionCase):
         self.assertEqual("http://openg2p.local/api/v1/vci/credential", res.pop("credential_endpoint"))
         self.assertEqual({}, res)
 
+    def test_jq_program_cache(self):
+        compile_jq.cache_clear()
+        self.env["g2p.openid.vci.issuers"].get_issuer_metadata_by_name()
+        self.env["g2p.openid.vci.issuers"].get_issuer_metadata_by_name()
+        self.assertTrue(compile_jq.cache_info().hits > 0)
+
+        self.issuer.issuer_metadata_text = '"Random"'
+        self.assertEqual(0, compile_jq.cache_info().currsize)
+
+    def test_credential_field_projection(self):
+        field_names = self.issuer.get_credential_field_names()
+        self.assertIn("birthdate", field_names)
+        self.assertIn("partner_face", field_names)
+        partner_dict = self.issuer.read_credential_fields(self.registrant)[0]
+        self.assertEqual("Givenname Familyname", partner_dict["name"])
+        self.assertNotIn("image_1920", partner_dict)
+        self.assertNotIn("image_128", partner_dict)
+        self.assertIn("NATIONAL ID", self.issuer.read_credential_reg_ids(self.registrant)[self.registrant.id])
+
+        self.issuer.credential_field_names = "name"
+        self.assertEqual({"id", "name"}, set(self.issuer.read_credential_fields(self.registrant)[0]))
+        self.assertFalse(self.issuer.is_credential_field_used("partner_face"))
+
+        self.issuer.credential_field_names = False
+        self.issuer.credential_format = "{credentialSubject: .partner | {name, birthdate}}"
+        partner_dict = self.issuer.read_credential_fields(self.registrant)[0]
+        self.assertEqual("Givenname Familyname", partner_dict["name"])
+        self.assertIn("birthdate", partner_dict)
+
+        self.issuer.credential_format = '{"fields": (.partner | keys)}'
+        self.assertIsNone(self.issuer.get_credential_field_names())
+        self.assertIn("image_1920", self.issuer.read_credential_fields(self.registrant)[0])
+
+        # Whole records used as values need all their fields
+        for credential_format in (
+            "{credentialSubject: .partner}",
+            ".partner | tostring",
+            ".partner | @json",
+            ".partner | length",
+        ):
+            self.issuer.credential_format = credential_format
+            self.assertIsNone(self.issuer.get_credential_field_names())
+        self.issuer.credential_format = "{credentialSubject: .partner}"
+        credential = self.issuer.build_credential_Registry(
+            self.registrant,
+            self.issuer.read_credential_fields(self.registrant)[0],
+            {},
+            self.issuer.read_credential_fields(self.issuer)[0],
+            "http://openg2p.local",
+        )
+        self.assertIn("birthdate", credential["credentialSubject"])
+        self.assertIn("email", credential["credentialSubject"])
+
+        self.issuer.credential_format = '{"address": (.partner_address | tojson), "name": .partner.name}'
+        self.assertEqual({"partner_address", "partner", "name"}, self.issuer.get_credential_field_names())
+
+    @patch("odoo.tools.base64_to_image")
+    def test_image_format_sniffing(self, mock_base64_to_image):
+        mock_base64_to_image.return_value = MagicMock(format="ICO")
+        issuer_model = self.env["g2p.openid.vci.issuers"]
+        png_base64 = self.registrant_face_bytes.decode()
+        self.assertEqual("png", issuer_model.guess_image_format(png_base64))
+        self.assertEqual(
+            f"data:image/png;base64,{png_base64}", issuer_model.get_image_base64_data_in_url(png_base64)
+        )
+        jpeg_base64 = base64.b64encode(b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01").decode()
+        self.assertEqual("jpeg", issuer_model.guess_image_format(jpeg_base64))
+        webp_base64 = base64.b64encode(b"RIFF\x00\x00\x00\x00WEBPVP8 ").decode()
+        self.assertEqual("webp", issuer_model.guess_image_format(webp_base64))
+        mock_base64_to_image.assert_not_called()
+
+        unknown_base64 = base64.b64encode(b"\x00\x00\x01\x00 some icon data").decode()
+        self.assertIsNone(issuer_model.guess_image_format(unknown_base64))
+        self.assertEqual(
+            f"data:image/ico;base64,{unknown_base64}",
+            issuer_model.get_image_base64_data_in_url(unknown_base64),
+        )
+
+        self.issuer.credential_image_field = "image_128"
+        self.assertEqual(
+            f"data:image/png;base64,{self.registrant.image_128.decode()}",
+            self.issuer.get_credential_image(self.registrant),
+        )
+
     def test_issuer_misc(self):
         self.env["g2p.openid.vci.issuers"].set_from_static_file_Registry(
             file_name="default_credential_format.jq"
@@ -1 +1,2 @@
 from . import fastapi_endpoint_vci
+from . import vci_issuer
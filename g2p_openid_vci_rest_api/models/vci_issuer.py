@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+from fastapi.encoders import jsonable_encoder
+
+from odoo import api, models, tools
+
+from ..schemas.openid_vci import CredentialIssuerResponse, VCIBaseModel
+
+
+class OpenIDVCIssuerWellKnown(models.Model):
+    _inherit = "g2p.openid.vci.issuers"
+
+    @api.model
+    def get_issuer_metadata_document(self, issuer_name=None) -> tuple[str, bytes] | None:
+        """
+        Returns (etag, json body) of the rendered issuer metadata.
+        If issuer_name is null, the document contains all issuers' metadata.
+        Returns None if there is no issuer with that name, so unknown names are not cached.
+        """
+        if issuer_name and not self.sudo().search_count([("name", "=", issuer_name)], limit=1):
+            return None
+        return self._get_well_known_document(
+            "issuer_metadata", issuer_name or "", self._get_web_base_url(), self._get_issuers_version()
+        )
+
+    @api.model
+    def get_contexts_json_document(self) -> tuple[str, bytes]:
+        """
+        Returns (etag, json body) of the rendered contexts.json.
+        """
+        return self._get_well_known_document(
+            "contexts", "", self._get_web_base_url(), self._get_issuers_version()
+        )
+
+    @api.model
+    @tools.ormcache("kind", "issuer_name", "web_base_url", "issuers_version")
+    def _get_well_known_document(self, kind, issuer_name, web_base_url, issuers_version):
+        if kind == "contexts":
+            document = VCIBaseModel(**self.get_all_contexts_json())
+        else:
+            document = CredentialIssuerResponse(**self.get_issuer_metadata_by_name(issuer_name=issuer_name))
+        body = json.dumps(jsonable_encoder(document), ensure_ascii=False, separators=(",", ":")).encode()
+        return f'"{hashlib.sha256(body).hexdigest()}"', body
+
+    @api.model
+    def _get_web_base_url(self):
+        return self.env["ir.config_parameter"].sudo().get_param("web.base.url").rstrip("/")
+
+    @api.model
+    def _get_issuers_version(self):
+        [(count, last_write_date)] = self.sudo()._read_group([], aggregates=["__count", "write_date:max"])
+        return count, last_write_date and last_write_date.isoformat()
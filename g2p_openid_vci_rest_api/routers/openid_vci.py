@@ -1,30 +1,49 @@
 import logging
+import os
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 
 from odoo.api import Environment
 
 from odoo.addons.fastapi.dependencies import odoo_env
+from odoo.addons.g2p_openid_vci.issuance_metrics import (
+    collect_issuance_timings,
+    format_server_timing,
+    issuance_metrics,
+)
 
 from ..schemas.openid_vci import (
+    BatchCredentialRequest,
+    BatchCredentialResponse,
     CredentialBaseResponse,
+    CredentialDeferredResponse,
     CredentialErrorResponse,
     CredentialIssuerResponse,
     CredentialRequest,
     CredentialResponse,
+    DeferredCredentialRequest,
     VCIBaseModel,
 )
 
 _logger = logging.getLogger(__name__)
 
+WELL_KNOWN_CACHE_MAX_AGE = int(os.getenv("G2P_VCI_WELL_KNOWN_CACHE_MAX_AGE", "300"))
+BATCH_CREDENTIAL_MAX_SIZE = int(os.getenv("G2P_VCI_BATCH_CREDENTIAL_MAX_SIZE", "100"))
+ISSUANCE_METRICS_ENABLED = os.getenv("G2P_VCI_METRICS_ENABLED", "false").lower() == "true"
+ISSUANCE_TIMING_HEADER_ENABLED = os.getenv("G2P_VCI_TIMING_HEADER_ENABLED", "false").lower() == "true"
+
 openid_vci_router = APIRouter(tags=["openid vci"])
 
 
-@openid_vci_router.post("/credential", responses={200: {"model": CredentialBaseResponse}})
+@openid_vci_router.post(
+    "/credential",
+    responses={200: {"model": CredentialBaseResponse}, 202: {"model": CredentialDeferredResponse}},
+)
 def post_credential(
     credential_request: CredentialRequest,
     env: Annotated[Environment, Depends(odoo_env)],
+    response: Response,
     authorization: Annotated[str, Header()] = "",
 ):
     token = authorization.removeprefix("Bearer")
@@ -32,9 +51,14 @@ def post_credential(
         raise HTTPException(401, "Invalid Bearer Token received.")
     try:
         # TODO: Split into smaller steps to better handle errors
-        return CredentialResponse(
-            **env["g2p.openid.vci.issuers"].issue_vc(credential_request.model_dump(), token.strip())
-        )
+        with collect_issuance_timings() as timings:
+            cred_res = env["g2p.openid.vci.issuers"].issue_vc(credential_request.model_dump(), token.strip())
+        if ISSUANCE_TIMING_HEADER_ENABLED:
+            response.headers["Server-Timing"] = format_server_timing(timings)
+        if "transaction_id" in cred_res:
+            response.status_code = 202
+            return CredentialDeferredResponse(**cred_res)
+        return CredentialResponse(**cred_res)
     except Exception as e:
         _logger.exception("Error while handling credential request")
         # TODO: Remove this hardcoding
@@ -46,6 +70,86 @@ def post_credential(
         )
 
 
+@openid_vci_router.post("/deferred_credential", responses={200: {"model": CredentialBaseResponse}})
+def post_deferred_credential(
+    deferred_credential_request: DeferredCredentialRequest,
+    env: Annotated[Environment, Depends(odoo_env)],
+    response: Response,
+    authorization: Annotated[str, Header()] = "",
+):
+    token = authorization.removeprefix("Bearer")
+    if not token:
+        raise HTTPException(401, "Invalid Bearer Token received.")
+    try:
+        cred_res = env["g2p.openid.vci.deferred.credential"].get_deferred_credential(
+            deferred_credential_request.transaction_id, token.strip()
+        )
+    except Exception as e:
+        _logger.exception("Error while handling deferred credential request")
+        cred_res = {
+            "error": "invalid_credential_request",
+            "error_description": f"Error issuing credential. {e}",
+        }
+    if "error" in cred_res:
+        response.status_code = 400
+        return CredentialErrorResponse(**cred_res)
+    return CredentialResponse(**cred_res)
+
+
+@openid_vci_router.post(
+    "/batch_credential",
+    responses={200: {"model": BatchCredentialResponse}},
+)
+def post_batch_credential(
+    batch_credential_request: BatchCredentialRequest,
+    env: Annotated[Environment, Depends(odoo_env)],
+    response: Response,
+    authorization: Annotated[str, Header()] = "",
+):
+    token = authorization.removeprefix("Bearer")
+    if not token:
+        raise HTTPException(401, "Invalid Bearer Token received.")
+    credential_requests = batch_credential_request.credential_requests
+    if len(credential_requests) > BATCH_CREDENTIAL_MAX_SIZE:
+        raise HTTPException(400, f"Batch credential request exceeds {BATCH_CREDENTIAL_MAX_SIZE} credentials.")
+    try:
+        with collect_issuance_timings() as timings:
+            results = env["g2p.openid.vci.issuers"].issue_vc_batch(
+                [credential_request.model_dump() for credential_request in credential_requests], token.strip()
+            )
+        if ISSUANCE_TIMING_HEADER_ENABLED:
+            response.headers["Server-Timing"] = format_server_timing(timings)
+    except Exception as e:
+        _logger.exception("Error while handling batch credential request")
+        return CredentialErrorResponse(
+            error="invalid_credential_request",
+            error_description=f"Error issuing credentials. {e}",
+            c_nonce="",
+            c_nonce_expires_in=1,
+        )
+    return BatchCredentialResponse(
+        credential_responses=[batch_credential_item_response(result) for result in results]
+    )
+
+
+def batch_credential_item_response(result: dict):
+    if "credential" in result:
+        return CredentialResponse(**result)
+    if "transaction_id" in result:
+        return CredentialDeferredResponse(**result)
+    return CredentialErrorResponse(**result)
+
+
+@openid_vci_router.get("/metrics", responses={200: {"model": VCIBaseModel}})
+def get_issuance_metrics():
+    """
+    Time spent per VC issuance stage in this worker process, since it started.
+    """
+    if not ISSUANCE_METRICS_ENABLED:
+        raise HTTPException(404, "Not Found")
+    return VCIBaseModel(stages=issuance_metrics.snapshot())
+
+
 @openid_vci_router.get(
     "/.well-known/openid-credential-issuer/{issuer_name}",
     responses={200: {"model": CredentialIssuerResponse}},
@@ -53,10 +157,12 @@ def post_credential(
 def get_openid_credential_issuer(
     issuer_name: str | None,
     env: Annotated[Environment, Depends(odoo_env)],
+    if_none_match: Annotated[str, Header()] = "",
 ):
-    return CredentialIssuerResponse(
-        **env["g2p.openid.vci.issuers"].get_issuer_metadata_by_name(issuer_name=issuer_name)
-    )
+    document = env["g2p.openid.vci.issuers"].get_issuer_metadata_document(issuer_name=issuer_name)
+    if not document:
+        raise HTTPException(404, "Not Found")
+    return well_known_response(*document, if_none_match=if_none_match)
 
 
 @openid_vci_router.get(
@@ -64,12 +170,24 @@ def get_openid_credential_issuer(
 )
 def get_openid_credential_issuers_all(
     env: Annotated[Environment, Depends(odoo_env)],
+    if_none_match: Annotated[str, Header()] = "",
 ):
-    return get_openid_credential_issuer(issuer_name=None, env=env)
+    return get_openid_credential_issuer(issuer_name=None, env=env, if_none_match=if_none_match)
 
 
 @openid_vci_router.get("/.well-known/contexts.json", responses={200: {"model": VCIBaseModel}})
 def get_openid_contexts_json(
     env: Annotated[Environment, Depends(odoo_env)],
+    if_none_match: Annotated[str, Header()] = "",
 ):
-    return VCIBaseModel(**env["g2p.openid.vci.issuers"].get_all_contexts_json())
+    return well_known_response(
+        *env["g2p.openid.vci.issuers"].get_contexts_json_document(),
+        if_none_match=if_none_match,
+    )
+
+
+def well_known_response(etag: str, body: bytes, if_none_match: str = ""):
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={WELL_KNOWN_CACHE_MAX_AGE}"}
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -38,6 +38,26 @@ class CredentialErrorResponse(CredentialBaseResponse):
     error_description: str
 
 
+class CredentialDeferredResponse(CredentialBaseResponse):
+    transaction_id: str
+
+
+class DeferredCredentialRequest(VCIBaseModel):
+    transaction_id: str
+
+
+class BatchCredentialRequestItem(CredentialRequest):
+    sub: str | None = None
+
+
+class BatchCredentialRequest(VCIBaseModel):
+    credential_requests: list[BatchCredentialRequestItem]
+
+
+class BatchCredentialResponse(CredentialBaseResponse):
+    credential_responses: list[CredentialResponse | CredentialDeferredResponse | CredentialErrorResponse]
+
+
 class CredentialIssuerDisplayLogoResponse(VCIBaseModel):
     url: str
     alt_text: str
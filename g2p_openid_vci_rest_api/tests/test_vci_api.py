@@ -10,6 +10,10 @@ class TestVCIAPITestCase(HttpCase):
     def setUp(self):
         super().setUp()
         self.fastapi_endpoint = self.env.ref("g2p_openid_vci_rest_api.fastapi_endpoint_vci")
+        # Well-known documents are cached per issuers version, which this issuer makes unique to the test.
+        self.issuer = self.env["g2p.openid.vci.issuers"].create(
+            {"name": "Test API Issuer", "issuer_type": "Registry", "scope": "openg2p_test_api_vc_ldp"}
+        )
 
     def mock_issue_vc(self):
         return {
@@ -132,6 +136,22 @@ class TestVCIAPITestCase(HttpCase):
             "OpenG2PTestVerifiableCredential",
             res.json()["credentials_supported"][0]["credential_definition"]["type"][1],
         )
+        # Issuer changes are picked up through the issuers version, without clearing caches.
+        metadata = self.mock_get_issuer_metadata()
+        metadata["credentials_supported"][0]["credential_definition"]["type"][1] = "UpdatedCredential"
+        mock_issuer_metadata.side_effect = lambda *a, **kw: metadata
+        res = self.url_open("/api/v1/vci/.well-known/openid-credential-issuer")
+        self.assertEqual(
+            "OpenG2PTestVerifiableCredential",
+            res.json()["credentials_supported"][0]["credential_definition"]["type"][1],
+        )
+        self.issuer.write({"scope": "openg2p_test_api_2_vc_ldp", "write_date": "2030-01-01 00:00:00"})
+        res = self.url_open("/api/v1/vci/.well-known/openid-credential-issuer")
+        self.assertEqual(
+            "UpdatedCredential",
+            res.json()["credentials_supported"][0]["credential_definition"]["type"][1],
+        )
+
         res = self.url_open("/api/v1/vci/.well-known/contexts.json")
         self.assertEqual(
             "@value",
@@ -149,6 +169,147 @@ class TestVCIAPITestCase(HttpCase):
         self.assertEqual("invalid_credential_request", res.json()["error"])
         self.assertTrue("Temporary mock error" in res.json()["error_description"])
 
+    @patch(
+        "odoo.addons.g2p_openid_vci.models.vci_deferred_credential.OpenIDVCIDeferredCredential.get_deferred_credential"
+    )
+    @patch("odoo.addons.g2p_openid_vci.models.vci_issuer.OpenIDVCIssuer.issue_vc")
+    def test_deferred_credential_api(self, mock_issue_vc, mock_get_deferred_credential):
+        mock_issue_vc.side_effect = lambda *a, **kw: {"transaction_id": "1234"}
+        mock_get_deferred_credential.side_effect = lambda *a, **kw: {
+            "error": "issuance_pending",
+            "error_description": "Credential issuance is pending.",
+            "interval": 5,
+        }
+        headers = {"authorization": "Bearer token", "content-type": "application/json"}
+
+        res = self.url_open(
+            "/api/v1/vci/credential",
+            data='{"format":"ldp_vc", "credential_definition":{"type":[]}}',
+            headers=headers,
+        )
+        self.assertEqual(202, res.status_code)
+        self.assertEqual("1234", res.json()["transaction_id"])
+
+        res = self.url_open(
+            "/api/v1/vci/deferred_credential", data='{"transaction_id":"1234"}', headers=headers
+        )
+        self.assertEqual(400, res.status_code)
+        self.assertEqual("issuance_pending", res.json()["error"])
+        self.assertEqual(5, res.json()["interval"])
+
+        mock_get_deferred_credential.side_effect = lambda *a, **kw: self.mock_issue_vc()
+        res = self.url_open(
+            "/api/v1/vci/deferred_credential", data='{"transaction_id":"1234"}', headers=headers
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual("Full Name", res.json()["credential"]["credentialSubject"]["fullName"][0]["value"])
+
+    @patch("odoo.addons.g2p_openid_vci.models.vci_issuer.OpenIDVCIssuer.issue_vc_batch")
+    def test_batch_credential_api(self, mock_issue_vc_batch):
+        mock_issue_vc_batch.side_effect = lambda *a, **kw: [
+            self.mock_issue_vc(),
+            {"error": "invalid_credential_request", "error_description": "ID not found"},
+        ]
+        data = (
+            '{"credential_requests": [{"format":"ldp_vc", "credential_definition":{"type":[]}},'
+            '{"format":"ldp_vc", "credential_definition":{"type":[]}, "sub": "1234"}]}'
+        )
+
+        res = self.url_open(
+            "/api/v1/vci/batch_credential", data=data, headers={"content-type": "application/json"}
+        )
+        self.assertEqual(401, res.status_code)
+
+        res = self.url_open(
+            "/api/v1/vci/batch_credential",
+            data=data,
+            headers={"authorization": "Bearer token", "content-type": "application/json"},
+        )
+        credential_responses = res.json()["credential_responses"]
+        self.assertEqual(
+            "Full Name", credential_responses[0]["credential"]["credentialSubject"]["fullName"][0]["value"]
+        )
+        self.assertEqual("ID not found", credential_responses[1]["error_description"])
+        self.assertEqual("1234", mock_issue_vc_batch.call_args.args[0][1]["sub"])
+
+        # Items handed to the deferred queue return their transaction id
+        mock_issue_vc_batch.side_effect = lambda *a, **kw: [
+            {"transaction_id": "5678"},
+            {"error": "invalid_credential_request", "error_description": "ID not found"},
+        ]
+        res = self.url_open(
+            "/api/v1/vci/batch_credential",
+            data=data,
+            headers={"authorization": "Bearer token", "content-type": "application/json"},
+        )
+        self.assertEqual(200, res.status_code)
+        credential_responses = res.json()["credential_responses"]
+        self.assertEqual("5678", credential_responses[0]["transaction_id"])
+        self.assertNotIn("error", credential_responses[0])
+        self.assertEqual("ID not found", credential_responses[1]["error_description"])
+
+        mock_issue_vc_batch.side_effect = lambda *a, **kw: self.mock_raise_error()
+        res = self.url_open(
+            "/api/v1/vci/batch_credential",
+            data=data,
+            headers={"authorization": "Bearer token", "content-type": "application/json"},
+        )
+        self.assertEqual("invalid_credential_request", res.json()["error"])
+
+    @patch("odoo.addons.g2p_openid_vci.models.vci_issuer.OpenIDVCIssuer.get_all_contexts_json")
+    @patch("odoo.addons.g2p_openid_vci.models.vci_issuer.OpenIDVCIssuer.get_issuer_metadata_by_name")
+    def test_well_known_cache(self, mock_issuer_metadata, mock_contexts):
+        mock_issuer_metadata.side_effect = lambda *a, **kw: self.mock_get_issuer_metadata()
+        mock_contexts.side_effect = lambda *a, **kw: self.mock_get_contexts()
+
+        res = self.url_open("/api/v1/vci/.well-known/openid-credential-issuer")
+        self.assertEqual(200, res.status_code)
+        etag = res.headers["ETag"]
+        self.assertIn("max-age", res.headers["Cache-Control"])
+        res = self.url_open("/api/v1/vci/.well-known/openid-credential-issuer")
+        self.assertEqual(etag, res.headers["ETag"])
+        self.assertEqual(1, mock_issuer_metadata.call_count)
+
+        res = self.url_open(
+            "/api/v1/vci/.well-known/openid-credential-issuer", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(304, res.status_code)
+
+        res = self.url_open("/api/v1/vci/.well-known/contexts.json")
+        self.assertEqual(200, res.status_code)
+        res = self.url_open(
+            "/api/v1/vci/.well-known/contexts.json", headers={"If-None-Match": res.headers["ETag"]}
+        )
+        self.assertEqual(304, res.status_code)
+        self.assertEqual(1, mock_contexts.call_count)
+
+        # Issuer writes invalidate the rendered documents
+        metadata = self.mock_get_issuer_metadata()
+        metadata["credentials_supported"][0]["scope"] = "openg2p_updated_vc_ldp"
+        mock_issuer_metadata.side_effect = lambda *a, **kw: metadata
+        self.env["g2p.openid.vci.issuers"].search([], limit=1).write({"name": "Updated Issuer"})
+        res = self.url_open(
+            "/api/v1/vci/.well-known/openid-credential-issuer", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertNotEqual(etag, res.headers["ETag"])
+        self.assertEqual(2, mock_issuer_metadata.call_count)
+
+        # Unknown issuer names are rejected before rendering or caching anything
+        res = self.url_open("/api/v1/vci/.well-known/openid-credential-issuer/No Such Issuer")
+        self.assertEqual(404, res.status_code)
+        res = self.url_open(f"/api/v1/vci/.well-known/openid-credential-issuer/{self.issuer.name}")
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(3, mock_issuer_metadata.call_count)
+
+    def test_issuance_metrics_api(self):
+        res = self.url_open("/api/v1/vci/metrics")
+        self.assertEqual(404, res.status_code)
+        with patch("odoo.addons.g2p_openid_vci_rest_api.routers.openid_vci.ISSUANCE_METRICS_ENABLED", True):
+            res = self.url_open("/api/v1/vci/metrics")
+        self.assertEqual(200, res.status_code)
+        self.assertIn("stages", res.json())
+
     def test_misc(self):
         self.fastapi_endpoint.demo_auth_method = "http_basic"
         self.fastapi_endpoint.app = "demo"
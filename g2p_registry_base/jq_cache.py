@@ -0,0 +1,300 @@
+import json
+import re
+from functools import lru_cache
+
+import jq
+
+JQ_PROGRAM_CACHE_SIZE = 128
+
+JQ_TOKEN_PATTERN = re.compile(
+    r"""(?P<space>\s+|\#[^\n]*)"""
+    r"""|(?P<string>")"""
+    r"""|(?P<recurse>\.\.)"""
+    r"""|(?P<field>\.[A-Za-z_][A-Za-z0-9_]*)"""
+    r"""|(?P<quoted_field>\.(?="))"""
+    r"""|(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)"""
+    r"""|(?P<dot>\.)"""
+    r"""|(?P<var>\$[A-Za-z_][A-Za-z0-9_]*)"""
+    r"""|(?P<format>@[A-Za-z0-9_]+)"""
+    r"""|(?P<ident>[A-Za-z_][A-Za-z0-9_]*(?:::[A-Za-z_][A-Za-z0-9_]*)*)"""
+    r"""|(?P<op>\?//|//=|//|\|=|[+\-*/%]=|==|!=|<=|>=|[|,:;()\[\]{}?<>+\-*/%=])"""
+)
+# Keywords that don't use their input. The others (as, def, reduce, ...) bind variables
+# or define functions, which the analysis doesn't follow.
+JQ_KEYWORDS = frozenset(("if", "then", "elif", "else", "end", "and", "or", "try", "catch"))
+JQ_LITERALS = frozenset(("null", "true", "false", "empty"))
+JQ_UNSUPPORTED = frozenset(("as", "def", "reduce", "foreach", "label", "import", "include", "env"))
+# Updates output their whole input
+JQ_ASSIGNMENT_OPS = frozenset(("=", "|=", "+=", "-=", "*=", "/=", "%=", "//="))
+JQ_BRACKETS = {"(": ")", "[": "]", "{": "}"}
+# Marks a path starting from a value the analysis can't follow
+JQ_UNKNOWN = object()
+
+
+@lru_cache(maxsize=JQ_PROGRAM_CACHE_SIZE)
+def compile_jq(program: str):
+    """
+    Compiles a jq program once per process and reuses it, keyed by the program text.
+    Call compile_jq.cache_clear() when the records holding the programs change.
+    """
+    return jq.compile(program)
+
+
+def jq_first(program: str, value):
+    """
+    Drop-in replacement for jq.first(program, value) using the compiled program cache.
+    """
+    return compile_jq(program).input_value(value).first()
+
+
+@lru_cache(maxsize=JQ_PROGRAM_CACHE_SIZE)
+def jq_referenced_names(program: str, complete_names: frozenset = frozenset()) -> frozenset | None:
+    """
+    Returns the object keys a jq program may access (.name, ."name", ["name"], {name}),
+    so that only those need to be read into its input.
+    A value used as a whole, ie, output, iterated, compared or passed to a function like
+    tostring, length, keys or map, rather than only indexed further, needs all its keys.
+    So returns None, every key may be used, if any such value is not under one of
+    complete_names, the keys whose values are complete whatever keys are read.
+    Also returns None if the program uses anything this cannot follow: variables, ..,
+    function definitions, computed indexes like .[expr], or .[] iterations.
+    """
+    try:
+        analysis = _JqAnalysis(complete_names)
+        tokens = _jq_tokenize(program)
+        analysis.pipeline(tokens, 0, len(tokens), ())
+    except ValueError:
+        return None
+    return frozenset(analysis.names)
+
+
+def _jq_tokenize(program: str) -> list[tuple[str, str]]:
+    """
+    Splits a jq program into (kind, text) tokens, dropping whitespace and comments.
+    A string literal is a ("string", value) token, a string with interpolations
+    is replaced by its interpolated expressions, each in parentheses.
+    Raises ValueError on anything it cannot tokenize.
+    """
+    tokens, index = _jq_tokenize_code(program, 0, closing=False)
+    if index != len(program):
+        raise ValueError("Unbalanced jq program")
+    return tokens
+
+
+def _jq_tokenize_code(program: str, index: int, closing: bool) -> tuple[list, int]:
+    tokens = []
+    depth = 0
+    while index < len(program):
+        match = JQ_TOKEN_PATTERN.match(program, index)
+        if not match:
+            raise ValueError(f"Unexpected jq character at {index}")
+        kind, text = match.lastgroup, match.group()
+        index = match.end()
+        if kind == "space":
+            continue
+        if kind == "string":
+            string_tokens, index = _jq_tokenize_string(program, index)
+            tokens.extend(string_tokens)
+            continue
+        if closing and text == "(":
+            depth += 1
+        elif closing and text == ")":
+            if not depth:
+                return tokens, index
+            depth -= 1
+        tokens.append((kind, text))
+    if closing:
+        raise ValueError("Unterminated jq string interpolation")
+    return tokens, index
+
+
+def _jq_tokenize_string(program: str, index: int) -> tuple[list, int]:
+    start = index
+    interpolations = []
+    while index < len(program):
+        char = program[index]
+        if char == '"':
+            if interpolations:
+                return interpolations, index + 1
+            try:
+                value = json.loads(program[start - 1 : index + 1])
+            except ValueError:
+                value = program[start:index]
+            return [("string", value)], index + 1
+        if char == "\\" and program[index + 1 : index + 2] == "(":
+            interpolation, index = _jq_tokenize_code(program, index + 2, closing=True)
+            interpolations += [("op", "("), *interpolation, ("op", ")")]
+            continue
+        index += 2 if char == "\\" else 1
+    raise ValueError("Unterminated jq string")
+
+
+class _JqAnalysis:
+    """
+    Walks the tokens of a jq program, collecting the keys it accesses into names.
+    Paths are tuples of keys from the program input, starting with JQ_UNKNOWN
+    when taken from a value the program computed. Raises ValueError when the
+    program needs every key.
+    """
+
+    def __init__(self, complete_names):
+        self.complete_names = complete_names
+        self.names = set()
+
+    def use_whole(self, path):
+        # Values computed by the program are made of values already checked
+        if path[:1] == (JQ_UNKNOWN,):
+            return
+        if not any(key in self.complete_names for key in path):
+            raise ValueError("jq program uses a whole value")
+
+    def pipeline(self, tokens, start, end, path):
+        """
+        Analyzes tokens[start:end], a pipeline whose input is at path. A stage that is only
+        a path is the input of the next one. The output of the last stage is used as a whole.
+        """
+        stages = self.split(tokens, start, end, "|")
+        for stage_index, (stage_start, stage_end) in enumerate(stages):
+            last = stage_index == len(stages) - 1
+            chain_end, chain_path = self.chain(tokens, stage_start, stage_end, path)
+            if chain_end == stage_end and chain_path is not None:
+                if last:
+                    self.use_whole(chain_path)
+                path = chain_path
+                continue
+            self.expression(tokens, stage_start, stage_end, path)
+            path = (JQ_UNKNOWN,)
+
+    def chain(self, tokens, index, end, path):
+        """
+        Reads a path expression, like .a."b"["c"][0]?, from tokens[index:end].
+        Returns the index after it and its path, or None if there is none at index.
+        """
+        if index >= end or tokens[index][0] not in ("dot", "field", "quoted_field"):
+            return index, None
+        if tokens[index][0] == "dot":
+            index += 1
+        return self.postfix(tokens, index, end, path)
+
+    def postfix(self, tokens, index, end, path):
+        """
+        Reads the .key, ["key"], [0], [1:2] and ? following a value, adding them to path.
+        """
+        while index < end:
+            kind, text = tokens[index]
+            if kind == "field":
+                path = self.key(path, text[1:])
+                index += 1
+            elif kind == "quoted_field":
+                if index + 1 >= end or tokens[index + 1][0] != "string":
+                    raise ValueError("Computed jq key")
+                path = self.key(path, tokens[index + 1][1])
+                index += 2
+            elif text == "?" and kind == "op":
+                index += 1
+            elif text == "[" and kind == "op":
+                closing = self.closing(tokens, index, end)
+                inner = tokens[index + 1 : closing]
+                if len(inner) == 1 and inner[0][0] == "string":
+                    path = self.key(path, inner[0][1])
+                elif not inner or any(token[0] != "number" and token[1] not in (":", "-") for token in inner):
+                    raise ValueError("Computed jq index or iteration")
+                index = closing + 1
+            else:
+                break
+        return index, path
+
+    def key(self, path, name):
+        self.names.add(name)
+        return (*path, name)
+
+    def expression(self, tokens, start, end, path):
+        """
+        Analyzes tokens[start:end], an expression whose input is at path.
+        Every value in it is used as a whole.
+        """
+        index = start
+        while index < end:
+            kind, text = tokens[index]
+            chain_end, chain_path = self.chain(tokens, index, end, path)
+            if chain_path is not None:
+                self.use_whole(chain_path)
+                index = chain_end
+                continue
+            if kind in ("var", "recurse") or (kind == "ident" and text in JQ_UNSUPPORTED):
+                raise ValueError("Unsupported jq construct")
+            if kind == "op" and text in JQ_BRACKETS:
+                closing = self.closing(tokens, index, end)
+                if text == "{":
+                    self.object(tokens, index + 1, closing, path)
+                else:
+                    self.pipeline(tokens, index + 1, closing, path)
+                index, _path = self.postfix(tokens, closing + 1, end, (JQ_UNKNOWN,))
+                continue
+            if kind == "op" and text in JQ_ASSIGNMENT_OPS:
+                self.use_whole(path)
+            if kind == "format" or (kind == "ident" and text not in JQ_KEYWORDS | JQ_LITERALS):
+                # Functions and formats use their input
+                self.use_whole(path)
+                if kind == "ident" and index + 1 < end and tokens[index + 1] == ("op", "("):
+                    closing = self.closing(tokens, index + 1, end)
+                    for arg_start, arg_end in self.split(tokens, index + 2, closing, ";"):
+                        self.pipeline(tokens, arg_start, arg_end, path)
+                    index = closing + 1
+                    continue
+            index += 1
+
+    def object(self, tokens, start, end, path):
+        for entry_start, entry_end in self.split(tokens, start, end, ","):
+            if entry_start == entry_end:
+                continue
+            parts = self.split(tokens, entry_start, entry_end, ":")
+            if len(parts) == 1:
+                if entry_end - entry_start != 1 or tokens[entry_start][0] != "ident":
+                    raise ValueError("Unsupported jq object shorthand")
+                self.use_whole(self.key(path, tokens[entry_start][1]))
+                continue
+            (key_start, key_end), value_start = parts[0], parts[1][0]
+            if tokens[key_start] == ("op", "("):
+                self.pipeline(tokens, key_start + 1, key_end - 1, path)
+            elif tokens[key_start][0] in ("var", "format"):
+                raise ValueError("Unsupported jq object key")
+            self.pipeline(tokens, value_start, entry_end, path)
+
+    def split(self, tokens, start, end, separator):
+        """
+        Returns the (start, end) of the parts of tokens[start:end] between top level separators.
+        """
+        parts = []
+        depth = 0
+        part_start = start
+        for index in range(start, end):
+            kind, text = tokens[index]
+            if kind != "op":
+                continue
+            if text in JQ_BRACKETS:
+                depth += 1
+            elif text in JQ_BRACKETS.values():
+                depth -= 1
+            elif text == separator and not depth:
+                parts.append((part_start, index))
+                part_start = index + 1
+        parts.append((part_start, end))
+        return parts
+
+    def closing(self, tokens, index, end):
+        """
+        Returns the index of the bracket closing the one at tokens[index].
+        """
+        depth = 0
+        for position in range(index, end):
+            kind, text = tokens[position]
+            if kind != "op":
+                continue
+            if text in JQ_BRACKETS:
+                depth += 1
+            elif text in JQ_BRACKETS.values():
+                depth -= 1
+                if not depth:
+                    return position
+        raise ValueError("Unbalanced jq brackets")
@@ -0,0 +1,89 @@
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..jq_cache import jq_referenced_names
+
+COMPLETE_NAMES = frozenset(("id", "name", "birthdate", "value", "k", "v", "a", "b"))
+
+
+@tagged("post_install", "-at_install")
+class TestJqReferencedNames(BaseCase):
+    def test_field_access(self):
+        self.assertEqual(
+            {"partner", "name", "reg_ids", "NATIONAL ID", "value"},
+            jq_referenced_names(
+                '{"name": .partner.name, "nid": .reg_ids["NATIONAL ID"]?.value[0:5]}', COMPLETE_NAMES
+            ),
+        )
+        self.assertEqual(
+            {"partner", "name"},
+            jq_referenced_names(".partner.name | ascii_downcase | length", COMPLETE_NAMES),
+        )
+
+    def test_object_shorthand(self):
+        self.assertEqual(
+            {"partner", "name", "birthdate"},
+            jq_referenced_names("{credentialSubject: .partner | {name, birthdate}}", COMPLETE_NAMES),
+        )
+        self.assertEqual(
+            {"partner", "id"}, jq_referenced_names('.partner | {"id": (.id | tostring)}', COMPLETE_NAMES)
+        )
+        self.assertEqual({"partner", "name"}, jq_referenced_names(".partner | {name} | keys", COMPLETE_NAMES))
+        self.assertIsNone(jq_referenced_names('.partner | {"name"}', COMPLETE_NAMES))
+        self.assertIsNone(jq_referenced_names(".partner | {$__loc__}", COMPLETE_NAMES))
+
+    def test_strings_and_comments(self):
+        self.assertEqual(
+            {"partner", "name"}, jq_referenced_names('"Hello \\(.partner.name) {x}" # {y}', COMPLETE_NAMES)
+        )
+        self.assertEqual({"k", "v"}, jq_referenced_names('{"\\(.k)": .v}', COMPLETE_NAMES))
+        self.assertEqual({"a", "b"}, jq_referenced_names("if .a then [.b] else [] end", COMPLETE_NAMES))
+
+    def test_complete_names(self):
+        self.assertEqual({"partner", "name"}, jq_referenced_names(".partner.name", COMPLETE_NAMES))
+        self.assertIsNone(jq_referenced_names(".partner.name"))
+        self.assertEqual(
+            {"partner_address"},
+            jq_referenced_names(".partner_address | tojson", frozenset(("partner_address",))),
+        )
+
+    def test_whole_value_use(self):
+        for program in (
+            "{credentialSubject: .partner}",
+            ".partner",
+            ".partner | tostring",
+            ".partner[]",
+            ".partner[]?.name",
+            ".partner | [.[]]",
+            ".partner | length",
+            ".partner | @json",
+            ".partner | @text",
+            ".partner | @base64",
+            ".partner | tojson",
+            ".partner | keys",
+            ".partner | to_entries",
+            ".partner | map(.name)",
+            ".partner | add",
+            ".partner | with_entries(.value)",
+            '"\\(.partner)"',
+            ".partner // {}",
+            "(.partner) | length",
+            '.partner | .name = "x"',
+            "[.partner] | tojson",
+        ):
+            with self.subTest(program=program):
+                self.assertIsNone(jq_referenced_names(program, COMPLETE_NAMES))
+
+    def test_dynamic_access(self):
+        for program in (
+            ".partner as $p | $p.name",
+            ".partner | ..",
+            ".partner[.key]",
+            '.partner["\\(.key)"]',
+            '.partner | has("name")',
+            '.partner | getpath(["name"])',
+            "reduce .partner.name as $n (0; . + 1)",
+            '"unterminated',
+        ):
+            with self.subTest(program=program):
+                self.assertIsNone(jq_referenced_names(program, COMPLETE_NAMES))
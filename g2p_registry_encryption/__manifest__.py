@@ -6,11 +6,14 @@
     "author": "OpenG2P",
     "website": "https://openg2p.org",
     "license": "LGPL-3",
-    "depends": ["g2p_encryption", "g2p_registry_base", "g2p_registry_individual"],
+    "depends": ["queue_job", "g2p_encryption", "g2p_registry_base", "g2p_registry_individual"],
     "data": [
+        "security/ir.model.access.csv",
         "data/registry_encryption_provider.xml",
+        "data/queue_job_channel.xml",
         "views/decrypted_partner.xml",
         "views/encryption_provider.xml",
+        "views/encryption_job.xml",
         "views/res_config_view.xml",
     ],
     "assets": {
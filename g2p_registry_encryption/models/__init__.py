@@ -1,3 +1,5 @@
 from . import encryption_provider
+from . import blind_index_token
 from . import partner
 from . import res_config_settings
+from . import encryption_job
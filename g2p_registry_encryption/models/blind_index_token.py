@@ -0,0 +1,12 @@
+from odoo import fields, models
+
+
+class RegistryBlindIndexToken(models.Model):
+    _name = "g2p.registry.blind.index.token"
+    _description = "G2P Registry Blind Index Token"
+    _log_access = False
+
+    # Keyed HMAC of a normalized word prefix of an encrypted field, see res.partner get_blind_index_tokens.
+    partner_id = fields.Many2one("res.partner", required=True, index=True, ondelete="cascade")
+    field_name = fields.Char(required=True)
+    token_hash = fields.Char(required=True, index=True)
@@ -0,0 +1,283 @@
+import json
+import logging
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class RegistryEncryptionJob(models.Model):
+    _name = "g2p.registry.encryption.job"
+    _description = "G2P Registry Bulk Encryption Job"
+    _order = "id desc"
+
+    name = fields.Char(required=True, default=lambda self: _("Registry Encryption"))
+    mode = fields.Selection(
+        [
+            ("encrypt", "Encrypt unencrypted registrants"),
+            ("reencrypt", "Re-encrypt all registrants"),
+        ],
+        required=True,
+        default="encrypt",
+    )
+    target_provider_id = fields.Many2one(
+        "g2p.encryption.provider",
+        "Target Encryption Provider",
+        required=True,
+        default=lambda self: self.env["g2p.encryption.provider"].get_registry_provider(),
+    )
+    batch_size = fields.Integer(required=True, default=500)
+    worker_count = fields.Integer("Parallel Workers", required=True, default=4)
+
+    state = fields.Selection(
+        [
+            ("draft", "Draft"),
+            ("running", "Running"),
+            ("done", "Done"),
+            ("failed", "Failed"),
+            ("cancelled", "Cancelled"),
+        ],
+        required=True,
+        default="draft",
+        readonly=True,
+    )
+    partition_ids = fields.One2many("g2p.registry.encryption.job.partition", "job_id", readonly=True)
+    # Decremented atomically by each partition that completes, the one reaching 0 finishes the job.
+    partitions_pending = fields.Integer(readonly=True)
+    # Incremented on every start and resume. Queued batches of an earlier run carry the old
+    # value and do nothing when they run, so two chains never process the same partition.
+    run_sequence = fields.Integer(readonly=True)
+
+    records_total = fields.Integer(readonly=True)
+    records_done = fields.Integer(compute="_compute_progress")
+    progress = fields.Float(compute="_compute_progress")
+    throughput = fields.Float("Throughput (records/sec)", compute="_compute_progress")
+    start_datetime = fields.Datetime(readonly=True)
+    end_datetime = fields.Datetime(readonly=True)
+    last_error = fields.Text(readonly=True)
+
+    @api.depends("partition_ids.records_done", "records_total", "start_datetime", "end_datetime")
+    def _compute_progress(self):
+        for rec in self:
+            rec.records_done = sum(rec.partition_ids.mapped("records_done"))
+            rec.progress = 100.0 * rec.records_done / rec.records_total if rec.records_total else 0.0
+            elapsed = 0.0
+            if rec.start_datetime:
+                elapsed = ((rec.end_datetime or fields.Datetime.now()) - rec.start_datetime).total_seconds()
+            rec.throughput = rec.records_done / elapsed if elapsed > 0 else 0.0
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "state" in vals:
+            # Re-encryption jobs decide which blind index keys the registry policy searches with.
+            self.env.registry.clear_cache()
+        return res
+
+    def _get_registrant_domain(self):
+        self.ensure_one()
+        domain = [("is_registrant", "=", True)]
+        if self.mode == "encrypt":
+            domain.append(("is_encrypted", "=", False))
+        else:
+            domain.append(("is_encrypted", "=", True))
+        return domain
+
+    def action_start(self):
+        for rec in self:
+            if rec.state != "draft":
+                raise UserError(_("Only draft jobs can be started."))
+            rec.target_provider_id.ensure_registry_blind_index_key()
+            partner_model = self.env["res.partner"].with_context(active_test=False)
+            domain = rec._get_registrant_domain()
+            rec.records_total = partner_model.search_count(domain)
+            rec.write(
+                {
+                    "state": "running",
+                    "start_datetime": fields.Datetime.now(),
+                    "end_datetime": False,
+                    "last_error": False,
+                    "run_sequence": rec.run_sequence + 1,
+                }
+            )
+            if not rec.records_total:
+                rec._finish()
+                continue
+
+            # Split the id space into contiguous ranges, one chain of batch jobs per range.
+            min_id = partner_model.search(domain, order="id", limit=1).id
+            max_id = partner_model.search(domain, order="id desc", limit=1).id
+            worker_count = max(1, rec.worker_count)
+            step = (max_id - min_id) // worker_count + 1
+            partitions = self.env["g2p.registry.encryption.job.partition"].create(
+                [
+                    {
+                        "job_id": rec.id,
+                        "start_id": start_id,
+                        "end_id": min(start_id + step - 1, max_id),
+                        "last_id": start_id - 1,
+                    }
+                    for start_id in range(min_id, max_id + 1, step)
+                ]
+            )
+            rec.partitions_pending = len(partitions)
+            partitions._enqueue_next_batch()
+
+    def action_resume(self):
+        for rec in self:
+            if rec.state not in ("failed", "cancelled"):
+                raise UserError(_("Only failed or cancelled jobs can be resumed."))
+            pending = rec.partition_ids.filtered(lambda p: p.state != "done")
+            rec.write(
+                {
+                    "state": "running",
+                    "end_datetime": False,
+                    "last_error": False,
+                    "run_sequence": rec.run_sequence + 1,
+                    "partitions_pending": len(pending),
+                }
+            )
+            if not pending:
+                rec._finish()
+                continue
+            pending._enqueue_next_batch()
+
+    def action_cancel(self):
+        self.filtered(lambda rec: rec.state == "running").write(
+            {"state": "cancelled", "end_datetime": fields.Datetime.now()}
+        )
+
+    def _finish(self):
+        self.ensure_one()
+        self.write({"state": "done", "end_datetime": fields.Datetime.now()})
+        if self.mode == "reencrypt":
+            self.env["g2p.encryption.provider"].set_registry_provider(self.target_provider_id.id)
+
+
+class RegistryEncryptionJobPartition(models.Model):
+    _name = "g2p.registry.encryption.job.partition"
+    _description = "G2P Registry Bulk Encryption Job Partition"
+    _order = "start_id"
+
+    job_id = fields.Many2one("g2p.registry.encryption.job", required=True, ondelete="cascade")
+    start_id = fields.Integer(required=True)
+    end_id = fields.Integer(required=True)
+    last_id = fields.Integer(required=True)
+    records_done = fields.Integer(default=0)
+    state = fields.Selection(
+        [("pending", "Pending"), ("done", "Done")],
+        required=True,
+        default="pending",
+    )
+
+    def _enqueue_next_batch(self):
+        for rec in self:
+            rec.with_delay(
+                channel="root.registry_encryption",
+                description=f"{rec.job_id.name}: ids {rec.last_id + 1}-{rec.end_id}",
+            ).process_next_batch(run_sequence=rec.job_id.run_sequence)
+
+    def process_next_batch(self, run_sequence=None):
+        self.ensure_one()
+        # Serialize the batches of a partition, in case a stale batch is still running.
+        self.env.cr.execute(
+            "SELECT id FROM g2p_registry_encryption_job_partition WHERE id = %s FOR UPDATE", (self.id,)
+        )
+        job = self.job_id
+        if job.state != "running" or self.state == "done":
+            return
+        if run_sequence is not None and run_sequence != job.run_sequence:
+            _logger.info("Skipping batch of an earlier run of %s", job.name)
+            return
+
+        partners = (
+            self.env["res.partner"]
+            .with_context(active_test=False)
+            .search(
+                job._get_registrant_domain() + [("id", ">", self.last_id), ("id", "<=", self.end_id)],
+                order="id",
+                limit=job.batch_size,
+            )
+        )
+        if not partners:
+            self.state = "done"
+            # Partitions complete concurrently, so count down in the database rather than
+            # checking the state of the others, which a concurrent transaction may not see yet.
+            job.flush_recordset(["partitions_pending"])
+            self.env.cr.execute(
+                "UPDATE g2p_registry_encryption_job SET partitions_pending = partitions_pending - 1 "
+                "WHERE id = %s RETURNING partitions_pending",
+                (job.id,),
+            )
+            (partitions_pending,) = self.env.cr.fetchone()
+            job.invalidate_recordset(["partitions_pending"])
+            if partitions_pending <= 0:
+                job._finish()
+            return
+
+        try:
+            with self.env.cr.savepoint():
+                if job.mode == "encrypt":
+                    self._encrypt_partners(partners, job.target_provider_id)
+                else:
+                    self._reencrypt_partners(partners, job.target_provider_id)
+        except Exception as e:
+            _logger.exception("Registry encryption batch failed for %s", job.name)
+            job.write({"state": "failed", "last_error": str(e), "end_datetime": fields.Datetime.now()})
+            return
+
+        self.write({"last_id": partners[-1].id, "records_done": self.records_done + len(partners)})
+        self._enqueue_next_batch()
+
+    @api.model
+    def _encrypt_partners(self, partners, prov):
+        partner_model = self.env["res.partner"]
+        policy = self.env["g2p.encryption.provider"].get_registry_encryption_policy()
+        policy = policy._replace(blind_index_key=prov.get_registry_blind_index_key())
+        vals_list = partners.read(list(policy.fields_to_enc))
+        tokens_list = []
+        for vals in vals_list:
+            vals.update(partner_model.get_blind_index_vals(vals, policy))
+            tokens_list.append(partner_model.get_blind_index_tokens(vals, policy))
+        to_be_encrypted = [
+            partner_model.gather_fields_to_be_enc_from_dict(vals, policy) for vals in vals_list
+        ]
+        encrypted = prov.encrypt_data_batch([json.dumps(each).encode() for each in to_be_encrypted])
+        for partner, vals, encrypted_val in zip(partners, vals_list, encrypted, strict=True):
+            vals.pop("id", None)
+            vals.update(
+                {
+                    "encrypted_val": encrypted_val,
+                    "is_encrypted": True,
+                    "encryption_provider_id": prov.id,
+                }
+            )
+            partner.with_context(skip_registry_encryption=True).write(vals)
+        partners.set_blind_index_tokens(tokens_list)
+
+    @api.model
+    def _reencrypt_partners(self, partners, prov):
+        partner_model = self.env["res.partner"]
+        policy = self.env["g2p.encryption.provider"].get_registry_encryption_policy()
+        policy = policy._replace(blind_index_key=prov.get_registry_blind_index_key())
+        registry_prov = self.env["g2p.encryption.provider"].get_registry_provider()
+        encrypted_vals = partners.get_encrypted_val()
+        by_source = {}
+        for partner, (_is_encrypted, encrypted_val) in zip(partners, encrypted_vals, strict=True):
+            source = partner.sudo().encryption_provider_id or registry_prov
+            by_source.setdefault(source, []).append((partner, encrypted_val))
+        for source, items in by_source.items():
+            decrypted = source.decrypt_data_batch(
+                [encrypted_val or b"{}" for _partner, encrypted_val in items]
+            )
+            encrypted = prov.encrypt_data_batch(decrypted)
+            tokens_list = []
+            for (partner, _enc), decrypted_val, encrypted_val in zip(
+                items, decrypted, encrypted, strict=True
+            ):
+                decrypted_vals = json.loads(decrypted_val.decode())
+                vals = partner_model.get_blind_index_vals(decrypted_vals, policy)
+                vals.update({"encrypted_val": encrypted_val, "encryption_provider_id": prov.id})
+                partner.with_context(skip_registry_encryption=True).write(vals)
+                tokens_list.append(partner_model.get_blind_index_tokens(decrypted_vals, policy))
+            partner_model.browse([partner.id for partner, _enc in items]).set_blind_index_tokens(tokens_list)
@@ -1,6 +1,33 @@
-from odoo import api, fields, models
+import secrets
+from collections import namedtuple
+
+from odoo import api, fields, models, tools
 from odoo.tools import safe_eval
 
+RegistryEncryptionPolicy = namedtuple(
+    "RegistryEncryptionPolicy",
+    [
+        "encrypt",
+        "decrypt",
+        "provider_id",
+        "write_provider_id",
+        "fields_to_enc",
+        "placeholder",
+        "blind_index_key",
+        "blind_index_search_keys",
+        "blind_index_key_encs",
+    ],
+)
+
+# Decrypted blind index keys, by database, provider and encrypted key. A provider's key
+# never changes once generated, so they are decrypted once per process.
+_blind_index_keys = {}
+
+# Provider fields the cached registry encryption policy is built from.
+REGISTRY_POLICY_FIELDS = frozenset(
+    ("registry_fields_to_enc", "registry_enc_field_placeholder", "registry_blind_index_key_enc")
+)
+
 
 class RegistryEncryptionProvider(models.Model):
     _inherit = "g2p.encryption.provider"
@@ -20,10 +47,74 @@ class RegistryEncryptionProvider(models.Model):
 
     registry_enc_field_placeholder = fields.Char("Registry Encrypted Field Placeholder", default="encrypted")
 
+    # The blind index key is kept encrypted with the provider itself, see get_registry_blind_index_key.
+    registry_blind_index_key_enc = fields.Binary(
+        attachment=False, copy=False, readonly=True, groups="base.group_system"
+    )
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Other writes, like keymanager access token refreshes, must not flush every ormcache.
+        if REGISTRY_POLICY_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        clear_cache = self.get_registry_encryption_policy().provider_id in self.ids
+        res = super().unlink()
+        if clear_cache:
+            self.env.registry.clear_cache()
+        return res
+
     def get_registry_fields_set_to_enc(self):
         self.ensure_one()
         return set(safe_eval.safe_eval(self.registry_fields_to_enc))
 
+    def ensure_registry_blind_index_key(self):
+        """
+        Generates the HMAC key for the registry blind indexes of the providers that have none.
+        The key is stored encrypted with the provider itself.
+        """
+        for prov in self.sudo().with_context(bin_size=False):
+            if prov.registry_blind_index_key_enc:
+                continue
+            # Lock the provider so concurrent setups do not each generate a different key.
+            self.env.cr.execute("SELECT id FROM g2p_encryption_provider WHERE id = %s FOR UPDATE", (prov.id,))
+            prov.invalidate_recordset(["registry_blind_index_key_enc"])
+            if not prov.registry_blind_index_key_enc:
+                prov.registry_blind_index_key_enc = prov.encrypt_data(secrets.token_urlsafe(32).encode())
+
+    @api.model
+    def ensure_registry_blind_index_keys(self):
+        """
+        Generates the blind index keys the registry encryption policy needs, ie, of the registry
+        provider and the targets of unfinished re-encryption jobs, when encryption is enabled.
+        Called when the registry encryption is set up, so that the policy only reads keys.
+        """
+        policy = self._get_registry_encryption_policy()
+        missing_ids = [prov_id for prov_id, key_enc in policy.blind_index_key_encs if not key_enc]
+        if missing_ids:
+            self.browse(missing_ids).ensure_registry_blind_index_key()
+
+    def get_registry_blind_index_key(self) -> str | None:
+        """
+        Returns the HMAC key for the registry blind indexes of this provider, None if it
+        has not been generated, see ensure_registry_blind_index_key.
+        """
+        self.ensure_one()
+        return self._decrypt_registry_blind_index_key(
+            self.sudo().with_context(bin_size=False).registry_blind_index_key_enc
+        )
+
+    def _decrypt_registry_blind_index_key(self, key_enc) -> str | None:
+        self.ensure_one()
+        if not key_enc:
+            return None
+        cache_key = (self.env.cr.dbname, self.id, key_enc)
+        if cache_key not in _blind_index_keys:
+            _blind_index_keys[cache_key] = self.sudo().decrypt_data(key_enc).decode()
+        return _blind_index_keys[cache_key]
+
     @api.model
     def set_registry_provider(self, provider_id, replace=True):
         if provider_id and (
@@ -35,12 +126,80 @@ class RegistryEncryptionProvider(models.Model):
             self.env["ir.config_parameter"].sudo().set_param(
                 "g2p_registry_encryption.encryption_provider_id", str(provider_id)
             )
+            self.ensure_registry_blind_index_keys()
 
     @api.model
     def get_registry_provider(self):
-        prov_id = (
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("g2p_registry_encryption.encryption_provider_id", None)
+        policy = self.get_registry_encryption_policy()
+        return self.sudo().browse(policy.provider_id) if policy.provider_id else None
+
+    @api.model
+    def get_registry_write_provider(self):
+        """
+        Returns the provider to encrypt written registrants with, ie, the target provider
+        of an unfinished re-encryption job, else the registry provider.
+        """
+        policy = self.get_registry_encryption_policy()
+        return self.sudo().browse(policy.write_provider_id) if policy.write_provider_id else None
+
+    @api.model
+    def get_registry_encryption_policy(self) -> RegistryEncryptionPolicy:
+        """
+        Returns the registry encryption settings as an immutable tuple.
+        The result is cached and invalidated whenever a config parameter,
+        an encryption provider or the state of an encryption job is written.
+        The blind index keys are decrypted here, out of the cached part, once per process.
+        """
+        policy = self._get_registry_encryption_policy()
+        if not policy.blind_index_key_encs:
+            return policy
+        keys = {}
+        for prov_id, key_enc in policy.blind_index_key_encs:
+            key = self.browse(prov_id)._decrypt_registry_blind_index_key(key_enc)
+            if key:
+                keys[prov_id] = key
+        return policy._replace(
+            blind_index_key=keys.get(policy.write_provider_id),
+            blind_index_search_keys=tuple(keys.values()),
+        )
+
+    @api.model
+    @tools.ormcache()
+    def _get_registry_encryption_policy(self):
+        # Only reads, keys are neither generated nor decrypted here.
+        config = self.env["ir.config_parameter"].sudo()
+        prov_id = config.get_param("g2p_registry_encryption.encryption_provider_id", None)
+        prov = self.sudo().browse(int(prov_id)).exists() if prov_id else None
+        encrypt = bool(config.get_param("g2p_registry_encryption.encrypt_registry", default=False))
+        write_prov = prov
+        blind_index_key_encs = ()
+        if prov and encrypt:
+            # Rows re-encrypted by a re-encryption job that has not finished are indexed
+            # with the target provider's key, so search with both. Rows written meanwhile
+            # go to the latest job's target, so the registry provider switch doesn't miss them.
+            reencrypt_targets = (
+                self.env["g2p.registry.encryption.job"]
+                .sudo()
+                .search(
+                    [("mode", "=", "reencrypt"), ("state", "in", ("running", "failed", "cancelled"))],
+                    order="id desc",
+                )
+                .target_provider_id
+            )
+            write_prov = reencrypt_targets[:1] or prov
+            # The registry provider first, write_prov is always one of them.
+            blind_index_key_encs = tuple(
+                (each.id, each.with_context(bin_size=False).registry_blind_index_key_enc or None)
+                for each in prov | reencrypt_targets
+            )
+        return RegistryEncryptionPolicy(
+            encrypt=encrypt,
+            decrypt=bool(config.get_param("g2p_registry_encryption.decrypt_registry", default=False)),
+            provider_id=prov.id if prov else None,
+            write_provider_id=write_prov.id if write_prov else None,
+            fields_to_enc=frozenset(prov.get_registry_fields_set_to_enc()) if prov else frozenset(),
+            placeholder=prov.registry_enc_field_placeholder if prov else None,
+            blind_index_key=None,
+            blind_index_search_keys=(),
+            blind_index_key_encs=blind_index_key_encs,
         )
-        return self.sudo().browse(int(prov_id)) if prov_id else None
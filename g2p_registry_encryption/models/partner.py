@@ -1,6 +1,19 @@
+import hashlib
+import hmac
 import json
+import re
+import unicodedata
 
-from odoo import api, fields, models
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+from odoo.osv import expression
+
+BLIND_INDEX_FIELDS = ("name", "given_name", "family_name")
+BLIND_INDEX_HASH_OPERATORS = ("=", "!=", "in", "not in")
+BLIND_INDEX_PATTERN_OPERATORS = ("=like", "=ilike", "like", "ilike", "not like", "not ilike")
+# Words are indexed by their prefixes from BLIND_INDEX_PREFIX_MIN_LENGTH characters, shorter words whole.
+BLIND_INDEX_PREFIX_MIN_LENGTH = 3
+BLIND_INDEX_PREFIX_MAX_LENGTH = 32
 
 
 class EncryptedPartner(models.Model):
@@ -8,95 +21,321 @@ class EncryptedPartner(models.Model):
 
     encrypted_val = fields.Binary("Encrypted value", attachment=False)
     is_encrypted = fields.Boolean(default=False)
+    encryption_provider_id = fields.Many2one("g2p.encryption.provider", readonly=True)
+
+    # Keyed HMAC blind indexes, to search encrypted fields without decrypting them.
+    name_bidx = fields.Char(index=True, copy=False, readonly=True)
+    name_bidx_norm = fields.Char(index=True, copy=False, readonly=True)
+    given_name_bidx = fields.Char(index=True, copy=False, readonly=True)
+    given_name_bidx_norm = fields.Char(index=True, copy=False, readonly=True)
+    family_name_bidx = fields.Char(index=True, copy=False, readonly=True)
+    family_name_bidx_norm = fields.Char(index=True, copy=False, readonly=True)
+    blind_index_token_ids = fields.One2many(
+        "g2p.registry.blind.index.token", "partner_id", copy=False, readonly=True
+    )
+
+    @api.model
+    def blind_index_normalize(self, value: str) -> str:
+        value = unicodedata.normalize("NFKD", str(value))
+        value = "".join(c for c in value if not unicodedata.combining(c))
+        return re.sub(r"\s+", " ", value).strip().casefold()
+
+    @api.model
+    def blind_index_words(self, value: str) -> list:
+        return re.findall(r"\w+", self.blind_index_normalize(value))
+
+    @api.model
+    def blind_index_hash(self, value: str, policy) -> str:
+        return self._blind_index_hash(value, policy.blind_index_key)
+
+    @api.model
+    def blind_index_search_hashes(self, value: str, policy) -> list:
+        """
+        Hashes value with every key rows may currently be indexed with,
+        ie, the registry provider's and, while a re-encryption job runs, the target provider's.
+        """
+        return [self._blind_index_hash(value, key) for key in policy.blind_index_search_keys]
+
+    @api.model
+    def _blind_index_hash(self, value: str, key: str) -> str:
+        return hmac.new(key.encode(), str(value).encode(), hashlib.sha256).hexdigest()
+
+    @api.model
+    def get_blind_index_vals(self, fields_dict: dict, policy) -> dict:
+        """
+        Computes the blind index columns for the indexed fields present in fields_dict.
+        Must be called on plaintext values, before placeholders are put in.
+        """
+        res = {}
+        if not policy.blind_index_key:
+            return res
+        for field_name in BLIND_INDEX_FIELDS:
+            if field_name not in policy.fields_to_enc or field_name not in fields_dict:
+                continue
+            value = fields_dict[field_name]
+            if not value or value == policy.placeholder:
+                res.update({f"{field_name}_bidx": False, f"{field_name}_bidx_norm": False})
+                continue
+            res.update(
+                {
+                    f"{field_name}_bidx": self.blind_index_hash(value, policy),
+                    f"{field_name}_bidx_norm": self.blind_index_hash(
+                        self.blind_index_normalize(value), policy
+                    ),
+                }
+            )
+        return res
+
+    @api.model
+    def get_blind_index_tokens(self, fields_dict: dict, policy) -> list:
+        """
+        Computes the word prefix blind index tokens, [(field_name, token_hash)], for the
+        indexed fields present in fields_dict. Each normalized word is indexed by its
+        prefixes of BLIND_INDEX_PREFIX_MIN_LENGTH to BLIND_INDEX_PREFIX_MAX_LENGTH characters.
+        Must be called on plaintext values, before placeholders are put in.
+        """
+        res = []
+        if not policy.blind_index_key:
+            return res
+        for field_name in BLIND_INDEX_FIELDS:
+            value = fields_dict.get(field_name)
+            if field_name not in policy.fields_to_enc or not value or value == policy.placeholder:
+                continue
+            prefixes = set()
+            for word in self.blind_index_words(value):
+                min_length = min(len(word), BLIND_INDEX_PREFIX_MIN_LENGTH)
+                max_length = min(len(word), BLIND_INDEX_PREFIX_MAX_LENGTH)
+                prefixes.update(word[:length] for length in range(min_length, max_length + 1))
+            res.extend((field_name, self.blind_index_hash(prefix, policy)) for prefix in sorted(prefixes))
+        return res
+
+    def set_blind_index_tokens(self, tokens_list: list):
+        """
+        Replaces the blind index tokens of the records with tokens_list,
+        the get_blind_index_tokens result of each record.
+        """
+        token_model = self.env["g2p.registry.blind.index.token"].sudo()
+        token_model.search([("partner_id", "in", self.ids)]).unlink()
+        token_model.create(
+            [
+                {"partner_id": rec.id, "field_name": field_name, "token_hash": token_hash}
+                for rec, tokens in zip(self, tokens_list, strict=True)
+                for field_name, token_hash in tokens
+            ]
+        )
+
+    @api.model
+    def get_blind_index_domain(self, field_name, operator, value, policy):
+        """
+        Translates a domain leaf on an encrypted field into one on its blind index.
+        =, !=, in and not in match the exact value's hash. Pattern operators
+        (like, ilike, =like, =ilike and their negations) match on the word prefix tokens:
+        every word of the pattern, split at wildcards, must start a word of the field,
+        ignoring case and accents. Pattern words shorter than BLIND_INDEX_PREFIX_MIN_LENGTH
+        only match whole words. Rows not yet encrypted are matched on plaintext.
+        Returns None if the leaf cannot be translated.
+        """
+        if operator == "=?":
+            if not value:
+                return None
+            operator = "="
+        if operator in ("=", "!=") and isinstance(value, str):
+            hashes = self.blind_index_search_hashes(value, policy)
+            bidx_domain = [(f"{field_name}_bidx", "in" if operator == "=" else "not in", hashes)]
+        elif operator in ("in", "not in") and isinstance(value, list | tuple):
+            hashes = [
+                each_hash
+                for each in value
+                if isinstance(each, str)
+                for each_hash in self.blind_index_search_hashes(each, policy)
+            ]
+            bidx_domain = [(f"{field_name}_bidx", operator, hashes)]
+        elif operator in BLIND_INDEX_PATTERN_OPERATORS and isinstance(value, str):
+            bidx_domain = self.get_blind_index_pattern_domain(field_name, operator, value, policy)
+            if bidx_domain is None:
+                return None
+        elif operator in BLIND_INDEX_PATTERN_OPERATORS + BLIND_INDEX_HASH_OPERATORS:
+            return None
+        else:
+            raise UserError(
+                _("Encrypted field %(field)s cannot be searched with operator %(operator)s.")
+                % {"field": self._fields[field_name].string, "operator": operator}
+            )
+        return expression.OR(
+            [
+                expression.AND([[("is_encrypted", "=", True)], bidx_domain]),
+                [("is_encrypted", "=", False), (field_name, operator, value)],
+            ]
+        )
+
+    @api.model
+    def get_blind_index_pattern_domain(self, field_name, operator, value, policy):
+        """
+        Returns the domain matching the word prefix tokens of a like/ilike pattern,
+        or None if the pattern has no words, ie, matches any value.
+        """
+        words = self.blind_index_words(re.sub(r"(?<!\\)[%_]", " ", value))
+        if not words:
+            return None
+        token_operator = "not any" if operator.startswith("not ") else "any"
+        word_domains = [
+            [
+                (
+                    "blind_index_token_ids",
+                    token_operator,
+                    [
+                        ("field_name", "=", field_name),
+                        (
+                            "token_hash",
+                            "in",
+                            self.blind_index_search_hashes(word[:BLIND_INDEX_PREFIX_MAX_LENGTH], policy),
+                        ),
+                    ],
+                )
+            ]
+            for word in words
+        ]
+        if token_operator == "not any":
+            return expression.AND([[(field_name, "!=", False)], expression.OR(word_domains)])
+        return expression.AND(word_domains)
+
+    def _decrypt_encrypted_vals(self):
+        """
+        Decrypts the encrypted values of the records, batched per encryption provider.
+        Returns [(id, decrypted_vals_dict)].
+        """
+        registry_prov = self.env["g2p.encryption.provider"].get_registry_provider()
+        providers = {prov.id: prov for prov in self.sudo().encryption_provider_id}
+        by_provider = {}
+        fields_to_read = ["is_encrypted", "encrypted_val", "encryption_provider_id"]
+        for vals in self.with_context(bin_size=False).read(fields_to_read):
+            if not vals["is_encrypted"] or not vals["encrypted_val"]:
+                continue
+            prov_id = vals["encryption_provider_id"] and vals["encryption_provider_id"][0]
+            by_provider.setdefault(providers.get(prov_id) or registry_prov, []).append(vals)
+        res = []
+        for prov, vals_list in by_provider.items():
+            decrypted = prov.decrypt_data_batch([vals["encrypted_val"] for vals in vals_list])
+            for vals, decrypted_val in zip(vals_list, decrypted, strict=True):
+                res.append((vals["id"], json.loads(decrypted_val.decode())))
+        return res
+
+    @api.model
+    def _search(self, domain, *args, **kwargs):
+        policy = self.env["g2p.encryption.provider"].get_registry_encryption_policy()
+        if policy.encrypt and policy.blind_index_key and domain:
+            new_domain = []
+            for leaf in domain:
+                if (
+                    isinstance(leaf, list | tuple)
+                    and len(leaf) == 3
+                    and leaf[0] in BLIND_INDEX_FIELDS
+                    and leaf[0] in policy.fields_to_enc
+                ):
+                    bidx_domain = self.get_blind_index_domain(*leaf, policy)
+                    if bidx_domain:
+                        new_domain.extend(bidx_domain)
+                        continue
+                new_domain.append(leaf)
+            domain = new_domain
+        return super()._search(domain, *args, **kwargs)
 
     @api.model
     def gather_fields_to_be_enc_from_dict(
         self,
         fields_dict: dict,
-        prov,
+        policy,
         replace=True,
     ):
         to_be_enc = {}
-        for each in prov.get_registry_fields_set_to_enc():
+        for each in policy.fields_to_enc:
             if fields_dict and fields_dict.get(each, None):
                 to_be_enc[each] = fields_dict[each]
                 if replace:
-                    fields_dict[each] = prov.registry_enc_field_placeholder
+                    fields_dict[each] = policy.placeholder
         return to_be_enc
 
     def create(self, vals_list):
-        is_encrypt_fields = (
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("g2p_registry_encryption.encrypt_registry", default=False)
-        )
-        if not is_encrypt_fields:
+        policy = self.env["g2p.encryption.provider"].get_registry_encryption_policy()
+        if not policy.encrypt:
             return super().create(vals_list)
 
         vals_list = [vals_list] if isinstance(vals_list, dict) else vals_list
 
-        prov = self.env["g2p.encryption.provider"].get_registry_provider()
+        prov = self.env["g2p.encryption.provider"].get_registry_write_provider()
+        tokens_list = []
         for vals in vals_list:
+            tokens_list.append(None)
             if vals.get("is_registrant", False):
-                to_be_encrypted = self.gather_fields_to_be_enc_from_dict(vals, prov)
+                vals.update(self.get_blind_index_vals(vals, policy))
+                tokens_list[-1] = self.get_blind_index_tokens(vals, policy)
+                to_be_encrypted = self.gather_fields_to_be_enc_from_dict(vals, policy)
                 vals["encrypted_val"] = prov.encrypt_data(json.dumps(to_be_encrypted).encode())
                 vals["is_encrypted"] = True
+                vals["encryption_provider_id"] = prov.id
 
-        return super().create(vals_list)
+        res = super().create(vals_list)
+        registrants = [(rec, tokens) for rec, tokens in zip(res, tokens_list, strict=True) if tokens]
+        if registrants:
+            self.browse([rec.id for rec, _tokens in registrants]).set_blind_index_tokens(
+                [tokens for _rec, tokens in registrants]
+            )
+        return res
 
     def write(self, vals):
-        is_encrypt_fields = (
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("g2p_registry_encryption.encrypt_registry", default=False)
-        )
-        if not is_encrypt_fields:
+        policy = self.env["g2p.encryption.provider"].get_registry_encryption_policy()
+        if not policy.encrypt or self.env.context.get("skip_registry_encryption"):
             return super().write(vals)
 
-        prov = self.env["g2p.encryption.provider"].get_registry_provider()
+        registry_prov = self.env["g2p.encryption.provider"].get_registry_provider()
+        prov = self.env["g2p.encryption.provider"].get_registry_write_provider()
         encrypted_vals = self.get_encrypted_val()
+        registrants = self.browse()
+        tokens = []
         for rec, (is_encrypted, encrypted_val) in zip(self, encrypted_vals, strict=True):
             if rec.is_registrant or vals.get("is_registrant", False):
+                registrants |= rec
                 if not is_encrypted:
-                    rec_values_list = rec.read(prov.get_registry_fields_set_to_enc())[0]
+                    rec_values_list = rec.read(list(policy.fields_to_enc))[0]
                     rec_values_list.update(vals)
                     rec_values_list["is_encrypted"] = True
                     vals = rec_values_list
                 else:
-                    decrypted_vals = json.loads(prov.decrypt_data(encrypted_val or b"{}").decode())
+                    dec_prov = rec.sudo().encryption_provider_id or registry_prov
+                    decrypted_vals = json.loads(dec_prov.decrypt_data(encrypted_val or b"{}").decode())
                     decrypted_vals.update(vals)
                     vals = decrypted_vals
-                to_be_encrypted = self.gather_fields_to_be_enc_from_dict(vals, prov)
+                vals.update(self.get_blind_index_vals(vals, policy))
+                tokens = self.get_blind_index_tokens(vals, policy)
+                to_be_encrypted = self.gather_fields_to_be_enc_from_dict(vals, policy)
 
                 vals["encrypted_val"] = prov.encrypt_data(json.dumps(to_be_encrypted).encode())
+                vals["encryption_provider_id"] = prov.id
 
-        return super().write(vals)
+        res = super().write(vals)
+        if registrants:
+            # Every record is written with the last vals, so index them all with its tokens.
+            registrants.set_blind_index_tokens([tokens] * len(registrants))
+        return res
 
     def _fetch_query(self, query, fields):
         res = super()._fetch_query(query, fields)
+        policy = self.env["g2p.encryption.provider"].get_registry_encryption_policy()
+        if not policy.decrypt:
+            return res
         fields = {field.name for field in fields}
-        prov = self.env["g2p.encryption.provider"].get_registry_provider()
-        enc_fields_set = prov.get_registry_fields_set_to_enc().intersection(fields)
+        enc_fields_set = policy.fields_to_enc.intersection(fields)
         if not enc_fields_set:
             return res
         if len(fields) == 2 and "encrypted_val" in fields and "is_encrypted" in fields:
             return res
 
-        is_decrypt_fields = (
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("g2p_registry_encryption.decrypt_registry", default=False)
-        )
-        if not is_decrypt_fields:
-            return res
-        for record in self:
-            is_encrypted, encrypted_val = record.get_encrypted_val()[0]
-            if is_encrypted and encrypted_val:
-                decrypted_vals = json.loads(prov.decrypt_data(encrypted_val).decode())
-
-                for field_name in enc_fields_set:
-                    if field_name in decrypted_vals and field_name in record and record[field_name]:
-                        self.env.cache.set(record, self._fields[field_name], decrypted_vals[field_name])
+        # Decrypt the whole recordset at once, batched per provider, not record by record.
+        for record_id, decrypted_vals in res._decrypt_encrypted_vals():
+            record = res.browse(record_id)
+            for field_name in enc_fields_set:
+                if field_name in decrypted_vals and record[field_name]:
+                    self.env.cache.set(record, self._fields[field_name], decrypted_vals[field_name])
         return res
 
     def get_encrypted_val(self):
@@ -12,3 +12,8 @@ class RegistryEncryptConfigSettings(models.TransientModel):
 
     # TODO: Change this to user context
     decrypt_registry = fields.Boolean(config_parameter="g2p_registry_encryption.decrypt_registry")
+
+    def set_values(self):
+        res = super().set_values()
+        self.env["g2p.encryption.provider"].ensure_registry_blind_index_keys()
+        return res
@@ -0,0 +1,2 @@
+from . import test_blind_index
+from . import test_encryption_job
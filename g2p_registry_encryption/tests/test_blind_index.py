@@ -0,0 +1,153 @@
+import base64
+from unittest.mock import patch
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+def _fake_encrypt_data(self, data, **kwargs):
+    return base64.b64encode(f"{self.id}:".encode() + data[::-1])
+
+
+def _fake_decrypt_data(self, data, **kwargs):
+    prov_id, _sep, payload = base64.b64decode(data).partition(b":")
+    assert int(prov_id) == self.id, "Decrypted with the wrong provider"
+    return payload[::-1]
+
+
+@tagged("post_install", "-at_install")
+class TestRegistryBlindIndex(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        provider_model = type(self.env["g2p.encryption.provider"])
+        for name, func in (("encrypt_data", _fake_encrypt_data), ("decrypt_data", _fake_decrypt_data)):
+            patcher = patch.object(provider_model, name, func)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.provider = self.env["g2p.encryption.provider"].create({"name": "Test Provider"})
+        config = self.env["ir.config_parameter"].sudo()
+        config.set_param("g2p_registry_encryption.encrypt_registry", "1")
+        config.set_param("g2p_registry_encryption.decrypt_registry", "1")
+        self.env["g2p.encryption.provider"].set_registry_provider(self.provider.id)
+
+        self.partner_model = self.env["res.partner"]
+        self.ann = self.partner_model.create({"name": "Ann Smith", "is_registrant": True})
+        self.bob = self.partner_model.create({"name": "Smithers Bob", "is_registrant": True})
+        self.carl = self.partner_model.create({"name": "Carl Smyth", "is_registrant": True})
+        self.partners = self.ann | self.bob | self.carl
+
+    def _search(self, operator, value):
+        return self.partner_model.search([("id", "in", self.partners.ids), ("name", operator, value)])
+
+    def test_key_stored_encrypted(self):
+        key = self.provider.get_registry_blind_index_key()
+        self.assertTrue(key)
+        self.assertEqual(key, self.provider.get_registry_blind_index_key())
+        stored = self.provider.sudo().with_context(bin_size=False).registry_blind_index_key_enc
+        self.assertNotIn(key.encode(), base64.b64decode(stored))
+
+    def test_policy_does_not_generate_or_decrypt_keys(self):
+        providers = self.env["g2p.encryption.provider"]
+        provider_model = type(providers)
+        other = providers.create({"name": "Other Provider"})
+        config = self.env["ir.config_parameter"].sudo()
+        config.set_param("g2p_registry_encryption.encryption_provider_id", str(other.id))
+        self.env.registry.clear_cache()
+        with (
+            patch.object(provider_model, "encrypt_data", side_effect=AssertionError("Encrypted")),
+            patch.object(provider_model, "decrypt_data", side_effect=AssertionError("Decrypted")),
+        ):
+            policy = providers._get_registry_encryption_policy()
+        self.assertEqual(((other.id, None),), policy.blind_index_key_encs)
+        self.assertFalse(other.sudo().registry_blind_index_key_enc)
+        self.assertIsNone(providers.get_registry_encryption_policy().blind_index_key)
+
+        # Generated when set up as the registry provider, and decrypted once
+        providers.set_registry_provider(other.id)
+        key = other.get_registry_blind_index_key()
+        self.assertTrue(key)
+        with patch.object(provider_model, "decrypt_data", side_effect=AssertionError("Decrypted")):
+            self.assertEqual(key, providers.get_registry_encryption_policy().blind_index_key)
+
+    def test_equality(self):
+        self.assertTrue(self.ann.is_encrypted)
+        self.assertEqual(self.ann, self._search("=", "Ann Smith"))
+        self.assertFalse(self._search("=", "Ann"))
+        self.assertFalse(self._search("=", "ann smith"))
+        self.assertEqual(self.ann | self.carl, self._search("in", ["Ann Smith", "Carl Smyth"]))
+        self.assertEqual(self.bob | self.carl, self._search("!=", "Ann Smith"))
+
+    def test_pattern_operators(self):
+        self.assertEqual(self.ann | self.bob, self._search("ilike", "smith"))
+        self.assertEqual(self.ann | self.bob, self._search("like", "SMI"))
+        self.assertEqual(self.ann, self._search("ilike", "ann smi"))
+        self.assertEqual(self.ann, self._search("ilike", "ÁNN"))
+        # Words are matched by their prefixes, and short words only whole
+        self.assertFalse(self._search("ilike", "mith"))
+        self.assertFalse(self._search("ilike", "sm"))
+        self.assertEqual(self.ann, self._search("=ilike", "ann smith"))
+        self.assertEqual(self.carl, self._search("=ilike", "smy%"))
+        self.assertEqual(self.partners, self._search("ilike", "%"))
+        self.assertEqual(self.carl, self._search("not ilike", "smith"))
+
+        self.ann.name = "Ann Jones"
+        self.assertEqual(self.ann, self._search("ilike", "jon"))
+        self.assertEqual(self.bob, self._search("ilike", "smith"))
+
+    def test_pattern_search_does_not_decrypt(self):
+        provider_model = type(self.env["g2p.encryption.provider"])
+        with (
+            patch.object(provider_model, "decrypt_data", side_effect=AssertionError("Decrypted")),
+            patch.object(provider_model, "decrypt_data_batch", side_effect=AssertionError("Decrypted")),
+        ):
+            self.assertEqual(self.ann | self.bob, self._search("ilike", "smith"))
+            self.assertEqual(self.carl, self._search("not like", "Smith"))
+
+    def test_unsupported_operator(self):
+        with self.assertRaises(UserError):
+            self._search(">", "Ann")
+
+    def test_search_during_reencryption(self):
+        target = self.env["g2p.encryption.provider"].create({"name": "Target Provider"})
+        target.ensure_registry_blind_index_key()
+        job = self.env["g2p.registry.encryption.job"].create(
+            {"mode": "reencrypt", "target_provider_id": target.id}
+        )
+        job.state = "running"
+        self.env["g2p.registry.encryption.job.partition"]._reencrypt_partners(self.ann, target)
+        self.assertEqual(target, self.ann.encryption_provider_id)
+        self.assertEqual(self.ann, self._search("=", "Ann Smith"))
+        self.assertEqual(self.ann | self.bob, self._search("ilike", "smith"))
+
+    def test_edit_during_reencryption(self):
+        target = self.env["g2p.encryption.provider"].create({"name": "Target Provider"})
+        target.ensure_registry_blind_index_key()
+        job = self.env["g2p.registry.encryption.job"].create(
+            {"mode": "reencrypt", "target_provider_id": target.id}
+        )
+        job.state = "running"
+        # Edited and created after the job passed them, so never re-encrypted by it
+        self.bob.name = "Bob Smithers"
+        dan = self.partner_model.create({"name": "Dan Smith", "is_registrant": True})
+        self.partners |= dan
+        self.assertEqual(target, self.bob.encryption_provider_id)
+        self.assertEqual(target, dan.encryption_provider_id)
+        self.assertEqual(self.bob, self._search("=", "Bob Smithers"))
+
+        self.env["g2p.registry.encryption.job.partition"]._reencrypt_partners(self.ann | self.carl, target)
+        job._finish()
+        self.assertEqual(target, self.env["g2p.encryption.provider"].get_registry_provider())
+        self.assertEqual(self.bob, self._search("=", "Bob Smithers"))
+        self.assertEqual(dan, self._search("=", "Dan Smith"))
+        self.assertEqual(self.ann | self.bob | dan, self._search("ilike", "smith"))
+        self.bob.invalidate_recordset()
+        self.assertEqual("Bob Smithers", self.bob.name)
+
+    def test_policy_cache_cleared_on_policy_fields_only(self):
+        with patch.object(self.env.registry, "clear_cache") as mock_clear_cache:
+            self.provider.name = "Renamed Provider"
+            mock_clear_cache.assert_not_called()
+            self.provider.registry_enc_field_placeholder = "hidden"
+            mock_clear_cache.assert_called_once()
@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from .test_blind_index import _fake_decrypt_data, _fake_encrypt_data
+
+
+@tagged("post_install", "-at_install")
+class TestRegistryEncryptionJob(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        provider_model = type(self.env["g2p.encryption.provider"])
+        for name, func in (("encrypt_data", _fake_encrypt_data), ("decrypt_data", _fake_decrypt_data)):
+            patcher = patch.object(provider_model, name, func)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.provider = self.env["g2p.encryption.provider"].create({"name": "Test Provider"})
+        config = self.env["ir.config_parameter"].sudo()
+        config.set_param("g2p_registry_encryption.encrypt_registry", "")
+        config.set_param("g2p_registry_encryption.encryption_provider_id", str(self.provider.id))
+        self.env.registry.clear_cache()
+
+        self.partners = self.env["res.partner"].create(
+            [{"name": f"Registrant {i}", "is_registrant": True} for i in range(6)]
+        )
+        self.job = self.env["g2p.registry.encryption.job"].create(
+            {"target_provider_id": self.provider.id, "batch_size": 2, "worker_count": 2}
+        )
+        enqueue_patcher = patch(
+            "odoo.addons.g2p_registry_encryption.models.encryption_job."
+            "RegistryEncryptionJobPartition._enqueue_next_batch"
+        )
+        self.mock_enqueue = enqueue_patcher.start()
+        self.addCleanup(enqueue_patcher.stop)
+
+    def _run_batches(self, run_sequence, rounds=1000):
+        for _i in range(rounds):
+            pending = self.job.partition_ids.filtered(lambda p: p.state != "done")
+            if not pending or self.job.state != "running":
+                return
+            for partition in pending:
+                partition.process_next_batch(run_sequence=run_sequence)
+
+    def test_job_finishes_once_all_partitions_are_done(self):
+        self.job.action_start()
+        self.assertEqual(2, self.job.partitions_pending)
+        self._run_batches(self.job.run_sequence)
+        self.assertEqual("done", self.job.state)
+        self.assertEqual(0, self.job.partitions_pending)
+        self.assertTrue(all(self.partners.mapped("is_encrypted")))
+        self.assertEqual(self.job.records_total, self.job.records_done)
+
+    def test_resume_ignores_batches_of_earlier_run(self):
+        self.job.action_start()
+        stale_sequence = self.job.run_sequence
+        self.job.action_cancel()
+        self.job.action_resume()
+        self.assertNotEqual(stale_sequence, self.job.run_sequence)
+
+        self._run_batches(stale_sequence, rounds=1)
+        self.assertFalse(any(self.partners.mapped("is_encrypted")))
+        self.assertEqual("running", self.job.state)
+
+        self._run_batches(self.job.run_sequence)
+        self.assertEqual("done", self.job.state)
+        self.assertTrue(all(self.partners.mapped("is_encrypted")))